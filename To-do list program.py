@@ -1,9 +1,326 @@
 import os
-import json
+import time
+import bisect
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from datetime import datetime, timedelta
 from tkcalendar import DateEntry
+from todo_engine import STATUS_FILTERS, TAGS, PRIORITIES, SORT_OPTIONS
+from todo_export import EXPORT_FORMATS, ExportCancelled
+from todo_import import IMPORT_FORMATS, ImportCancelled
+from todo_metrics import Metrics
+from todo_workspace import WorkspaceManager
+from todo_query import SavedQueries
+from todo_archive import ARCHIVE_AFTER_DAYS
+
+class VirtualTaskList:
+    """Treeview that only materializes the rows visible in the viewport
+
+    The tree holds a small pool of items, one per visible row plus a buffer.
+    Scrolling rebinds the pooled items to other tasks instead of creating
+    new ones, so redraw cost and memory follow the window height rather
+    than the number of tasks. Selection is tracked by task id so it survives
+    rows being recycled.
+
+    Rows are kept ordered by their sort keys, so a single changed task is
+    reconciled with upsert/remove using bisect, and only the pooled items
+    whose values or tags actually changed are touched.
+    """
+
+    def __init__(self, tree, scrollbar, format_row, buffer=1):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.format_row = format_row
+        self.buffer = buffer
+        self.rows = []
+        self.keys = []
+        self.key_by_id = {}
+        self.offset = 0
+        self.items = []
+        self.shown = {}
+        self.selected = set()
+        self.focus_index = None
+        self.capacity = 20
+        
+        self.scrollbar.configure(command=self.yview)
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        # A plain click replaces the selection, modified clicks extend it
+        self.tree.bind('<Button-1>', lambda e: self.selected.clear())
+        self.tree.bind('<Shift-Button-1>', lambda e: None)
+        self.tree.bind('<Control-Button-1>', lambda e: None)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Up>', lambda e: self.move_focus(-1))
+        self.tree.bind('<Down>', lambda e: self.move_focus(1))
+        self.tree.bind('<Prior>', lambda e: self.move_focus(-self.page_size()))
+        self.tree.bind('<Next>', lambda e: self.move_focus(self.page_size()))
+        self.tree.bind('<Home>', lambda e: self.move_focus(-len(self.rows)))
+        self.tree.bind('<End>', lambda e: self.move_focus(len(self.rows)))
+        
+    def set_rows(self, rows, keys):
+        """Show a new list of tasks ordered by keys, keeping the scroll position"""
+        self.rows = rows
+        self.keys = keys
+        self.key_by_id = {task.id: key for task, key in zip(rows, keys)}
+        self.selected.clear()
+        self.focus_index = None
+        self.offset = max(0, min(self.offset, len(self.rows) - self.page_size()))
+        self.refresh()
+        
+    def upsert(self, task, key, visible):
+        """Move a changed task to its sorted position, or drop it if filtered out"""
+        self._remove(task.id)
+        if visible:
+            index = bisect.bisect_left(self.keys, key)
+            self.rows.insert(index, task)
+            self.keys.insert(index, key)
+            self.key_by_id[task.id] = key
+            # Keep the viewport on the same tasks when a row appears above it
+            if index < self.offset:
+                self.offset += 1
+        self.refresh()
+        
+    def remove(self, task_id):
+        self._remove(task_id)
+        self.selected.discard(task_id)
+        self.refresh()
+        
+    def update_many(self, changes, removed_ids=()):
+        """Apply (task, key, visible) changes and removals with one pass and one refresh"""
+        gone = set(removed_ids)
+        gone.update(task.id for task, key, visible in changes)
+        # Keep the viewport on the task at its top
+        top_key = self.keys[self.offset] if self.offset < len(self.keys) else None
+        pairs = [(key, task) for key, task in zip(self.keys, self.rows) if task.id not in gone]
+        for task_id in gone:
+            self.key_by_id.pop(task_id, None)
+        for task, key, visible in changes:
+            if visible:
+                pairs.append((key, task))
+                self.key_by_id[task.id] = key
+        # Keys are unique, so tasks are never compared
+        pairs.sort(key=lambda pair: pair[0])
+        self.keys = [key for key, task in pairs]
+        self.rows = [task for key, task in pairs]
+        self.selected.difference_update(removed_ids)
+        if top_key is not None:
+            self.offset = bisect.bisect_left(self.keys, top_key)
+        self.offset = max(0, min(self.offset, len(self.rows) - self.page_size()))
+        self.focus_index = None
+        self.refresh()
+        
+    def _remove(self, task_id):
+        key = self.key_by_id.pop(task_id, None)
+        if key is None:
+            return
+        index = bisect.bisect_left(self.keys, key)
+        del self.rows[index]
+        del self.keys[index]
+        if index < self.offset:
+            self.offset -= 1
+        if self.focus_index is not None and index <= self.focus_index:
+            self.focus_index = max(0, self.focus_index - 1)
+            
+    def page_size(self):
+        return max(1, self.capacity - self.buffer)
+        
+    def refresh(self):
+        """Rebind the pooled items to the rows in the viewport"""
+        count = max(0, min(self.capacity, len(self.rows) - self.offset))
+        while len(self.items) < count:
+            self.items.append(self.tree.insert('', tk.END))
+        while len(self.items) > count:
+            item = self.items.pop()
+            self.shown.pop(item, None)
+            self.tree.delete(item)
+            
+        selection = []
+        for i, item in enumerate(self.items):
+            task = self.rows[self.offset + i]
+            row = self.format_row(task)
+            if self.shown.get(item) != row:
+                self.shown[item] = row
+                self.tree.item(item, values=row[0], tags=row[1])
+            if task.id in self.selected:
+                selection.append(item)
+        if set(selection) != set(self.tree.selection()):
+            self.tree.selection_set(selection)
+        self._update_scrollbar()
+        
+    def selected_task_ids(self):
+        """Ids of the selected tasks, visible ones first in display order"""
+        selection = self.tree.selection()
+        visible = [
+            self.rows[self.offset + i].id for i, item in enumerate(self.items)
+            if item in selection
+        ]
+        return visible + sorted(self.selected - set(visible))
+        
+    def yview(self, *args):
+        """Scrollbar command"""
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.page_size()
+            self.scroll(amount)
+            
+    def scroll(self, amount):
+        self.scroll_to(self.offset + amount)
+        return "break"
+        
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.rows) - self.page_size()))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+            
+    def move_focus(self, amount):
+        """Keyboard navigation over the whole list, not just the pool"""
+        if not self.rows:
+            return "break"
+        if self.focus_index is None:
+            index = self.offset
+        else:
+            index = max(0, min(self.focus_index + amount, len(self.rows) - 1))
+        self.focus_index = index
+        self.selected = {self.rows[index].id}
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.page_size():
+            self.offset = index - self.page_size() + 1
+        self.refresh()
+        self.tree.focus(self.items[index - self.offset])
+        return "break"
+        
+    def _on_select(self, event):
+        visible = {}
+        for i, item in enumerate(self.items):
+            visible[item] = self.rows[self.offset + i].id
+        selection = self.tree.selection()
+        self.selected.difference_update(visible.values())
+        self.selected.update(visible[item] for item in selection if item in visible)
+        focus = self.tree.focus()
+        if focus in visible:
+            self.focus_index = self.offset + self.items.index(focus)
+            
+    def _on_resize(self, event):
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 25)
+        header_height = row_height
+        if self.items:
+            bbox = self.tree.bbox(self.items[0])
+            if bbox:
+                header_height = bbox[1]
+        capacity = max(1, (event.height - header_height) // row_height) + self.buffer
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self.offset = max(0, min(self.offset, len(self.rows) - self.page_size()))
+            self.refresh()
+            
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120, macOS small deltas
+        steps = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-3 * steps)
+        
+    def _update_scrollbar(self):
+        total = len(self.rows)
+        if total <= self.page_size():
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.page_size()) / total))
+
+
+class QueryCancelled(Exception):
+    """Raised inside a query that a newer one has superseded"""
+
+
+class QueryScheduler:
+    """Debounce list queries and run them on a worker thread
+
+    schedule() restarts the debounce timer; when it fires the query is handed
+    to the worker, which calls compute(query, check_cancelled). Each new
+    request bumps a generation counter, so a running query stops at its next
+    check_cancelled() and only the result of the latest request is posted
+    back to the Tk thread with root.after and passed to apply(result). If
+    compute raises, fail(query, error) gets the error the same way and the
+    worker waits for the next request.
+    """
+
+    def __init__(self, root, compute, apply, fail):
+        self.root = root
+        self.compute = compute
+        self.apply = apply
+        self.fail = fail
+        self.generation = 0
+        self.last_query = None
+        self._after_id = None
+        self._pending = None
+        self._busy = False
+        self._condition = threading.Condition()
+        worker = threading.Thread(target=self._run, daemon=True)
+        worker.start()
+        
+    def schedule(self, query, delay=0):
+        if self._after_id:
+            self.root.after_cancel(self._after_id)
+        with self._condition:
+            self.generation += 1
+            generation = self.generation
+        self.last_query = query
+        self._after_id = self.root.after(delay, lambda: self._submit(generation, query))
+        
+    def invalidate(self):
+        """Re-run the latest query if one is still in flight, since data changed"""
+        with self._condition:
+            in_flight = self._busy or self._pending is not None
+        if in_flight or self._after_id:
+            self.schedule(self.last_query)
+            
+    def _submit(self, generation, query):
+        self._after_id = None
+        with self._condition:
+            self._pending = (generation, query)
+            self._condition.notify()
+            
+    def _cancelled(self, generation):
+        if generation != self.generation:
+            raise QueryCancelled()
+            
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                generation, query = self._pending
+                self._pending = None
+                if generation != self.generation:
+                    continue
+                self._busy = True
+            try:
+                result = self.compute(query, lambda: self._cancelled(generation))
+            except QueryCancelled:
+                continue
+            except Exception as e:
+                # Keep the worker alive; the next query may well succeed
+                self.root.after(0, lambda g=generation, q=query, error=e: self._deliver_error(g, q, error))
+                continue
+            finally:
+                with self._condition:
+                    self._busy = False
+            self.root.after(0, lambda g=generation, r=result: self._deliver(g, r))
+            
+    def _deliver(self, generation, result):
+        if generation == self.generation:
+            self.apply(result)
+            
+    def _deliver_error(self, generation, query, error):
+        if generation == self.generation:
+            self.fail(query, error)
+
 
 class TodoAppGUI:
     def __init__(self, root):
@@ -49,43 +366,268 @@ class TodoAppGUI:
         self.style.configure('Treeview.Heading', 
                              font=('Arial', 11, 'bold'))
         
-        # Task data
-        self.tasks = []
-        self.filename = "todo_data.json"
+        # Task data of the active workspace; the engine lock is shared with
+        # the query worker thread. Other workspaces are read when first opened.
+        self.workspaces = WorkspaceManager(".", os.environ.get("TODO_STORAGE", "journal"), metrics=Metrics())
+        self.workspace_var = tk.StringVar(value=self.workspaces.active)
+        self.engine = self.workspaces.open(self.workspaces.active, load=False)
+        self.root.title(f"To-Do List Manager - {self.workspaces.active}")
         self.load_tasks()
         
-        # Filter and sort variables
+        # Filter and sort variables; typing in the search box is debounced (ms)
+        self.search_delay = 150
+        # When the oldest list refresh not yet painted was requested
+        self.list_requested = None
+        # Completed tasks older than this many days go to the archive (0: never)
+        self.archive_days = int(os.environ.get("TODO_ARCHIVE_DAYS", ARCHIVE_AFTER_DAYS))
+        self.set_today()
         self.filter_status = tk.StringVar(value="All")
         self.filter_tag = tk.StringVar(value="All")
         self.sort_by = tk.StringVar(value="Creation Time")
+        # Queries saved as views in the View menu
+        self.saved_queries = SavedQueries(".")
         
         # Create interface
         self.create_widgets()
         
-    def load_tasks(self):
-        if os.path.exists(self.filename):
+        # Closing the window goes through the same flush as File > Exit
+        self.root.protocol("WM_DELETE_WINDOW", self.quit_app)
+        
+        # Read the rest of the task file while the first screenful is shown
+        threading.Thread(target=self.finish_loading, daemon=True).start()
+        
+        # Due date filters and row colors move on at midnight
+        self.schedule_midnight()
+        
+        # Workspaces left alone for a while are closed to free their memory
+        self.root.after(60000, self.evict_idle_workspaces)
+        
+        # Changes other programs make to the task file are merged every few seconds (ms);
+        # a sync server pushes them as they happen, so they are picked up sooner
+        self.sync_interval = 500 if self.workspaces.storage_mode == "remote" else 2000
+        self.root.after(self.sync_interval, self.poll_external_changes)
+        
+    def set_today(self):
+        now = datetime.now()
+        self.today = now.strftime("%Y-%m-%d")
+        self.today_stamp = int(now.strftime("%Y%m%d"))
+        
+    def schedule_midnight(self):
+        """Roll the date over once at midnight instead of checking it on every redraw"""
+        now = datetime.now()
+        midnight = datetime(now.year, now.month, now.day) + timedelta(days=1)
+        # A second late so the new day has surely started
+        delay = int((midnight - now).total_seconds() * 1000) + 1000
+        self.root.after(delay, self.on_midnight)
+        
+    def on_midnight(self):
+        self.set_today()
+        if not self.engine.loading:
+            self.archive_old_tasks()
+        self.update_task_list()
+        self.schedule_midnight()
+        
+    def evict_idle_workspaces(self):
+        self.workspaces.evict_idle()
+        self.root.after(60000, self.evict_idle_workspaces)
+        
+    def poll_external_changes(self):
+        """Merge what other programs changed in the task file on a worker thread"""
+        engine = self.engine
+        if engine.loading:
+            self.root.after(self.sync_interval, self.poll_external_changes)
+            return
+            
+        self.sync_in_background(engine, self.show_external_changes)
+        
+    def sync_in_background(self, engine, done):
+        """Run engine.sync() on a worker thread, then done(engine, result) on the Tk thread"""
+        def run_sync():
+            result = None
             try:
-                with open(self.filename, 'r', encoding='utf-8') as file:
-                    self.tasks = json.load(file)
-                    
-                    # Ensure all tasks have the new fields
-                    for task in self.tasks:
-                        if "priority" not in task:
-                            task["priority"] = "Medium"
-                        if "due_date" not in task:
-                            task["due_date"] = ""
-                        if "tags" not in task:
-                            task["tags"] = []
-                        if "completed_at" not in task:
-                            task["completed_at"] = ""
-            except:
-                self.tasks = []
+                result = engine.sync()
+            finally:
+                self.root.after(0, lambda: done(engine, result))
+                
+        threading.Thread(target=run_sync, daemon=True).start()
+        
+    def show_external_changes(self, engine, result):
+        """Reconcile the rows of a poll and schedule the next one (runs on the Tk thread)"""
+        # The next poll is scheduled once this one is done, so they never overlap
+        self.root.after(self.sync_interval, self.poll_external_changes)
+        self.apply_external_changes(engine, result)
+        
+    def apply_external_changes(self, engine, result):
+        """Reconcile only the rows other programs changed (runs on the Tk thread)"""
+        if not result or engine is not self.engine:
+            return
+        self.refresh_tasks(result.changed, result.deleted)
+        if result.conflicts:
+            self.resolve_conflicts(result.conflicts)
+            
+    def resolve_conflicts(self, conflicts):
+        """Offer the other program's version of tasks changed here and there at once"""
+        lines = []
+        for conflict in conflicts[:10]:
+            task = self.engine.get(conflict.task_id) or conflict.theirs
+            change = "deleted it" if conflict.theirs is None else "changed it"
+            lines.append(f"- {task.title if task else conflict.task_id} (the other program {change})")
+        if len(conflicts) > 10:
+            lines.append(f"... and {len(conflicts) - 10} more")
+        use_theirs = messagebox.askyesno(
+            "Conflicting Changes",
+            "These tasks were also changed by another program:\n\n" + "\n".join(lines)
+            + "\n\nYour changes were saved. Replace them with the other program's version?"
+        )
+        if not use_theirs:
+            return
+        changed = []
+        removed_ids = []
+        for conflict in conflicts:
+            task = self.engine.accept_theirs(conflict)
+            if task is None:
+                removed_ids.append(conflict.task_id)
+            else:
+                changed.append(task)
+        self.refresh_tasks(changed, removed_ids)
+        
+    def switch_workspace(self, name):
+        """Show another workspace, reading it from disk if it is not in memory"""
+        if name == self.workspaces.active:
+            return
+        if self.still_loading():
+            self.workspace_var.set(self.workspaces.active)
+            return
+        fresh = not self.workspaces.is_loaded(name)
+        self.engine = self.workspaces.activate(name, load=False)
+        self.workspace_var.set(name)
+        self.root.title(f"To-Do List Manager - {name}")
+        self.task_list.set_rows([], [])
+        if fresh:
+            # Same streaming load as at start-up
+            self.load_tasks()
+            threading.Thread(target=self.finish_loading, daemon=True).start()
         else:
-            self.tasks = []
+            # Catch up with what other programs changed while it was hidden;
+            # the list shows what is in memory until then
+            self.sync_in_background(self.engine, self.apply_external_changes)
+        self.update_task_list()
+        
+    def refresh_workspace_names(self):
+        self.workspace_combo.config(values=self.workspaces.names())
+        self.workspace_var.set(self.workspaces.active)
+        self.root.title(f"To-Do List Manager - {self.workspaces.active}")
+        
+    def new_workspace(self):
+        name = simpledialog.askstring("New Workspace", "Name of the new workspace:", parent=self.root)
+        if not name:
+            return
+        try:
+            self.workspaces.create(name)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.refresh_workspace_names()
+        self.switch_workspace(name.strip())
+        
+    def rename_workspace(self):
+        name = self.workspaces.active
+        new_name = simpledialog.askstring("Rename Workspace", f"New name for '{name}':", initialvalue=name, parent=self.root)
+        if not new_name or new_name.strip() == name:
+            return
+        try:
+            self.workspaces.rename(name, new_name)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.refresh_workspace_names()
+        
+    def delete_workspace(self):
+        name = self.workspaces.active
+        if len(self.workspaces.names()) == 1:
+            messagebox.showwarning("Warning", "The last workspace cannot be deleted!")
+            return
+        if self.still_loading():
+            return
+        if not messagebox.askyesno("Confirm", f"Delete the workspace '{name}' and all of its tasks?"):
+            return
+        # Move to another workspace first, so the list never shows deleted tasks
+        other = next(other for other in self.workspaces.names() if other != name)
+        self.switch_workspace(other)
+        self.workspaces.delete(name)
+        self.refresh_workspace_names()
+        
+    def quit_app(self):
+        """Write queued changes to disk before leaving the main loop"""
+        if not self.engine.flush():
+            retry = messagebox.askretrycancel(
+                "Error", f"Saving failed: {self.engine.storage.last_error}\nRetry before exiting?"
+            )
+            if retry:
+                self.quit_app()
+                return
+        self.root.quit()
+        
+    def load_tasks(self):
+        # Stream snapshot plus journal; only the first batch is read up front
+        with self.engine.metrics.timer("app.first_batch"):
+            self.loader = self.engine.iter_load()
+            next(self.loader, None)
+        
+    def finish_loading(self):
+        """Load the remaining batches (runs on a background thread)"""
+        last_refresh = time.monotonic()
+        for count in self.loader:
+            # Let the list fill in a few times a second, not once per batch
+            if time.monotonic() - last_refresh > 0.5:
+                last_refresh = time.monotonic()
+                self.root.after(0, self.update_task_list)
+        self.archive_old_tasks()
+        self.root.after(0, self.update_task_list)
+        
+    def archive_old_tasks(self):
+        """Move tasks completed more than archive_days ago to the archive"""
+        if self.archive_days <= 0:
+            return 0
+        return self.engine.archive_completed(self.archive_days)
+        
+    def archive_now(self):
+        """Archive completed tasks older than a number of days the user picks"""
+        if self.still_loading():
+            return
+        days = simpledialog.askinteger(
+            "Archive Completed Tasks", "Archive tasks completed more than this many days ago:",
+            initialvalue=max(self.archive_days, 0), minvalue=0, parent=self.root
+        )
+        if days is None:
+            return
+        count = self.engine.archive_completed(days)
+        self.update_task_list()
+        messagebox.showinfo("Success", f"{count} tasks moved to the archive.")
+        
+    def restore_archived(self):
+        """Move the selected archived tasks back to the task list"""
+        if self.still_loading():
+            return
+        selected_ids = self.task_list.selected_task_ids()
+        archived_ids = [task_id for task_id in selected_ids if self.engine.get(task_id) is None]
+        if not archived_ids:
+            messagebox.showwarning("Warning", "Please select archived tasks first (they are listed under Completed)!")
+            return
+        restored = self.engine.restore_tasks(archived_ids)
+        self.refresh_tasks(restored)
+        messagebox.showinfo("Success", f"{len(restored)} tasks restored from the archive.")
+        
+    def still_loading(self):
+        """Tell the user to wait if tasks are still being read from disk"""
+        if self.engine.loading:
+            messagebox.showinfo("Info", "Tasks are still loading, please try again in a moment.")
+            return True
+        return False
             
     def save_tasks(self):
-        with open(self.filename, 'w', encoding='utf-8') as file:
-            json.dump(self.tasks, file, indent=4, ensure_ascii=False)
+        # Full rewrite of the snapshot; single changes go through the journal
+        self.engine.save()
             
     def create_widgets(self):
         # Top title
@@ -118,18 +660,26 @@ class TodoAppGUI:
         filter_frame = ttk.Frame(self.root)
         filter_frame.pack(fill=tk.X, padx=10, pady=5)
         
+        # Workspace
+        ttk.Label(filter_frame, text="List:").pack(side=tk.LEFT, padx=5)
+        self.workspace_combo = ttk.Combobox(filter_frame, textvariable=self.workspace_var,
+                                           values=self.workspaces.names(),
+                                           width=12, state="readonly")
+        self.workspace_combo.pack(side=tk.LEFT, padx=5)
+        self.workspace_combo.bind("<<ComboboxSelected>>", lambda e: self.switch_workspace(self.workspace_var.get()))
+        
         # Status filter
         ttk.Label(filter_frame, text="Status:").pack(side=tk.LEFT, padx=5)
         status_combo = ttk.Combobox(filter_frame, textvariable=self.filter_status, 
-                                   values=["All", "Incomplete", "Completed", "Due Today"], 
-                                   width=10, state="readonly")
+                                   values=STATUS_FILTERS, 
+                                   width=13, state="readonly")
         status_combo.pack(side=tk.LEFT, padx=5)
         status_combo.bind("<<ComboboxSelected>>", lambda e: self.update_task_list())
         
         # Tag filter
         ttk.Label(filter_frame, text="Tag:").pack(side=tk.LEFT, padx=5)
         tag_combo = ttk.Combobox(filter_frame, textvariable=self.filter_tag, 
-                                values=["All", "Work", "Personal", "Study", "Urgent"], 
+                                values=["All"] + TAGS, 
                                 width=10, state="readonly")
         tag_combo.pack(side=tk.LEFT, padx=5)
         tag_combo.bind("<<ComboboxSelected>>", lambda e: self.update_task_list())
@@ -137,7 +687,7 @@ class TodoAppGUI:
         # Sort options
         ttk.Label(filter_frame, text="Sort:").pack(side=tk.LEFT, padx=5)
         sort_combo = ttk.Combobox(filter_frame, textvariable=self.sort_by, 
-                                 values=["Creation Time", "Due Date", "Priority", "Task Name"], 
+                                 values=SORT_OPTIONS, 
                                  width=10, state="readonly")
         sort_combo.pack(side=tk.LEFT, padx=5)
         sort_combo.bind("<<ComboboxSelected>>", lambda e: self.update_task_list())
@@ -150,7 +700,7 @@ class TodoAppGUI:
         self.search_var = tk.StringVar()
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
         search_entry.pack(side=tk.LEFT, padx=5)
-        self.search_var.trace("w", lambda name, index, mode: self.update_task_list())
+        self.search_var.trace("w", lambda name, index, mode: self.update_task_list(delay=self.search_delay))
         
         # Task list
         list_frame = ttk.Frame(self.root)
@@ -181,9 +731,11 @@ class TodoAppGUI:
         # Bind double click event
         self.task_tree.bind('<Double-1>', self.view_task)
         
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.task_tree.yview)
-        self.task_tree.configure(yscroll=scrollbar.set)
+        # Add scrollbar, driven by the virtual list instead of the Treeview
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
+        self.task_list = VirtualTaskList(self.task_tree, scrollbar, self.format_task_row)
+        self.query_scheduler = QueryScheduler(self.root, self.compute_task_list, self.show_task_list,
+                                              self.show_query_failure)
         
         # Place Treeview and scrollbar
         self.task_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -199,6 +751,12 @@ class TodoAppGUI:
         # Set tag for tasks due today
         self.task_tree.tag_configure('due_today', foreground='red')
         
+        # Set tag for overdue tasks
+        self.task_tree.tag_configure('overdue', foreground='white', background='#b22222')
+        
+        # Set tag for archived tasks
+        self.task_tree.tag_configure('archived', foreground='#a0a0a0', font=('Arial', 10, 'italic'))
+        
         # Status bar
         status_frame = ttk.Frame(self.root)
         status_frame.pack(fill=tk.X, side=tk.BOTTOM, padx=10, pady=5)
@@ -209,96 +767,179 @@ class TodoAppGUI:
         # Load initial tasks
         self.update_task_list()
         
-    def update_task_list(self):
-        # Clear current list
-        for item in self.task_tree.get_children():
-            self.task_tree.delete(item)
-            
-        # Search filter
-        search_text = self.search_var.get().lower()
-        filtered_tasks = self.tasks.copy()
-        
-        # Text search filter
-        if search_text:
-            filtered_tasks = [
-                task for task in filtered_tasks 
-                if search_text in task['title'].lower() or 
-                   (task['description'] and search_text in task['description'].lower())
+    def update_task_list(self, delay=0):
+        """Queue a refilter; the work runs on the query worker thread"""
+        query = {
+            "search_text": self.search_var.get().lower(),
+            "status": self.filter_status.get(),
+            "tag": self.filter_tag.get(),
+            "sort": self.sort_by.get(),
+            "today": self.today,
+        }
+        self.engine.metrics.count("list.requests")
+        if self.list_requested is None:
+            self.list_requested = time.perf_counter()
+        self.query_scheduler.schedule(query, delay)
+        
+    def compute_task_list(self, query, check_cancelled):
+        """Filter and sort the tasks for a query (runs on the worker thread)"""
+        try:
+            filtered_tasks, keys = self.engine.query(check_cancelled=check_cancelled, **query)
+        except QueryCancelled:
+            self.engine.metrics.count("list.cancelled")
+            raise
+        return query, filtered_tasks, keys
+        
+    def show_task_list(self, result):
+        """Paint the latest query result (runs on the Tk thread)"""
+        query, filtered_tasks, keys = result
+        
+        # Repopulate list; only the visible rows are materialized
+        metrics = self.engine.metrics
+        with metrics.timer("list.paint"):
+            self.task_list.set_rows(filtered_tasks, keys)
+            self.update_status_bar()
+        # From the first request to the painted list, debounce included
+        if self.list_requested is not None:
+            metrics.record("list.latency", time.perf_counter() - self.list_requested)
+            self.list_requested = None
+        
+    def show_query_failure(self, query, error):
+        """Report a query that failed on the worker thread (runs on the Tk thread)"""
+        self.status_label.config(text=f"Could not update the list: {error}")
+        self.list_requested = None
+        
+    def update_status_bar(self):
+        total = self.engine.statistics.total
+        completed = self.engine.statistics.completed
+        loading = " (loading...)" if self.engine.loading else ""
+        archived = f", {self.engine.archive.count} archived" if self.engine.archive.count else ""
+        self.status_label.config(text=f"Total {total} tasks, {completed} completed{archived}{loading}")
+        
+    def refresh_task(self, task):
+        """Reconcile one added or changed task with the list instead of redrawing it"""
+        with self.engine.metrics.timer("list.reconcile"):
+            visible = self.task_visible(task)
+            key = self.engine.sort_key(task, self.sort_by.get())
+            self.task_list.upsert(task, key, visible)
+            self.update_status_bar()
+        self.query_scheduler.invalidate()
+        
+    def refresh_tasks(self, tasks, removed_ids=()):
+        """Reconcile a batch of changed and deleted tasks with one list update"""
+        with self.engine.metrics.timer("list.reconcile_batch"):
+            changes = [
+                (task, self.engine.sort_key(task, self.sort_by.get()), self.task_visible(task))
+                for task in tasks
             ]
+            self.task_list.update_many(changes, removed_ids)
+            self.update_status_bar()
+        self.query_scheduler.invalidate()
+        
+    def task_visible(self, task):
+        """Whether a task belongs in the current view"""
+        return self.engine.task_matches(
+            task,
+            self.search_var.get(),
+            self.filter_status.get(),
+            self.filter_tag.get(),
+            self.today
+        )
+        
+    def open_saved_view(self, name):
+        """Show the tasks of a saved query, with the status and tag filters reset"""
+        self.filter_status.set("All")
+        self.filter_tag.set("All")
+        # Setting the search box refreshes the list
+        self.search_var.set(self.saved_queries.get(name))
+        
+    def save_view(self):
+        """Save the query in the search box as a view of the View menu"""
+        query = self.search_var.get().strip()
+        if not query:
+            messagebox.showwarning("Warning", "Type a query in the search box first, e.g. priority:High !completed")
+            return
+        name = simpledialog.askstring("Save View", "View name:", parent=self.root)
+        if name is None:
+            return
+        try:
+            self.saved_queries.save(name, query)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             
-        # Status filter
-        status_filter = self.filter_status.get()
-        if status_filter == "Incomplete":
-            filtered_tasks = [task for task in filtered_tasks if not task["completed"]]
-        elif status_filter == "Completed":
-            filtered_tasks = [task for task in filtered_tasks if task["completed"]]
-        elif status_filter == "Due Today":
-            today = datetime.now().strftime("%Y-%m-%d")
-            filtered_tasks = [
-                task for task in filtered_tasks 
-                if task["due_date"] == today and not task["completed"]
-            ]
+    def delete_saved_view(self, name):
+        if messagebox.askyesno("Confirm", f"Delete the saved view '{name}'?"):
+            self.saved_queries.delete(name)
             
-        # Tag filter
-        tag_filter = self.filter_tag.get()
-        if tag_filter != "All":
-            filtered_tasks = [
-                task for task in filtered_tasks 
-                if tag_filter in task.get("tags", [])
-            ]
+    def batch_task_ids(self, scope):
+        """Ids of the selected tasks, or of every task in the current view"""
+        if scope == "view":
+            return [task.id for task in self.task_list.rows]
+        return self.task_list.selected_task_ids()
+        
+    def batch_operation(self, scope, operation, value=None):
+        """Complete, delete, set the priority of, or tag many tasks as one batch"""
+        if self.still_loading():
+            return
             
-        # Sort
-        sort_option = self.sort_by.get()
-        if sort_option == "Creation Time":
-            filtered_tasks.sort(key=lambda x: x["created_at"], reverse=True)
-        elif sort_option == "Due Date":
-            # Put the empty date last
-            filtered_tasks.sort(
-                key=lambda x: (x["due_date"] == "", x["due_date"]), 
-                reverse=False
-            )
-        elif sort_option == "Priority":
-            priority_order = {"High": 0, "Medium": 1, "Low": 2}
-            filtered_tasks.sort(
-                key=lambda x: priority_order.get(x.get("priority", "Medium"), 1)
-            )
-        elif sort_option == "Task Name":
-            filtered_tasks.sort(key=lambda x: x["title"].lower())
-        
-        # Repopulate list
-        today = datetime.now().strftime("%Y-%m-%d")
-        for task in filtered_tasks:
-            status = "✓" if task["completed"] else "✗"
-            priority = task.get("priority", "Medium")
-            tags = ", ".join(task.get("tags", []))
-            due_date = task.get("due_date", "")
-            
-            values = (
-                task['id'], 
-                status, 
-                priority,
-                task['title'], 
-                tags,
-                due_date,
-                task['created_at']
-            )
+        task_ids = self.batch_task_ids(scope)
+        if not task_ids:
+            messagebox.showwarning("Warning", "Please select a task first!" if scope == "selection" else "No tasks in the current view!")
+            return
             
-            item = self.task_tree.insert('', tk.END, values=values)
+        if operation == "delete":
+            if not messagebox.askyesno("Confirm", f"Are you sure you want to delete {len(task_ids)} tasks?"):
+                return
+            deleted = self.engine.delete_tasks(task_ids)
+            self.refresh_tasks([], [task.id for task in deleted])
+            return
             
-            # Apply tags to the task
-            if task["completed"]:
-                self.task_tree.item(item, tags=('completed',))
-            elif due_date == today:
-                self.task_tree.item(item, tags=('due_today',))
-            else:
-                self.task_tree.item(item, tags=(f'priority_{priority}',))
-                
-        # Update status bar
-        total = len(self.tasks)
-        completed = sum(1 for task in self.tasks if task["completed"])
-        self.status_label.config(text=f"Total {total} tasks, {completed} completed")
+        if operation == "complete":
+            changed = self.engine.complete_tasks(task_ids)
+        elif operation == "priority":
+            changed = self.engine.update_tasks(task_ids, priority=value)
+        elif operation == "add_tag":
+            changed = self.engine.tag_tasks(task_ids, value, add=True)
+        else:
+            changed = self.engine.tag_tasks(task_ids, value, add=False)
+        self.refresh_tasks(changed)
+        
+    def format_task_row(self, task):
+        """Treeview values and tags for a task"""
+        status = "✓" if task.completed else "✗"
+        priority = task.priority
+        tags = ", ".join(task.tags)
+        due_date = task.due_date
+        
+        values = (
+            task.id, 
+            status, 
+            priority,
+            task.title, 
+            tags,
+            due_date,
+            task.created_at
+        )
+        
+        # Apply tags to the task; due dates compare as yyyymmdd numbers
+        due = task.due_stamp
+        if self.engine.tasks.get(task.id) is not task:
+            # Listed from the archive by the Completed view
+            row_tags = ('archived',)
+        elif task.completed:
+            row_tags = ('completed',)
+        elif due and due < self.today_stamp:
+            row_tags = ('overdue',)
+        elif due == self.today_stamp:
+            row_tags = ('due_today',)
+        else:
+            row_tags = (f'priority_{priority}',)
+        return values, row_tags
         
     def add_task(self):
+        if self.still_loading():
+            return
+            
         # Create add task window
         add_window = tk.Toplevel(self.root)
         add_window.title("Add Task")
@@ -322,7 +963,7 @@ class TodoAppGUI:
         # Priority
         ttk.Label(form_frame, text="Priority:", font=('Arial', 10, 'bold')).grid(row=2, column=0, sticky=tk.W, pady=5)
         priority_var = tk.StringVar(value="Medium")
-        priority_combo = ttk.Combobox(form_frame, textvariable=priority_var, values=["High", "Medium", "Low"], width=15, state="readonly")
+        priority_combo = ttk.Combobox(form_frame, textvariable=priority_var, values=PRIORITIES, width=15, state="readonly")
         priority_combo.grid(row=2, column=1, sticky=tk.W, pady=5)
         
         # Due Date
@@ -339,7 +980,7 @@ class TodoAppGUI:
         
         # Use a vertical layout to place the label checkboxes
         tag_vars = {}
-        for i, tag in enumerate(["Work", "Personal", "Study", "Urgent"]):
+        for i, tag in enumerate(TAGS):
             tag_vars[tag] = tk.BooleanVar(value=False)
             ttk.Checkbutton(tags_frame, text=tag, variable=tag_vars[tag]).grid(
                 row=i, column=0, sticky=tk.W, pady=2
@@ -367,22 +1008,8 @@ class TodoAppGUI:
             selected_tags = [tag for tag, var in tag_vars.items() if var.get()]
             
             # Create new task
-            task = {
-                "id": max([task["id"] for task in self.tasks], default=0) + 1,
-                "title": title,
-                "description": description,
-                "priority": priority,
-                "due_date": due_date_str,
-                "tags": selected_tags,
-                "completed": False,
-                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "completed_at": ""
-            }
-            
-            # Add to task list
-            self.tasks.append(task)
-            self.save_tasks()
-            self.update_task_list()
+            task = self.engine.add_task(title, description, priority, due_date_str, selected_tags)
+            self.refresh_task(task)
             
             messagebox.showinfo("Success", f"Task '{title}' added!")
             add_window.destroy()
@@ -390,19 +1017,29 @@ class TodoAppGUI:
         ttk.Button(button_frame, text="Save", command=save_task).pack(side=tk.LEFT, padx=10)
         
     def edit_task(self):
+        if self.still_loading():
+            return
+            
         # Get selected task
-        selected_item = self.task_tree.selection()
-        if not selected_item:
+        selected_ids = self.task_list.selected_task_ids()
+        if not selected_ids:
             messagebox.showwarning("Warning", "Please select a task first!")
             return
             
-        item_id = self.task_tree.item(selected_item[0], 'values')[0]
-        task_id = int(item_id)
+        task_id = selected_ids[0]
         
-        # Find corresponding task
-        task = next((t for t in self.tasks if t["id"] == task_id), None)
+        # Find corresponding task; archived tasks are restored before editing
+        task = self.engine.get(task_id)
         if not task:
-            return
+            if self.engine.archived_task(task_id) is None:
+                return
+            if not messagebox.askyesno("Archived Task", "This task is archived. Restore it to the task list to edit it?"):
+                return
+            restored = self.engine.restore_tasks([task_id])
+            if not restored:
+                return
+            task = restored[0]
+            self.refresh_task(task)
             
         # Create edit task window
         edit_window = tk.Toplevel(self.root)
@@ -417,26 +1054,26 @@ class TodoAppGUI:
         # Title
         ttk.Label(form_frame, text="Title:", font=('Arial', 10, 'bold')).grid(row=0, column=0, sticky=tk.W, pady=5)
         title_entry = ttk.Entry(form_frame, width=40)
-        title_entry.insert(0, task["title"])
+        title_entry.insert(0, task.title)
         title_entry.grid(row=0, column=1, sticky=tk.W, pady=5, columnspan=2)
         
         # Description
         ttk.Label(form_frame, text="Description:", font=('Arial', 10, 'bold')).grid(row=1, column=0, sticky=tk.NW, pady=5)
         desc_text = tk.Text(form_frame, height=5, width=40, wrap=tk.WORD)
-        desc_text.insert(tk.END, task.get("description", ""))
+        desc_text.insert(tk.END, task.description)
         desc_text.grid(row=1, column=1, sticky=tk.W, pady=5, columnspan=2)
         
         # Priority
         ttk.Label(form_frame, text="Priority:", font=('Arial', 10, 'bold')).grid(row=2, column=0, sticky=tk.W, pady=5)
-        priority_var = tk.StringVar(value=task.get("priority", "Medium"))
-        priority_combo = ttk.Combobox(form_frame, textvariable=priority_var, values=["High", "Medium", "Low"], width=15, state="readonly")
+        priority_var = tk.StringVar(value=task.priority)
+        priority_combo = ttk.Combobox(form_frame, textvariable=priority_var, values=PRIORITIES, width=15, state="readonly")
         priority_combo.grid(row=2, column=1, sticky=tk.W, pady=5)
         
         # Due Date
         ttk.Label(form_frame, text="Due Date:", font=('Arial', 10, 'bold')).grid(row=3, column=0, sticky=tk.W, pady=5)
         due_date = DateEntry(form_frame, width=15, background=self.primary_color, foreground='white', borderwidth=2)
-        if task.get("due_date"):
-            due_date.set_date(datetime.strptime(task["due_date"], "%Y-%m-%d").date())
+        if task.due_date:
+            due_date.set_date(datetime.strptime(task.due_date, "%Y-%m-%d").date())
         due_date.grid(row=3, column=1, sticky=tk.W, pady=5)
         
         # Tag selection 
@@ -448,8 +1085,8 @@ class TodoAppGUI:
         
         
         tag_vars = {}
-        current_tags = task.get("tags", [])
-        for i, tag in enumerate(["Work", "Personal", "Study", "Urgent"]):
+        current_tags = task.tags
+        for i, tag in enumerate(TAGS):
             tag_vars[tag] = tk.BooleanVar(value=tag in current_tags)
             ttk.Checkbutton(tags_frame, text=tag, variable=tag_vars[tag]).grid(
                 row=i, column=0, sticky=tk.W, pady=2
@@ -477,14 +1114,15 @@ class TodoAppGUI:
             selected_tags = [tag for tag, var in tag_vars.items() if var.get()]
             
             # Update task
-            task["title"] = title
-            task["description"] = description
-            task["priority"] = priority
-            task["due_date"] = due_date_str
-            task["tags"] = selected_tags
-            
-            self.save_tasks()
-            self.update_task_list()
+            self.engine.update_task(
+                task.id,
+                title=title,
+                description=description,
+                priority=priority,
+                due_date=due_date_str,
+                tags=selected_tags
+            )
+            self.refresh_task(task)
             
             messagebox.showinfo("Success", f"Task '{title}' updated!")
             edit_window.destroy()
@@ -493,15 +1131,14 @@ class TodoAppGUI:
         
     def view_task(self, event):
         # Get selected task
-        selected_item = self.task_tree.selection()
-        if not selected_item:
+        selected_ids = self.task_list.selected_task_ids()
+        if not selected_ids:
             return
             
-        item_id = self.task_tree.item(selected_item[0], 'values')[0]
-        task_id = int(item_id)
+        task_id = selected_ids[0]
         
-        # Find corresponding task
-        task = next((t for t in self.tasks if t["id"] == task_id), None)
+        # Find corresponding task, which may be archived
+        task = self.engine.get(task_id) or self.engine.archived_task(task_id)
         if not task:
             return
             
@@ -515,11 +1152,11 @@ class TodoAppGUI:
         ttk.Label(view_window, text="Task Details", font=('Arial', 14, 'bold')).pack(pady=10)
         
         # Tag color indicators
-        if task.get("tags"):
+        if task.tags:
             tag_frame = ttk.Frame(view_window)
             tag_frame.pack(fill=tk.X, padx=20)
             
-            for tag in task.get("tags", []):
+            for tag in task.tags:
                 tag_label = ttk.Label(tag_frame, text=tag, background=self.tag_colors.get(tag, "#cccccc"),
                                      foreground="white", padding=(5, 2))
                 tag_label.pack(side=tk.LEFT, padx=5)
@@ -529,43 +1166,43 @@ class TodoAppGUI:
         
         # Task ID
         ttk.Label(details_frame, text="ID:", font=('Arial', 10, 'bold')).grid(row=0, column=0, sticky=tk.W, pady=5)
-        ttk.Label(details_frame, text=str(task["id"])).grid(row=0, column=1, sticky=tk.W, pady=5)
+        ttk.Label(details_frame, text=str(task.id)).grid(row=0, column=1, sticky=tk.W, pady=5)
         
         # Task title
         ttk.Label(details_frame, text="Title:", font=('Arial', 10, 'bold')).grid(row=1, column=0, sticky=tk.W, pady=5)
-        ttk.Label(details_frame, text=task["title"]).grid(row=1, column=1, sticky=tk.W, pady=5)
+        ttk.Label(details_frame, text=task.title).grid(row=1, column=1, sticky=tk.W, pady=5)
         
         # Task Description
         ttk.Label(details_frame, text="Description:", font=('Arial', 10, 'bold')).grid(row=2, column=0, sticky=tk.NW, pady=5)
         desc_text = tk.Text(details_frame, height=5, width=40, wrap=tk.WORD)
-        desc_text.insert(tk.END, task.get("description", "") or "(No Description)")
+        desc_text.insert(tk.END, task.description or "(No Description)")
         desc_text.config(state=tk.DISABLED)
         desc_text.grid(row=2, column=1, sticky=tk.W, pady=5)
         
         # Priority
         ttk.Label(details_frame, text="Priority:", font=('Arial', 10, 'bold')).grid(row=3, column=0, sticky=tk.W, pady=5)
-        priority_label = ttk.Label(details_frame, text=task.get("priority", "Medium"), 
-                                  background=self.priority_colors.get(task.get("priority", "Medium"), "#cccccc"),
+        priority_label = ttk.Label(details_frame, text=task.priority, 
+                                  background=self.priority_colors.get(task.priority, "#cccccc"),
                                   foreground="white", padding=(5, 2))
         priority_label.grid(row=3, column=1, sticky=tk.W, pady=5)
         
         # Due Date
         ttk.Label(details_frame, text="Due Date:", font=('Arial', 10, 'bold')).grid(row=4, column=0, sticky=tk.W, pady=5)
-        ttk.Label(details_frame, text=task.get("due_date", "None") or "None").grid(row=4, column=1, sticky=tk.W, pady=5)
+        ttk.Label(details_frame, text=task.due_date or "None").grid(row=4, column=1, sticky=tk.W, pady=5)
         
         # Status
-        status_text = "Completed" if task["completed"] else "Incomplete"
+        status_text = "Completed" if task.completed else "Incomplete"
         ttk.Label(details_frame, text="Status:", font=('Arial', 10, 'bold')).grid(row=5, column=0, sticky=tk.W, pady=5)
         ttk.Label(details_frame, text=status_text).grid(row=5, column=1, sticky=tk.W, pady=5)
         
         # Creation Time
         ttk.Label(details_frame, text="Creation Time:", font=('Arial', 10, 'bold')).grid(row=6, column=0, sticky=tk.W, pady=5)
-        ttk.Label(details_frame, text=task["created_at"]).grid(row=6, column=1, sticky=tk.W, pady=5)
+        ttk.Label(details_frame, text=task.created_at).grid(row=6, column=1, sticky=tk.W, pady=5)
         
         # Completion Time
-        if task["completed"] and task.get("completed_at"):
+        if task.completed and task.completed_at:
             ttk.Label(details_frame, text="Completion Time:", font=('Arial', 10, 'bold')).grid(row=7, column=0, sticky=tk.W, pady=5)
-            ttk.Label(details_frame, text=task["completed_at"]).grid(row=7, column=1, sticky=tk.W, pady=5)
+            ttk.Label(details_frame, text=task.completed_at).grid(row=7, column=1, sticky=tk.W, pady=5)
         
         # Button Area
         button_frame = ttk.Frame(view_window)
@@ -573,45 +1210,57 @@ class TodoAppGUI:
         
         ttk.Button(button_frame, text="Edit", command=lambda: [view_window.destroy(), self.edit_task()]).pack(side=tk.LEFT, padx=5)
         
-        if not task["completed"]:
+        if not task.completed:
             ttk.Button(button_frame, text="Mark Complete", 
                       command=lambda: [view_window.destroy(), self.complete_task()]).pack(side=tk.LEFT, padx=5)
         
         ttk.Button(button_frame, text="Close", command=view_window.destroy).pack(side=tk.LEFT, padx=5)
         
     def complete_task(self):
-        selected_item = self.task_tree.selection()
-        if not selected_item:
+        if self.still_loading():
+            return
+            
+        selected_ids = self.task_list.selected_task_ids()
+        if not selected_ids:
             messagebox.showwarning("Warning", "Please select a task first!")
             return
             
-        item_id = self.task_tree.item(selected_item[0], 'values')[0]
-        task_id = int(item_id)
+        # Several selected rows are completed together
+        if len(selected_ids) > 1:
+            self.batch_operation("selection", "complete")
+            return
+            
+        task_id = selected_ids[0]
         
         # Find and mark the task
-        for task in self.tasks:
-            if task["id"] == task_id:
-                if task["completed"]:
-                    messagebox.showinfo("Info", "This task is already completed!")
-                    return
-                    
-                task["completed"] = True
-                task["completed_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                self.save_tasks()
-                self.update_task_list()
-                messagebox.showinfo("Success", f"Task '{task['title']}' marked as completed!")
-                return
-                
-        messagebox.showerror("Error", f"Task with ID {task_id} not found!")
+        task = self.engine.get(task_id) or self.engine.archived_task(task_id)
+        if not task:
+            messagebox.showerror("Error", f"Task with ID {task_id} not found!")
+            return
+            
+        if task.completed:
+            messagebox.showinfo("Info", "This task is already completed!")
+            return
+            
+        self.engine.complete_task(task_id)
+        self.refresh_task(task)
+        messagebox.showinfo("Success", f"Task '{task.title}' marked as completed!")
         
     def delete_task(self):
-        selected_item = self.task_tree.selection()
-        if not selected_item:
+        if self.still_loading():
+            return
+            
+        selected_ids = self.task_list.selected_task_ids()
+        if not selected_ids:
             messagebox.showwarning("Warning", "Please select a task first!")
             return
             
-        item_id = self.task_tree.item(selected_item[0], 'values')[0]
-        task_id = int(item_id)
+        # Several selected rows are deleted together
+        if len(selected_ids) > 1:
+            self.batch_operation("selection", "delete")
+            return
+            
+        task_id = selected_ids[0]
         
         # Confirm deletion
         confirm = messagebox.askyesno("Confirm", "Are you sure you want to delete this task?")
@@ -619,65 +1268,195 @@ class TodoAppGUI:
             return
             
         # Find and delete the task
-        for i, task in enumerate(self.tasks):
-            if task["id"] == task_id:
-                deleted = self.tasks.pop(i)
-                self.save_tasks()
-                self.update_task_list()
-                messagebox.showinfo("Success", f"Task '{deleted['title']}' deleted!")
-                return
-                
-        messagebox.showerror("Error", f"Task with ID {task_id} not found!")
+        deleted = self.engine.delete_task(task_id)
+        if not deleted:
+            messagebox.showerror("Error", f"Task with ID {task_id} not found!")
+            return
+            
+        with self.engine.metrics.timer("list.reconcile"):
+            self.task_list.remove(task_id)
+            self.update_status_bar()
+        self.query_scheduler.invalidate()
+        messagebox.showinfo("Success", f"Task '{deleted.title}' deleted!")
         
     def export_tasks(self):
-        """Export tasks to a text file"""
+        """Export all tasks or the current view; the file is written on a worker thread"""
         from tkinter import filedialog
         
-        # Get save path
-        filename = filedialog.asksaveasfilename(
-            initialdir="./",
-            title="Export Tasks",
-            filetypes=(("Text files", "*.txt"), ("All files", "*.*"))
+        export_window = tk.Toplevel(self.root)
+        export_window.title("Export Tasks")
+        export_window.geometry("420x220")
+        export_window.resizable(False, False)
+        
+        form_frame = ttk.Frame(export_window)
+        form_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        # Format
+        labels = {exporter.label: fmt for fmt, exporter in EXPORT_FORMATS.items()}
+        ttk.Label(form_frame, text="Format:", font=('Arial', 10, 'bold')).grid(row=0, column=0, sticky=tk.W, pady=5)
+        format_var = tk.StringVar(value=EXPORT_FORMATS["txt"].label)
+        ttk.Combobox(form_frame, textvariable=format_var, values=list(labels), width=20, state="readonly").grid(
+            row=0, column=1, sticky=tk.W, pady=5
         )
         
-        if not filename:
+        # Only the filtered and sorted tasks of the list
+        view_only = tk.BooleanVar(value=False)
+        ttk.Checkbutton(form_frame, text="Only the tasks in the current view", variable=view_only).grid(
+            row=1, column=0, columnspan=2, sticky=tk.W, pady=5
+        )
+        
+        progress = ttk.Progressbar(form_frame, length=360, mode='determinate')
+        progress.grid(row=2, column=0, columnspan=2, pady=10)
+        
+        button_frame = ttk.Frame(form_frame)
+        button_frame.grid(row=3, column=0, columnspan=2, pady=5)
+        
+        cancelled = threading.Event()
+        
+        def check_cancelled():
+            if cancelled.is_set():
+                raise ExportCancelled()
+                
+        def cancel():
+            cancelled.set()
+            export_window.destroy()
+            
+        def finished(error, count, filename):
+            if export_window.winfo_exists():
+                export_window.destroy()
+            if isinstance(error, ExportCancelled):
+                return
+            if error:
+                messagebox.showerror("Error", f"Export failed: {str(error)}")
+            else:
+                messagebox.showinfo("Success", f"{count} tasks exported to {filename}")
+                
+        def run_export(filename, fmt, tasks):
+            last_update = [time.monotonic()]
+            
+            def report(count):
+                # Update the bar a few times a second, not every report
+                if time.monotonic() - last_update[0] > 0.1:
+                    last_update[0] = time.monotonic()
+                    self.root.after(0, lambda: export_window.winfo_exists() and progress.config(value=count))
+                    
+            try:
+                count = self.engine.export(filename, fmt, tasks, report, check_cancelled)
+                error = None
+            except Exception as e:
+                count, error = 0, e
+            self.root.after(0, lambda: finished(error, count, filename))
+            
+        def start_export():
+            fmt = labels[format_var.get()]
+            extension = EXPORT_FORMATS[fmt].extension
+            filename = filedialog.asksaveasfilename(
+                parent=export_window,
+                initialdir="./",
+                title="Export Tasks",
+                defaultextension=extension,
+                filetypes=((format_var.get(), "*" + extension), ("All files", "*.*"))
+            )
+            if not filename:
+                return
+                
+            # Ensure the file has the extension of the format
+            if not filename.endswith(extension):
+                filename += extension
+                
+            tasks = list(self.task_list.rows) if view_only.get() else None
+            total = self.engine.statistics.total + self.engine.archive.count
+            progress.config(maximum=max(1, len(tasks) if tasks is not None else total))
+            export_button.config(state=tk.DISABLED)
+            threading.Thread(target=run_export, args=(filename, fmt, tasks), daemon=True).start()
+            
+        export_button = ttk.Button(button_frame, text="Export", command=start_export)
+        export_button.pack(side=tk.LEFT, padx=10)
+        ttk.Button(button_frame, text="Cancel", command=cancel).pack(side=tk.LEFT, padx=10)
+        export_window.protocol("WM_DELETE_WINDOW", cancel)
+    
+    def import_tasks(self):
+        """Bulk import tasks from a file on a worker thread, then refresh the list once"""
+        from tkinter import filedialog
+        
+        if self.still_loading():
             return
             
-        # Ensure the file has a .txt extension
-        if not filename.endswith('.txt'):
-            filename += '.txt'
+        filename = filedialog.askopenfilename(
+            initialdir="./",
+            title="Import Tasks",
+            filetypes=tuple((label, "*" + extension) for extension, label, _ in IMPORT_FORMATS.values())
+            + (("All files", "*.*"),)
+        )
+        if not filename:
+            return
             
-        try:
-            with open(filename, 'w', encoding='utf-8') as file:
-                file.write("===== To-Do List =====\n\n")
+        import_window = tk.Toplevel(self.root)
+        import_window.title("Import Tasks")
+        import_window.geometry("420x160")
+        import_window.resizable(False, False)
+        
+        form_frame = ttk.Frame(import_window)
+        form_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        ttk.Label(form_frame, text=os.path.basename(filename), font=('Arial', 10, 'bold')).pack(anchor=tk.W)
+        progress_label = ttk.Label(form_frame, text="Reading...")
+        progress_label.pack(anchor=tk.W, pady=10)
+        
+        cancelled = threading.Event()
+        
+        def check_cancelled():
+            if cancelled.is_set():
+                raise ImportCancelled()
                 
-                # Incomplete tasks
-                file.write("--- Incomplete Tasks ---\n")
-                for task in self.tasks:
-                    if not task["completed"]:
-                        file.write(f"[{task['id']}] {task['title']}\n")
-                        file.write(f"  Priority: {task.get('priority', 'Medium')}\n")
-                        
-                        if task.get("due_date"):
-                            file.write(f"  Due Date: {task['due_date']}\n")
-                            
-                        if task.get("tags"):
-                            file.write(f"  Tags: {', '.join(task['tags'])}\n")
-                            
-                        if task.get("description"):
-                            file.write(f"  Description: {task['description']}\n")
-                            
-                        file.write("\n")
+        def cancel():
+            cancelled.set()
+            import_window.destroy()
+            
+        def show_progress(text):
+            if import_window.winfo_exists():
+                progress_label.config(text=text)
                 
-                # Completed tasks
-                file.write("\n--- Completed Tasks ---\n")
-                for task in self.tasks:
-                    if task["completed"]:
-                        file.write(f"[{task['id']}] {task['title']} (Completed at: {task.get('completed_at', 'Unknown')})\n")
+        def finished(error, result):
+            if import_window.winfo_exists():
+                import_window.destroy()
+            if isinstance(error, ImportCancelled):
+                return
+            if error:
+                messagebox.showerror("Error", f"Import failed: {str(error)}")
+                return
                 
-            messagebox.showinfo("Success", f"Tasks exported to {filename}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Export failed: {str(e)}")
+            # One refresh for the whole batch
+            self.update_task_list()
+            self.update_status_bar()
+            message = result.summary()
+            if result.rejected:
+                message += "\n\n" + "\n".join(f"Row {number}: {reason}" for number, reason in result.rejected[:10])
+                if len(result.rejected) > 10:
+                    message += f"\n... and {len(result.rejected) - 10} more"
+            messagebox.showinfo("Import Finished", message)
+            
+        def run_import():
+            last_update = [time.monotonic()]
+            
+            def report(result):
+                # Update the label a few times a second, not every batch
+                if time.monotonic() - last_update[0] > 0.1:
+                    last_update[0] = time.monotonic()
+                    text = (f"{result.rows:,} rows, {result.rows_per_second:,.0f} rows/s, "
+                            f"{len(result.rejected):,} rejected, {result.duplicates:,} duplicates")
+                    self.root.after(0, lambda: show_progress(text))
+                    
+            try:
+                result = self.engine.import_file(filename, progress=report, check_cancelled=check_cancelled)
+                error = None
+            except Exception as e:
+                result, error = None, e
+            self.root.after(0, lambda: finished(error, result))
+            
+        ttk.Button(form_frame, text="Cancel", command=cancel).pack()
+        import_window.protocol("WM_DELETE_WINDOW", cancel)
+        threading.Thread(target=run_import, daemon=True).start()
     
     def add_menu(self):
         """Add menu bar"""
@@ -685,9 +1464,11 @@ class TodoAppGUI:
         
         # File menu
         file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Import Tasks", command=self.import_tasks)
         file_menu.add_command(label="Export Tasks", command=self.export_tasks)
+        file_menu.add_command(label="Archive Completed Tasks...", command=self.archive_now)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.quit_app)
         menubar.add_cascade(label="File", menu=file_menu)
         
         # Edit menu
@@ -696,18 +1477,82 @@ class TodoAppGUI:
         edit_menu.add_command(label="Edit Task", command=self.edit_task)
         edit_menu.add_command(label="Delete Task", command=self.delete_task)
         edit_menu.add_command(label="Mark Complete", command=self.complete_task)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Restore from Archive", command=self.restore_archived)
         menubar.add_cascade(label="Edit", menu=edit_menu)
         
+        # Batch menu, on the selected tasks or on every task in the view
+        batch_menu = tk.Menu(menubar, tearoff=0)
+        for scope, label in (("selection", "Selected Tasks"), ("view", "All Tasks in View")):
+            scope_menu = tk.Menu(batch_menu, tearoff=0)
+            scope_menu.add_command(label="Mark Complete", command=lambda s=scope: self.batch_operation(s, "complete"))
+            scope_menu.add_command(label="Delete", command=lambda s=scope: self.batch_operation(s, "delete"))
+            priority_menu = tk.Menu(scope_menu, tearoff=0)
+            for priority in PRIORITIES:
+                priority_menu.add_command(label=priority, command=lambda s=scope, p=priority: self.batch_operation(s, "priority", p))
+            scope_menu.add_cascade(label="Set Priority", menu=priority_menu)
+            add_tag_menu = tk.Menu(scope_menu, tearoff=0)
+            remove_tag_menu = tk.Menu(scope_menu, tearoff=0)
+            for tag in TAGS:
+                add_tag_menu.add_command(label=tag, command=lambda s=scope, t=tag: self.batch_operation(s, "add_tag", t))
+                remove_tag_menu.add_command(label=tag, command=lambda s=scope, t=tag: self.batch_operation(s, "remove_tag", t))
+            scope_menu.add_cascade(label="Add Tag", menu=add_tag_menu)
+            scope_menu.add_cascade(label="Remove Tag", menu=remove_tag_menu)
+            batch_menu.add_cascade(label=label, menu=scope_menu)
+        menubar.add_cascade(label="Batch", menu=batch_menu)
+        
+        # Workspace menu, rebuilt each time it opens so it lists the current workspaces
+        workspace_menu = tk.Menu(menubar, tearoff=0)
+        
+        def fill_workspace_menu():
+            workspace_menu.delete(0, tk.END)
+            for name in self.workspaces.names():
+                workspace_menu.add_radiobutton(label=name, variable=self.workspace_var, value=name,
+                                               command=lambda n=name: self.switch_workspace(n))
+            workspace_menu.add_separator()
+            workspace_menu.add_command(label="New Workspace...", command=self.new_workspace)
+            workspace_menu.add_command(label="Rename Workspace...", command=self.rename_workspace)
+            workspace_menu.add_command(label="Delete Workspace...", command=self.delete_workspace)
+            workspace_menu.add_separator()
+            workspace_menu.add_command(label="Search All Workspaces...", command=self.search_all_workspaces)
+            workspace_menu.add_command(label="Statistics of All Workspaces", command=lambda: self.show_task_statistics(all_workspaces=True))
+            
+        workspace_menu.config(postcommand=fill_workspace_menu)
+        fill_workspace_menu()
+        menubar.add_cascade(label="Workspace", menu=workspace_menu)
+        
         # View menu
         view_menu = tk.Menu(menubar, tearoff=0)
         view_menu.add_command(label="All Tasks", command=lambda: [self.filter_status.set("All"), self.update_task_list()])
         view_menu.add_command(label="Incomplete Tasks", command=lambda: [self.filter_status.set("Incomplete"), self.update_task_list()])
         view_menu.add_command(label="Completed Tasks", command=lambda: [self.filter_status.set("Completed"), self.update_task_list()])
+        view_menu.add_command(label="Overdue", command=lambda: [self.filter_status.set("Overdue"), self.update_task_list()])
         view_menu.add_command(label="Due Today", command=lambda: [self.filter_status.set("Due Today"), self.update_task_list()])
+        view_menu.add_command(label="Due This Week", command=lambda: [self.filter_status.set("Due This Week"), self.update_task_list()])
+        view_menu.add_command(label="Next 7 Days", command=lambda: [self.filter_status.set("Next 7 Days"), self.update_task_list()])
+        view_menu.add_separator()
+        fixed_items = view_menu.index(tk.END) + 1
+        delete_view_menu = tk.Menu(view_menu, tearoff=0)
+        
+        # Saved queries follow, rebuilt each time the menu opens
+        def fill_saved_views():
+            view_menu.delete(fixed_items, tk.END)
+            delete_view_menu.delete(0, tk.END)
+            for name in self.saved_queries.names():
+                view_menu.add_command(label=name, command=lambda n=name: self.open_saved_view(n))
+                delete_view_menu.add_command(label=name, command=lambda n=name: self.delete_saved_view(n))
+            view_menu.add_separator()
+            view_menu.add_command(label="Save Current Query as View...", command=self.save_view)
+            view_menu.add_cascade(label="Delete Saved View", menu=delete_view_menu)
+            
+        view_menu.config(postcommand=fill_saved_views)
+        fill_saved_views()
         menubar.add_cascade(label="View", menu=view_menu)
         
         # Help menu
         help_menu = tk.Menu(menubar, tearoff=0)
+        help_menu.add_command(label="Performance", command=self.show_performance)
+        help_menu.add_separator()
         help_menu.add_command(label="About", command=self.show_about)
         menubar.add_cascade(label="Help", menu=help_menu)
         
@@ -736,35 +1581,289 @@ class TodoAppGUI:
                   text="OK", 
                   command=about_window.destroy).pack(pady=20)
                   
-    def show_task_statistics(self):
-        """Show task statistics"""
+    def search_all_workspaces(self):
+        """Search and filter every workspace at once; double-click a result to open its workspace"""
+        search_window = tk.Toplevel(self.root)
+        search_window.title("Search All Workspaces")
+        search_window.geometry("760x420")
+        
+        form_frame = ttk.Frame(search_window)
+        form_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        ttk.Label(form_frame, text="Search:").pack(side=tk.LEFT)
+        query_var = tk.StringVar(value=self.search_var.get())
+        query_entry = ttk.Entry(form_frame, textvariable=query_var, width=30)
+        query_entry.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(form_frame, text="Status:").pack(side=tk.LEFT, padx=5)
+        status_var = tk.StringVar(value=self.filter_status.get())
+        ttk.Combobox(form_frame, textvariable=status_var, values=STATUS_FILTERS, width=13, state="readonly").pack(side=tk.LEFT)
+        
+        ttk.Label(form_frame, text="Tag:").pack(side=tk.LEFT, padx=5)
+        tag_var = tk.StringVar(value=self.filter_tag.get())
+        ttk.Combobox(form_frame, textvariable=tag_var, values=["All"] + TAGS, width=10, state="readonly").pack(side=tk.LEFT)
+        
+        result_label = ttk.Label(search_window, text="")
+        result_label.pack(anchor=tk.W, padx=10)
+        
+        list_frame = ttk.Frame(search_window)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        columns = ('workspace', 'id', 'status', 'priority', 'title', 'due_date')
+        result_tree = ttk.Treeview(list_frame, columns=columns, show='headings')
+        for column, heading, width in (('workspace', 'Workspace', 120), ('id', 'ID', 50), ('status', 'Status', 60),
+                                       ('priority', 'Priority', 70), ('title', 'Task', 300), ('due_date', 'Due Date', 100)):
+            result_tree.heading(column, text=heading)
+            result_tree.column(column, width=width, anchor=tk.W if column in ('workspace', 'title') else 'center')
+        result_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=result_tree.yview)
+        result_tree.configure(yscrollcommand=result_scrollbar.set)
+        result_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        result_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Rows inserted into the plain Treeview; refine the search to see others
+        limit = 1000
+        
+        def show_results(results, elapsed):
+            if not search_window.winfo_exists():
+                return
+            search_button.config(state=tk.NORMAL)
+            result_tree.delete(*result_tree.get_children())
+            for name, task in results[:limit]:
+                result_tree.insert('', tk.END, values=(
+                    name, task.id, "✓" if task.completed else "✗", task.priority, task.title, task.due_date
+                ))
+            shown = f", showing the first {limit}" if len(results) > limit else ""
+            result_label.config(text=f"{len(results)} tasks in {len(self.workspaces.names())} workspaces ({elapsed:.2f} s){shown}")
+            
+        def run_search(query):
+            started = time.perf_counter()
+            try:
+                results = self.workspaces.query_all(**query)
+            except Exception as e:
+                self.root.after(0, lambda: messagebox.showerror("Error", f"Search failed: {str(e)}", parent=search_window))
+                results = []
+            elapsed = time.perf_counter() - started
+            self.root.after(0, lambda: show_results(results, elapsed))
+            
+        def start_search(event=None):
+            query = {
+                "search_text": query_var.get().lower(),
+                "status": status_var.get(),
+                "tag": tag_var.get(),
+                "sort": self.sort_by.get(),
+                "today": self.today,
+            }
+            search_button.config(state=tk.DISABLED)
+            result_label.config(text="Searching...")
+            # Closed workspaces are read on the worker thread, a few at a time
+            threading.Thread(target=run_search, args=(query,), daemon=True).start()
+            
+        def open_result(event):
+            item = result_tree.focus()
+            if not item:
+                return
+            name, task_id, status, priority, title, due_date = result_tree.item(item, 'values')
+            self.switch_workspace(name)
+            self.search_var.set(title)
+            
+        search_button = ttk.Button(form_frame, text="Search", command=start_search)
+        search_button.pack(side=tk.LEFT, padx=10)
+        query_entry.bind('<Return>', start_search)
+        result_tree.bind('<Double-1>', open_result)
+        query_entry.focus_set()
+        
+    def show_performance(self):
+        """Show recent timings, histograms and counters of the hot paths"""
+        from tkinter import filedialog
+        
+        metrics = self.engine.metrics
+        perf_window = tk.Toplevel(self.root)
+        perf_window.title("Performance")
+        perf_window.geometry("760x560")
+        
+        # Recording and profiling switches
+        controls = ttk.Frame(perf_window)
+        controls.pack(fill=tk.X, padx=10, pady=10)
+        
+        recording = tk.BooleanVar(value=metrics.enabled)
+        ttk.Checkbutton(controls, text="Record timings", variable=recording,
+                        command=lambda: setattr(metrics, "enabled", recording.get())).pack(side=tk.LEFT)
+        
+        profiling = tk.BooleanVar(value=metrics.profiling)
+        
+        def toggle_profiling():
+            if profiling.get():
+                metrics.start_profiling()
+            else:
+                metrics.stop_profiling()
+                show_profile()
+                
+        ttk.Checkbutton(controls, text="Profile with cProfile", variable=profiling,
+                        command=toggle_profiling).pack(side=tk.LEFT, padx=10)
+        
+        # Timers, one row each
+        columns = ("count", "last", "mean", "p50", "p99", "max")
+        table_frame = ttk.Frame(perf_window)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        table = ttk.Treeview(table_frame, columns=columns, height=10)
+        table.heading("#0", text="Timer")
+        table.column("#0", width=180)
+        for column in columns:
+            table.heading(column, text=column if column == "count" else f"{column} ms")
+            table.column(column, width=90, anchor=tk.E)
+        table_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=table.yview)
+        table.configure(yscrollcommand=table_scrollbar.set)
+        table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        table_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Histogram and recent samples of the selected timer
+        histogram_title = ttk.Label(perf_window, text="Select a timer to see its histogram", font=('Arial', 10, 'bold'))
+        histogram_title.pack(anchor=tk.W, padx=10, pady=(10, 0))
+        canvas = tk.Canvas(perf_window, height=140, background="white", highlightthickness=0)
+        canvas.pack(fill=tk.X, padx=10, pady=5)
+        recent_label = ttk.Label(perf_window, text="", wraplength=720)
+        recent_label.pack(anchor=tk.W, padx=10)
+        counters_label = ttk.Label(perf_window, text="", wraplength=720)
+        counters_label.pack(anchor=tk.W, padx=10, pady=5)
+        
+        def format_ms(value):
+            return "" if value is None else f"{value:.2f}"
+            
+        def draw_histogram(name, stats):
+            canvas.delete("all")
+            if stats is None:
+                histogram_title.config(text="Select a timer to see its histogram")
+                recent_label.config(text="")
+                return
+            histogram_title.config(text=f"{name}: {stats['count']:,} calls, {stats['total_ms']:,.1f} ms in total")
+            buckets = list(stats["histogram"].items())
+            width = max(canvas.winfo_width(), 400)
+            height = int(canvas.cget("height"))
+            bar_width = width / len(buckets)
+            tallest = max(count for _, count in buckets) or 1
+            for index, (label, count) in enumerate(buckets):
+                x0 = index * bar_width + 2
+                bar_height = (height - 35) * count / tallest
+                canvas.create_rectangle(x0, height - 20 - bar_height, x0 + bar_width - 4, height - 20,
+                                        fill=self.primary_color, outline="")
+                if count:
+                    canvas.create_text(x0 + bar_width / 2 - 2, height - 27 - bar_height, text=str(count), font=('Arial', 7))
+                canvas.create_text(x0 + bar_width / 2 - 2, height - 10, text=label, font=('Arial', 7))
+            recent = ", ".join(f"{sample:.2f}" for sample in stats["recent_ms"][-15:])
+            recent_label.config(text=f"Recent (ms): {recent}")
+            
+        def refresh():
+            if not perf_window.winfo_exists():
+                return
+            snapshot = metrics.snapshot()
+            for name, stats in snapshot["timers"].items():
+                values = (f"{stats['count']:,}", format_ms(stats["last_ms"]), format_ms(stats["mean_ms"]),
+                          format_ms(stats["p50_ms"]), format_ms(stats["p99_ms"]), format_ms(stats["max_ms"]))
+                if table.exists(name):
+                    table.item(name, values=values)
+                else:
+                    table.insert('', tk.END, iid=name, text=name, values=values)
+            selection = table.selection()
+            name = selection[0] if selection else None
+            draw_histogram(name, snapshot["timers"].get(name))
+            counters = ", ".join(f"{name}: {count:,}" for name, count in snapshot["counters"].items())
+            counters_label.config(text=f"Counters: {counters or 'none yet'}")
+            # Keep the numbers live while the window is open
+            perf_window.after(1000, refresh)
+            
+        def reset():
+            metrics.reset()
+            table.delete(*table.get_children())
+            draw_histogram(None, None)
+            
+        def show_profile():
+            profile_window = tk.Toplevel(perf_window)
+            profile_window.title("Profile")
+            profile_window.geometry("800x500")
+            text = tk.Text(profile_window, wrap=tk.NONE, font=('Courier', 9))
+            text_scrollbar = ttk.Scrollbar(profile_window, orient=tk.VERTICAL, command=text.yview)
+            text.configure(yscrollcommand=text_scrollbar.set)
+            text_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            text.pack(fill=tk.BOTH, expand=True)
+            text.insert(tk.END, metrics.profile_report())
+            text.config(state=tk.DISABLED)
+            
+        def dump():
+            filename = filedialog.asksaveasfilename(
+                parent=perf_window,
+                initialdir="./",
+                title="Dump Metrics",
+                defaultextension=".json",
+                filetypes=(("JSON files", "*.json"), ("All files", "*.*"))
+            )
+            if not filename:
+                return
+            try:
+                written = metrics.dump(filename)
+            except OSError as e:
+                messagebox.showerror("Error", f"Dump failed: {str(e)}", parent=perf_window)
+                return
+            messagebox.showinfo("Success", "Metrics written to " + " and ".join(written), parent=perf_window)
+            
+        def refresh_selection(event):
+            selection = table.selection()
+            name = selection[0] if selection else None
+            draw_histogram(name, metrics.snapshot()["timers"].get(name))
+            
+        table.bind('<<TreeviewSelect>>', refresh_selection)
+        
+        button_frame = ttk.Frame(perf_window)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Reset", command=reset).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Dump to File", command=dump).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Show Profile", command=show_profile).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=perf_window.destroy).pack(side=tk.LEFT, padx=5)
+        
+        refresh()
+        
+    def show_task_statistics(self, all_workspaces=False, statistics=None):
+        """Show task statistics of the active workspace or of all of them"""
+        if all_workspaces and statistics is None:
+            # Closed workspaces whose files changed are read again, so count on a worker thread
+            self.status_label.config(text="Counting the tasks of all workspaces...")
+            
+            def count_all():
+                try:
+                    result = self.workspaces.statistics_all()
+                except Exception as e:
+                    self.root.after(0, lambda error=e: messagebox.showerror("Error", f"Statistics failed: {str(error)}"))
+                    self.root.after(0, self.update_status_bar)
+                    return
+                self.root.after(0, lambda: self.show_task_statistics(True, result))
+                
+            threading.Thread(target=count_all, daemon=True).start()
+            return
+        
         stats_window = tk.Toplevel(self.root)
         stats_window.title("Task Statistics")
-        stats_window.geometry("400x300")
+        stats_window.geometry("400x360")
         
-        # Calculate statistics
-        total = len(self.tasks)
-        completed = sum(1 for task in self.tasks if task["completed"])
-        pending = total - completed
+        # Read the maintained counters; closed workspaces answer from their saved counters
+        if all_workspaces:
+            self.update_status_bar()
+            scope = "All Workspaces"
+        else:
+            statistics = self.engine.statistics
+            scope = self.workspaces.active
+        total = statistics.total
+        completed = statistics.completed
+        pending = statistics.pending
         
         # Statistics by priority
         priority_stats = {
-            "High": sum(1 for task in self.tasks if task.get("priority") == "High"),
-            "Medium": sum(1 for task in self.tasks if task.get("priority") == "Medium"),
-            "Low": sum(1 for task in self.tasks if task.get("priority") == "Low"),
+            priority: statistics.by_priority.get(priority, 0)
+            for priority in PRIORITIES
         }
         
         # Statistics by tag
-        tag_stats = {}
-        for task in self.tasks:
-            for tag in task.get("tags", []):
-                if tag in tag_stats:
-                    tag_stats[tag] += 1
-                else:
-                    tag_stats[tag] = 1
+        tag_stats = dict(statistics.by_tag)
         
         # Display statistics
-        ttk.Label(stats_window, text="Task Statistics", font=('Arial', 14, 'bold')).pack(pady=10)
+        ttk.Label(stats_window, text=f"Task Statistics: {scope}", font=('Arial', 14, 'bold')).pack(pady=10)
         
         stats_frame = ttk.Frame(stats_window)
         stats_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -800,8 +1899,19 @@ class TodoAppGUI:
                 ttk.Label(stats_frame, text=str(count)).grid(row=row, column=1, sticky=tk.W, pady=2)
                 row += 1
         
-        # Close button
-        ttk.Button(stats_window, text="Close", command=stats_window.destroy).pack(pady=10)
+        if not all_workspaces:
+            ttk.Label(stats_window, text=f"Archived completed tasks: {self.engine.archive.count}").pack()
+            
+        # Switch between this workspace and all of them, and close
+        button_frame = ttk.Frame(stats_window)
+        button_frame.pack(pady=10)
+        
+        def switch_scope():
+            stats_window.destroy()
+            self.show_task_statistics(not all_workspaces)
+            
+        ttk.Button(button_frame, text="This Workspace" if all_workspaces else "All Workspaces", command=switch_scope).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=stats_window.destroy).pack(side=tk.LEFT, padx=5)
 
 def main():
     root = tk.Tk()
@@ -815,6 +1925,9 @@ def main():
     stats_btn.pack(side=tk.BOTTOM, padx=10, pady=5, anchor=tk.SE)
     
     root.mainloop()
+    
+    # Flush queued changes, wait for running compactions and close every workspace
+    app.workspaces.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,90 @@
+import os
+import json
+import gzip
+import shutil
+import tempfile
+import unittest
+
+from todo_model import Task
+from todo_archive import TaskArchive
+
+
+def completed_task(task_id):
+    return Task(id=task_id, title=f"Task {task_id}", completed=True,
+                created_at="2024-01-01 09:00:00", completed_at="2024-01-02 09:00:00")
+
+
+class TaskArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "todo_data.archive.jsonl.gz")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open_archive(self):
+        archive = TaskArchive(self.filename)
+        self.addCleanup(archive.close)
+        return archive
+
+    def test_add_and_remove(self):
+        archive = self.open_archive()
+        archive.add([completed_task(1), completed_task(2)])
+        archive.add([completed_task(3)])
+        archive.remove([2])
+        self.assertEqual(sorted(self.open_archive().load()), [1, 3])
+        self.assertEqual((archive.count, archive.max_id), (2, 3))
+
+    def test_append_after_torn_member(self):
+        archive = self.open_archive()
+        archive.add([completed_task(1)])
+        archive.add([completed_task(2)])
+        size = os.path.getsize(self.filename)
+        # An append interrupted halfway, before the meta was written
+        member = gzip.compress(json.dumps({"op": "put", "task": completed_task(9).to_dict()}).encode())
+        with open(self.filename, "ab") as file:
+            file.write(member[:len(member) // 2])
+
+        archive = self.open_archive()
+        self.assertEqual(sorted(archive.load()), [1, 2])
+        archive.add([completed_task(3)])
+        self.assertEqual(sorted(self.open_archive().load()), [1, 2, 3])
+        self.assertEqual(os.path.getsize(self.filename), archive.size)
+        self.assertGreater(archive.size, size)
+
+    def test_append_before_meta_update_is_kept(self):
+        archive = self.open_archive()
+        archive.add([completed_task(1), completed_task(2)])
+        # The process dies after the member is written, before its meta
+        archive._write_meta = lambda: None
+        archive.remove([1])
+        archive.add([completed_task(3)])
+
+        archive = self.open_archive()
+        self.assertEqual(sorted(archive.load()), [2, 3])
+        self.assertEqual((archive.count, archive.max_id), (2, 3))
+        self.assertEqual(archive.size, os.path.getsize(self.filename))
+        with open(self.filename + ".meta", "r", encoding="utf-8") as file:
+            self.assertEqual(json.load(file), {"count": 2, "max_id": 3, "size": archive.size})
+
+    def test_read_past_damaged_member(self):
+        archive = self.open_archive()
+        archive.add([completed_task(1)])
+        archive.add([completed_task(2)])
+        archive.add([completed_task(3)])
+        # Damage the compressed data of the second member in place
+        first_end, second_end = [end for end, data in archive.iter_members()][:2]
+        with open(self.filename, "r+b") as file:
+            file.seek((first_end + second_end) // 2)
+            file.write(b"\xff\xff\xff\xff")
+        os.remove(self.filename + ".meta")
+
+        archive = self.open_archive()
+        self.assertEqual(sorted(archive.load()), [1, 3])
+        records = list(archive.iter_records())
+        self.assertEqual([record["task"]["id"] for record in records], [1, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from todo_bench import generate_tasks
+from todo_engine import TaskEngine
+from todo_storage import write_json_atomic
+
+
+class BatchTest(unittest.TestCase):
+    """Batch edits of many tasks are persisted with one storage write"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, "todo_data.json")
+        tasks = list(generate_tasks(100, completion_ratio=0))
+        for task in tasks:
+            task.update(priority="Medium", tags=[])
+        write_json_atomic(self.filename, tasks)
+
+    def open_engine(self, mode="journal", write_behind=False):
+        engine = TaskEngine(self.filename, mode, write_behind=write_behind)
+        engine.load()
+        self.addCleanup(engine.close)
+        return engine
+
+    def count_writes(self, storage):
+        """Count the apply() calls of storage; returns the list of batches"""
+        batches = []
+        apply = storage.apply
+
+        def counted(changes, tasks):
+            batches.append(set(changes))
+            return apply(changes, tasks)
+
+        storage.apply = counted
+        return batches
+
+    def test_each_batch_is_one_write(self):
+        engine = self.open_engine()
+        batches = self.count_writes(engine.storage)
+        ids = list(range(1, 51))
+
+        self.assertEqual(len(engine.complete_tasks(ids)), 50)
+        self.assertEqual(len(engine.update_tasks(ids[:20], priority="Low")), 20)
+        self.assertEqual(len(engine.tag_tasks(ids[:10], "Errand")), 10)
+        self.assertEqual(len(engine.delete_tasks(ids[40:])), 10)
+        self.assertEqual(batches, [set(ids), set(ids[:20]), set(ids[:10]), set(ids[40:])])
+
+        # Tasks the change leaves as they are are not written again
+        self.assertEqual(engine.complete_tasks(ids), [])
+        self.assertEqual(engine.tag_tasks(ids[:10], "Errand"), [])
+        self.assertEqual(len(batches), 4)
+
+        tasks = {task.id: task for task in self.open_engine().tasks}
+        self.assertEqual(len(tasks), 90)
+        self.assertTrue(all(tasks[task_id].completed for task_id in ids[:40]))
+        self.assertEqual({tasks[task_id].priority for task_id in ids[:20]}, {"Low"})
+        self.assertTrue(all("Errand" in tasks[task_id].tags for task_id in ids[:10]))
+        self.assertFalse(any("Errand" in tasks[task_id].tags for task_id in ids[10:40]))
+
+    def test_burst_of_batches_is_one_flush(self):
+        engine = self.open_engine("json", write_behind=True)
+        batches = self.count_writes(engine.storage.inner)
+        engine.complete_tasks(range(1, 31))
+        engine.tag_tasks(range(1, 11), "Errand")
+        engine.update_tasks(range(21, 41), priority="High")
+        engine.flush()
+        self.assertEqual(batches, [set(range(1, 41))])
+        tasks = {task.id: task for task in self.open_engine("json").tasks}
+        self.assertEqual(sum(task.completed for task in tasks.values()), 30)
+        self.assertEqual(sum(task.priority == "High" for task in tasks.values()), 20)
+
+    def test_delete_includes_archived_tasks(self):
+        engine = self.open_engine()
+        engine.complete_tasks(range(1, 6))
+        for task_id in range(1, 6):
+            engine.update_task(task_id, completed_at="2020-01-01 09:00:00")
+        self.assertEqual(engine.archive_completed(days=30, now=datetime(2026, 10, 18)), 5)
+        deleted = engine.delete_tasks([4, 5, 6, 999])
+        self.assertEqual(sorted(task.id for task in deleted), [4, 5, 6])
+        self.assertEqual(sorted(task.id for task in engine.archive.iter_tasks()), [1, 2, 3])
+        self.assertEqual(len(engine.tasks), 94)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from todo_engine import TaskEngine
+
+CSV_ROWS = """Title,Description,Priority,Due Date,Tags,Completed,Created At,Completed At
+Write report,Quarterly numbers,High,2026-11-01,Work;Urgent,no,2026-01-05 09:00:00,
+Buy milk,,Low,,,yes,2026-01-06 10:00:00,2026-01-07 10:00:00
+,No title here,Medium,,,no,,
+Call dentist,,Urgent,,,no,,
+Write report,Quarterly numbers,Medium,2026-11-01,,no,,
+Plan trip,,Medium,2026-13-01,,no,,
+"""
+
+
+class ImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.engine = self.open_engine()
+
+    def open_engine(self):
+        engine = TaskEngine(os.path.join(self.directory, "todo_data.json"), "journal", write_behind=False)
+        engine.load()
+        self.addCleanup(engine.close)
+        return engine
+
+    def write(self, name, text):
+        filename = os.path.join(self.directory, name)
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write(text)
+        return filename
+
+    def test_csv_rows_are_validated(self):
+        result = self.engine.import_file(self.write("tasks.csv", CSV_ROWS))
+        self.assertEqual((result.rows, result.imported, result.duplicates), (6, 2, 1))
+        self.assertEqual([number for number, reason in result.rejected], [4, 5, 7])
+        report, milk = sorted(self.engine.tasks, key=lambda task: task.id)
+        self.assertEqual((report.title, report.priority, report.tags, report.due_date),
+                         ("Write report", "High", ("Work", "Urgent"), "2026-11-01"))
+        self.assertTrue(milk.completed)
+        self.assertEqual(milk.completed_at, "2026-01-07 10:00:00")
+        # One storage write for the batch, read back by a new engine
+        self.assertEqual(sorted(task.title for task in self.open_engine().tasks), ["Buy milk", "Write report"])
+
+    def test_reimporting_an_export_adds_nothing(self):
+        self.engine.import_file(self.write("tasks.csv", CSV_ROWS))
+        self.engine.add_task("Water plants", tags=["Personal"])
+        for fmt in ("csv", "jsonl"):
+            exported = os.path.join(self.directory, f"export.{fmt}")
+            self.engine.export(exported, fmt)
+            result = self.engine.import_file(exported)
+            self.assertEqual((result.imported, result.duplicates, result.rejected), (0, 3, []), fmt)
+        self.assertEqual(len(self.engine.tasks), 3)
+
+    def test_archived_tasks_are_not_imported_again(self):
+        self.engine.import_file(self.write("tasks.csv", CSV_ROWS))
+        exported = os.path.join(self.directory, "export.jsonl")
+        self.engine.export(exported, "jsonl")
+        self.assertEqual(self.engine.archive_completed(days=30, now=datetime(2026, 10, 18)), 1)
+
+        result = self.engine.import_file(exported)
+        self.assertEqual((result.imported, result.duplicates), (0, 2))
+        self.assertEqual([task.title for task in self.engine.tasks], ["Write report"])
+        self.assertEqual(self.engine.archive.count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from todo_bench import BENCH_MODES, generate_tasks, create_store, open_engine
+from todo_engine import STATUS_FILTERS, TAGS, SORT_OPTIONS
+from todo_index import DUE_FILTERS, due_range, sort_key
+from todo_query import QuerySyntaxError, compile_query
+
+TODAY = date(2026, 10, 18)
+TODAY_TEXT = TODAY.isoformat()
+
+# Part of a few titles (few candidates, looked up and sorted), a
+# common word and a single letter (many candidates, the order is walked)
+SEARCHES = ["", "groceries 123", "report", "e"]
+
+
+def reference_query(tasks, search_text, status, tag, sort):
+    """The filters and sort of the list before the query language, written out plainly"""
+    search_text = search_text.lower()
+    matches = []
+    for task in tasks:
+        if search_text and search_text not in task.title.lower() \
+                and search_text not in (task.description or "").lower():
+            continue
+        if status == "Incomplete" and task.completed:
+            continue
+        if status == "Completed" and not task.completed:
+            continue
+        if status in DUE_FILTERS:
+            first, last = due_range(status, TODAY_TEXT)
+            if task.completed or not task.due_date:
+                continue
+            if (first and task.due_date < first) or (last and task.due_date > last):
+                continue
+        if tag != "All" and tag not in task.tags:
+            continue
+        matches.append(task)
+    return sorted(matches, key=lambda task: sort_key(task, sort))
+
+
+class EngineQueryTest(unittest.TestCase):
+    """TaskEngine.query gives the same lists as the plain filters, in every storage mode"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.tasks = list(generate_tasks(2000, seed=7, today=TODAY))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def open_engine(self, mode, name=None):
+        filename = create_store(f"{self.directory}/{name or mode}", mode, self.tasks)
+        engine = open_engine(filename, mode)
+        self.addCleanup(engine.close)
+        return engine
+
+    def assertSameQuery(self, engine, tasks, search_text, status, tag, sort):
+        found, keys = engine.query(search_text, status, tag, sort, TODAY_TEXT)
+        expected = reference_query(tasks, search_text, status, tag, sort)
+        label = f"{search_text!r} {status} {tag} {sort}"
+        self.assertEqual([task.id for task in found], [task.id for task in expected], label)
+        self.assertEqual(keys, [sort_key(task, sort) for task in found], label)
+
+    def test_filters_and_sorts(self):
+        for mode in BENCH_MODES:
+            with self.subTest(mode=mode):
+                engine = self.open_engine(mode)
+                tasks = list(engine.tasks)
+                for search_text in SEARCHES:
+                    for status in STATUS_FILTERS:
+                        for tag in ["All", TAGS[0]]:
+                            for sort in SORT_OPTIONS:
+                                self.assertSameQuery(engine, tasks, search_text, status, tag, sort)
+
+    def test_both_plans_are_used(self):
+        engine = self.open_engine("json")
+        total = len(engine.tasks)
+        compiled = compile_query("groceries 123")
+        self.assertLess(len(engine.search_index.search(compiled.phrases[0])) * 8, total)
+        self.assertTrue(engine.search_index.search(compiled.phrases[0]))
+        compiled = compile_query("e")
+        self.assertGreater(len(engine.search_index.search(compiled.phrases[0])) * 8, total)
+        due_today = engine.due_index.ids_between(*due_range("Due Today", TODAY_TEXT), completed=False)
+        self.assertLess(len(due_today) * 8, total)
+
+    def test_completed_includes_archive(self):
+        engine = self.open_engine("json", "archive")
+        self.assertGreater(engine.archive_completed(now=datetime(2026, 10, 18)), 0)
+        live = list(engine.tasks)
+        archived = list(engine.archive.iter_tasks())
+        for search_text in SEARCHES:
+            for sort in SORT_OPTIONS:
+                self.assertSameQuery(engine, live + archived, search_text, "Completed", "All", sort)
+                self.assertSameQuery(engine, live, search_text, "Incomplete", "All", sort)
+
+    def test_query_language(self):
+        engine = self.open_engine("json")
+        tasks = list(engine.tasks)
+        cases = {
+            "priority:High !completed": lambda task: task.priority == "High" and not task.completed,
+            f"tag:{TAGS[1].lower()} due<=+7d": lambda task: TAGS[1] in task.tags and "" < task.due_date <= "2026-10-25",
+            '-"report" due:none': lambda task: "report" not in (task.title + "\n" + task.description).lower()
+                                             and not task.due_date,
+            '"plan" is:overdue': lambda task: "plan" in (task.title + "\n" + task.description).lower()
+                                           and not task.completed and "" < task.due_date < TODAY_TEXT,
+        }
+        for text, match in cases.items():
+            for sort in SORT_OPTIONS:
+                found, keys = engine.query(text, sort=sort, today=TODAY_TEXT)
+                expected = sorted((task for task in tasks if match(task)), key=lambda task: sort_key(task, sort))
+                self.assertEqual([task.id for task in found], [task.id for task in expected], f"{text} {sort}")
+
+    def test_plain_words_are_searched(self):
+        engine = self.open_engine("json")
+        engine.add_task("Mark the order completed", "")
+        engine.add_task("Pay the overdue invoice", "")
+        engine.add_task("Buy 5 apples", 'and "milk"')
+        tasks = list(engine.tasks)
+        for text in ["completed", "overdue", "-5 apples", "5 apples", 'buy milk "', 'and "milk', '"milk']:
+            for status in ["All", "Incomplete"]:
+                expected = reference_query(tasks, text, status, "All", "Creation Time")
+                found, keys = engine.query(text, status, today=TODAY_TEXT)
+                self.assertEqual([task.id for task in found], [task.id for task in expected], text)
+        self.assertEqual([task.title for task in engine.query("completed")[0]], ["Mark the order completed"])
+        self.assertEqual([task.title for task in engine.query("overdue")[0]], ["Pay the overdue invoice"])
+        self.assertEqual([task.title for task in engine.query('and "milk"')[0]], ["Buy 5 apples"])
+
+    def test_syntax_errors(self):
+        for text in ['"unbalanced', "due<someday", "priority:urgent", "status:later", "created>none", "is:done"]:
+            with self.assertRaises(QuerySyntaxError, msg=text):
+                compile_query(text, strict=True)
+            # The search box looks for the text as typed instead
+            compiled = compile_query(text)
+            self.assertTrue(compiled.plain)
+            self.assertEqual(compiled.phrases, [text.lower()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from todo_bench import generate_tasks
+from todo_snapshot import SnapshotReader, write_snapshot
+
+
+class SnapshotReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_full_read_matches_rows(self):
+        tasks = list(generate_tasks(500))
+        # Values the columns cannot hold are kept as extras
+        tasks[1]["priority"] = "Someday"
+        tasks[2]["due_date"] = "soon"
+        tasks[3]["title"] = "Café plan ✓"
+        del tasks[4]["completed_at"]
+        tasks[5]["estimate"] = 3
+        tasks[6]["created_at"] = "2026-10-18 23:59:07"
+        filename = os.path.join(self.directory, "todo_data.snapshot")
+        write_snapshot(filename, tasks)
+        with SnapshotReader(filename) as reader:
+            self.assertEqual(reader.tasks(), tasks)
+            self.assertEqual(list(reader), tasks)
+
+
+if __name__ == "__main__":
+    unittest.main()
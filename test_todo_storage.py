@@ -0,0 +1,230 @@
+import os
+import copy
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from todo_bench import generate_tasks, open_engine
+from todo_engine import TaskEngine
+from todo_storage import JournalStorage, WriteBehindStorage, apply_changes, write_json_atomic
+
+
+class MemoryStorage:
+    """A backend that keeps applied batches in memory and can be made to fail"""
+
+    needs_full_tasks = False
+    indexed_queries = False
+    supports_archive = True
+
+    def __init__(self):
+        self.batches = []
+        self.tasks = []
+        # Called in place of writing, to fail or to change tasks meanwhile
+        self.fail = None
+
+    def apply(self, changes, tasks):
+        if self.fail:
+            self.fail()
+        self.batches.append(copy.deepcopy(changes))
+        self.tasks = apply_changes(self.tasks, changes)
+
+    def close(self):
+        pass
+
+
+class MigrationTest(unittest.TestCase):
+    """Switching to the database or binary snapshot imports todo_data.json as it is"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "todo_data.json")
+        write_json_atomic(self.filename, list(generate_tasks(50)))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def migrate(self, mode):
+        engine = open_engine(self.filename, mode)
+        ids = sorted(task.id for task in engine.tasks)
+        engine.close()
+        return ids
+
+    def test_no_files_left_next_to_json(self):
+        for mode in ("sqlite", "binary"):
+            with self.subTest(mode=mode):
+                self.assertEqual(self.migrate(mode), list(range(1, 51)))
+                self.assertFalse(os.path.exists(self.filename + ".journal"))
+                self.assertFalse(os.path.exists(self.filename + ".lock"))
+
+    def test_journal_is_imported(self):
+        with open(self.filename + ".journal", "w", encoding="utf-8") as file:
+            file.write('{"op": "delete", "id": 3}\n{"op": "delete"')
+        for mode in ("sqlite", "binary"):
+            with self.subTest(mode=mode):
+                self.assertEqual(self.migrate(mode), [task_id for task_id in range(1, 51) if task_id != 3])
+        # The JSON store is left exactly as it was
+        with open(self.filename + ".journal", "r", encoding="utf-8") as file:
+            self.assertTrue(file.read().endswith('{"op": "delete"'))
+
+
+
+class JournalTest(unittest.TestCase):
+    """Changes are appended to a journal and folded into the snapshot later"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, "todo_data.json")
+        self.tasks = list(generate_tasks(20))
+        write_json_atomic(self.filename, self.tasks)
+
+    def open_storage(self, compact_after=1000):
+        storage = JournalStorage(self.filename, compact_after)
+        self.addCleanup(storage.close)
+        return storage, {task["id"]: task for task in storage.load()}
+
+    def journal_lines(self):
+        with open(self.filename + ".journal", "rb") as file:
+            return file.read().splitlines(keepends=True)
+
+    def test_changes_are_replayed(self):
+        storage, tasks = self.open_storage()
+        storage.apply({1: dict(tasks[1], title="Changed"), 2: None}, None)
+        storage.put(dict(tasks[3], completed=True), None)
+        storage.delete(4, None)
+        storage.close()
+
+        # The snapshot is untouched until the journal is compacted
+        with open(self.filename, "r", encoding="utf-8") as file:
+            self.assertEqual(len(json.load(file)), 20)
+        self.assertEqual(len(self.journal_lines()), 4)
+        tasks = self.open_storage()[1]
+        self.assertEqual(sorted(tasks), [task_id for task_id in range(1, 21) if task_id not in (2, 4)])
+        self.assertEqual(tasks[1]["title"], "Changed")
+        self.assertTrue(tasks[3]["completed"])
+
+    def test_torn_record_is_cut_off(self):
+        storage, tasks = self.open_storage()
+        storage.delete(1, None)
+        storage.close()
+        # A process died halfway through appending a record
+        with open(self.filename + ".journal", "ab") as file:
+            file.write(b'{"op": "delete", "i')
+
+        storage, tasks = self.open_storage()
+        self.assertEqual(len(tasks), 19)
+        self.assertEqual(self.journal_lines(), [b'{"op": "delete", "id": 1}\n'])
+        storage.delete(2, None)
+        storage.close()
+        self.assertEqual(len(self.journal_lines()), 2)
+        self.assertNotIn(2, self.open_storage()[1])
+
+    def test_compaction_during_appends(self):
+        storage, tasks = self.open_storage(compact_after=10)
+        expected = dict(tasks)
+        for number in range(300):
+            # Deleted tasks come back with a later put
+            task = dict(self.tasks[number % 20], title=f"Edit {number}")
+            expected[task["id"]] = task
+            storage.put(task, None)
+            if number % 50 == 49:
+                storage.delete(number % 20 + 1, None)
+                del expected[number % 20 + 1]
+        storage.close()
+
+        # Folded into the snapshot while appends went on, none of them lost
+        self.assertLess(len(self.journal_lines()), 300)
+        with open(self.filename, "r", encoding="utf-8") as file:
+            self.assertNotEqual(json.load(file), self.tasks)
+        tasks = self.open_storage()[1]
+        self.assertEqual({task_id: task["title"] for task_id, task in tasks.items()},
+                         {task_id: task["title"] for task_id, task in expected.items()})
+
+
+class WriteBehindTest(unittest.TestCase):
+    """Edits are queued and written by a background thread"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, "todo_data.json")
+        write_json_atomic(self.filename, list(generate_tasks(50)))
+
+    def open_engine(self, mode):
+        engine = TaskEngine(self.filename, mode)
+        engine.load()
+        self.addCleanup(engine.close)
+        return engine
+
+    def open_storage(self, delay=0.2):
+        inner = MemoryStorage()
+        storage = WriteBehindStorage(inner, threading.RLock(), delay)
+        self.addCleanup(storage.close)
+        return storage, inner
+
+    def test_burst_is_coalesced(self):
+        storage, inner = self.open_storage()
+        task = {"id": 1, "title": "First", "tags": ["Work"]}
+        storage.put(task, None)
+        task["title"] = "Second"
+        task["tags"].append("Urgent")
+        storage.put(task, None)
+        storage.put({"id": 2, "title": "Gone soon", "tags": []}, None)
+        storage.delete(2, None)
+        self.assertTrue(storage.dirty)
+
+        self.assertTrue(storage.flush())
+        # One write with the latest state of each task
+        self.assertEqual(inner.batches, [{1: {"id": 1, "title": "Second", "tags": ["Work", "Urgent"]}, 2: None}])
+        self.assertFalse(storage.dirty)
+        # The queue holds copies, not the caller's dicts
+        task["tags"].append("Later")
+        self.assertEqual(inner.tasks[0]["tags"], ["Work", "Urgent"])
+
+    def test_writer_thread_writes_after_delay(self):
+        storage, inner = self.open_storage(delay=0.01)
+        storage.put({"id": 1, "title": "Queued", "tags": []}, None)
+        deadline = time.monotonic() + 5
+        while storage.dirty and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(storage.dirty)
+        self.assertEqual([task["title"] for task in inner.tasks], ["Queued"])
+
+    def test_failed_write_is_retried(self):
+        storage, inner = self.open_storage()
+
+        def fail():
+            # A newer change arrives while the write is failing; the retry must not override it
+            storage.put({"id": 1, "title": "New", "tags": []}, None)
+            raise OSError("disk full")
+
+        inner.fail = fail
+        storage.put({"id": 1, "title": "Old", "tags": []}, None)
+        storage.put({"id": 2, "title": "Kept", "tags": []}, None)
+        self.assertFalse(storage.flush())
+        self.assertIsInstance(storage.last_error, OSError)
+        self.assertTrue(storage.dirty)
+
+        inner.fail = None
+        self.assertTrue(storage.flush())
+        self.assertIsNone(storage.last_error)
+        self.assertFalse(storage.dirty)
+        self.assertEqual(sorted((task["id"], task["title"]) for task in inner.tasks), [(1, "New"), (2, "Kept")])
+
+    def test_query_does_not_wait_for_queued_writes(self):
+        engine = self.open_engine("sqlite")
+        task = next(task for task in engine.tasks if not task.completed)
+        engine.complete_task(task.id)
+        found, keys = engine.query(status="Completed", include_archived=False)
+        # Answered from memory; the edit is still waiting for the writer
+        self.assertTrue(engine.storage.dirty)
+        self.assertIn(task.id, [found_task.id for found_task in found])
+        engine.flush()
+        self.assertEqual(engine.query(status="Completed", include_archived=False), (found, keys))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import socket
+import shutil
+import asyncio
+import tempfile
+import threading
+import unittest
+
+from todo_bench import generate_tasks
+from todo_storage import apply_changes, write_json_atomic
+from todo_sync import SyncServer, RemoteStorage
+
+STORE = "shared.json"
+
+
+def wait_for(condition, timeout=5):
+    """Poll condition until it returns something true; returns that"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = condition()
+        if result or time.monotonic() > deadline:
+            return result
+        time.sleep(0.01)
+
+
+class SyncServerTest(unittest.TestCase):
+    """A SyncServer on an ephemeral port with RemoteStorage clients"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        write_json_atomic(os.path.join(self.directory, STORE), list(generate_tasks(20)))
+
+    def start_server(self, batch_delay=0.01):
+        server = SyncServer(self.directory, "json", batch_delay=batch_delay)
+        started = threading.Event()
+        state = {}
+
+        def ready(address):
+            state["address"] = address
+            started.set()
+
+        async def run():
+            state["loop"] = asyncio.get_running_loop()
+            state["task"] = asyncio.current_task()
+            await server.serve("127.0.0.1", 0, ready)
+
+        def serve():
+            try:
+                asyncio.run(run())
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        self.assertTrue(started.wait(5))
+
+        def stop():
+            state["loop"].call_soon_threadsafe(state["task"].cancel)
+            thread.join(5)
+
+        self.addCleanup(stop)
+        host, port = state["address"]
+        self.address = f"{host}:{port}"
+
+    def connect(self):
+        client = RemoteStorage(STORE, self.address)
+        self.addCleanup(client.close)
+        return client, {task["id"]: task for task in client.load()}
+
+    def test_clients_converge(self):
+        self.start_server()
+        first, first_tasks = self.connect()
+        second, second_tasks = self.connect()
+        self.assertEqual(first_tasks, second_tasks)
+
+        changed = dict(first_tasks[1], title="Changed by the first client")
+        added = dict(first_tasks[2], id=first.reserve_ids(1), title="Added by the first client")
+        changes = {1: changed, added["id"]: added, 3: None}
+        first_tasks = {task["id"]: task for task in apply_changes(list(first_tasks.values()), changes)}
+        first.apply(changes, list(first_tasks.values()))
+
+        received = {}
+
+        def second_caught_up():
+            changes, conflicts = second.read_changes(list(second_tasks.values()))
+            self.assertEqual(conflicts, {})
+            received.update(changes)
+            return len(received) == 3
+
+        self.assertTrue(wait_for(second_caught_up))
+        second_tasks = {task["id"]: task for task in apply_changes(list(second_tasks.values()), received)}
+        self.assertEqual(second_tasks, first_tasks)
+        # A client that connects later gets the same list
+        self.assertEqual(self.connect()[1], first_tasks)
+
+    def test_conflicting_edit_is_reported(self):
+        # Deltas are held back, so the second client pushes without having seen the first's change
+        self.start_server(batch_delay=3)
+        first, first_tasks = self.connect()
+        second, second_tasks = self.connect()
+        theirs = dict(first_tasks[1], title="Edited by the first client")
+        first.apply({1: theirs}, list(first_tasks.values()))
+        mine = dict(second_tasks[1], title="Edited by the second client")
+        second.apply({1: mine}, list(second_tasks.values()))
+
+        changes, conflicts = second.read_changes(list(second_tasks.values()))
+        self.assertEqual(conflicts, {1: theirs})
+        # The server kept the second client's version
+        self.assertEqual(self.connect()[1][1], mine)
+
+    def test_malformed_messages_get_error_replies(self):
+        self.start_server()
+        host, port = self.address.rsplit(":", 1)
+        with socket.create_connection((host, int(port)), timeout=5) as sock:
+            file = sock.makefile("rb")
+            for line in (b"[1]\n", b'"x"\n', b'{"type": "push", "id": 7}\n'):
+                sock.sendall(line)
+                reply = json.loads(file.readline())
+                self.assertEqual(reply["type"], "reply")
+                self.assertIn("error", reply)
+            self.assertEqual(reply["id"], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from todo_engine import DATA_FILENAME
+from todo_storage import write_json_atomic
+from todo_workspace import WorkspaceManager, REGISTRY_FILENAME, DEFAULT_WORKSPACE, shard_files
+
+
+class RegistryTest(unittest.TestCase):
+    """todo_workspaces.json is read leniently, like the task stores"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.registry = os.path.join(self.directory, REGISTRY_FILENAME)
+
+    def open_manager(self):
+        manager = WorkspaceManager(self.directory, "json", write_behind=False)
+        self.addCleanup(manager.close)
+        return manager
+
+    def write_registry(self, text):
+        with open(self.registry, "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def test_without_registry(self):
+        manager = self.open_manager()
+        self.assertEqual(manager.names(), [DEFAULT_WORKSPACE])
+        self.assertEqual(manager.filename(DEFAULT_WORKSPACE), os.path.join(self.directory, DATA_FILENAME))
+
+    def test_truncated_registry(self):
+        self.write_registry('{"active": "Work", "workspaces": [{"name": "Wo')
+        with self.assertWarns(RuntimeWarning):
+            manager = self.open_manager()
+        self.assertEqual(manager.names(), [DEFAULT_WORKSPACE])
+        self.assertEqual(manager.active, DEFAULT_WORKSPACE)
+        with open(self.registry + ".damaged", "r", encoding="utf-8") as file:
+            self.assertTrue(file.read().endswith('"Wo'))
+
+    def test_malformed_entries_are_skipped(self):
+        self.write_registry(json.dumps({"active": ["Work"], "workspaces": [
+            {"filename": "workspaces/a.json"},
+            "Home",
+            {"name": "Work", "filename": "workspaces/work.json"},
+            {"name": "Work", "filename": "workspaces/work-2.json"},
+        ]}))
+        with self.assertWarns(RuntimeWarning):
+            manager = self.open_manager()
+        self.assertEqual(manager.names(), ["Work"])
+        self.assertEqual(manager.active, "Work")
+
+
+class WorkspaceManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def open_manager(self, max_loaded=3):
+        manager = WorkspaceManager(self.directory, "journal", max_loaded, write_behind=False)
+        self.addCleanup(manager.close)
+        return manager
+
+    def test_legacy_data_file_is_default_workspace(self):
+        write_json_atomic(os.path.join(self.directory, DATA_FILENAME), [
+            {"id": 1, "title": "Old task", "description": "", "priority": "High", "due_date": "",
+             "tags": [], "completed": False, "created_at": "2024-01-01 09:00:00"},
+        ])
+        manager = self.open_manager()
+        engine = manager.activate(manager.active)
+        self.assertEqual(manager.names(), [DEFAULT_WORKSPACE])
+        self.assertEqual([task.title for task in engine.tasks], ["Old task"])
+
+    def test_create_rename_delete(self):
+        manager = self.open_manager()
+        manager.create("Home Projects")
+        with self.assertRaises(ValueError):
+            manager.create("Home Projects")
+        with self.assertRaises(ValueError):
+            manager.create("  ")
+        filename = manager.filename("Home Projects")
+        self.assertEqual(os.path.relpath(filename, self.directory), os.path.join("workspaces", "home-projects.json"))
+        manager.activate("Home Projects").add_task("Paint the fence")
+
+        manager.rename("Home Projects", "House")
+        self.assertEqual(manager.names(), [DEFAULT_WORKSPACE, "House"])
+        self.assertEqual((manager.active, manager.filename("House")), ("House", filename))
+        manager.close()
+
+        # The registry remembers the workspaces and the active one
+        manager = self.open_manager()
+        self.assertEqual(manager.active, "House")
+        self.assertEqual([task.title for task in manager.open("House").tasks], ["Paint the fence"])
+
+        manager.delete("House")
+        self.assertEqual((manager.names(), manager.active), ([DEFAULT_WORKSPACE], DEFAULT_WORKSPACE))
+        self.assertFalse([name for name in shard_files(filename) if os.path.exists(name)])
+        with self.assertRaises(ValueError):
+            manager.delete(DEFAULT_WORKSPACE)
+
+    def test_least_recently_used_are_closed(self):
+        manager = self.open_manager(max_loaded=2)
+        for name in ("A", "B", "C"):
+            manager.create(name)
+        manager.activate("A").add_task("First in A")
+        manager.open("B").add_task("First in B")
+        manager.open("C")
+        # A is active, so B, the least recently used of the others, goes
+        self.assertEqual(list(manager.loaded), ["A", "C"])
+        manager.open("A")
+        manager.open(DEFAULT_WORKSPACE)
+        self.assertEqual(list(manager.loaded), ["A", DEFAULT_WORKSPACE])
+
+        # Closed workspaces answer statistics without being opened again
+        self.assertEqual(manager.statistics("B").total, 1)
+        self.assertFalse(manager.is_loaded("B"))
+        # Reopening reads the workspace back from its files
+        self.assertEqual([task.title for task in manager.open("B").tasks], ["First in B"])
+        self.assertEqual(manager.statistics_all().total, 2)
+
+    def test_idle_workspaces_are_closed(self):
+        manager = self.open_manager()
+        manager.create("Work")
+        manager.activate(DEFAULT_WORKSPACE)
+        manager.open("Work")
+        self.assertEqual(manager.evict_idle(idle_seconds=0), ["Work"])
+        self.assertEqual(list(manager.loaded), [DEFAULT_WORKSPACE])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,259 @@
+"""Cold storage for tasks completed long ago
+
+Tasks completed more than ARCHIVE_AFTER_DAYS days ago are moved out of
+the task store into todo_data.archive.jsonl.gz, so filters, sorting,
+statistics and saves only deal with active work. The archive is
+append-only: each archiving run appends one gzip member of journal style
+records ({"op": "put", "task": ...} or {"op": "delete", "id": ...}), so
+a restored or deleted archived task is masked by a later record instead
+of rewriting the file. A small .meta file next to it keeps the number of
+archived tasks, the highest id and the size of the archive up to its last
+complete append, so opening the app never reads the archive itself; it
+is read on demand by the Completed view and exports.
+
+An append interrupted before its .meta update leaves the file longer
+than the size in .meta. Opening it then reads the members past that size:
+complete ones are kept and counted, and only a torn member at the end is
+cut off. Reading skips to the next intact member if a damaged one is
+found anyway, so the tasks archived later are never lost behind it.
+"""
+import os
+import gzip
+import json
+import zlib
+import threading
+
+from todo_model import Task
+from todo_index import sort_key
+from todo_storage import StoreLock, write_json_atomic, apply_task_defaults
+
+# Completed tasks older than this many days are archived
+ARCHIVE_AFTER_DAYS = 30
+
+# Every gzip member starts with these bytes (magic number, deflate)
+GZIP_MAGIC = b"\x1f\x8b\x08"
+
+# Bytes read at a time while decompressing or looking for the next member
+READ_SIZE = 1 << 16
+
+
+def archive_filename(filename):
+    """Archive of the JSON data file filename"""
+    return os.path.splitext(filename)[0] + ".archive.jsonl.gz"
+
+
+class TaskArchive:
+    """Append-only, gzip compressed archive of completed tasks
+
+    load() reads it into a cache that serves lookups and queries until
+    release(); appends keep the cache current.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.meta_filename = filename + ".meta"
+        self.lock = threading.RLock()
+        # Appends of other processes sharing the store wait for each other
+        self.file_lock = StoreLock(filename + ".lock")
+        self._tasks = None
+        self.count = 0
+        self.max_id = 0
+        # Bytes of the archive up to the end of its last complete append
+        self.size = 0
+        self._read_meta()
+
+    def _read_meta(self):
+        if not os.path.exists(self.filename):
+            self.size = 0
+            return
+        try:
+            with open(self.meta_filename, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            self.count, self.max_id, self.size = meta["count"], meta["max_id"], meta["size"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # Meta files written before the size was kept end up here once too
+            meta = None
+        if meta is None or os.path.getsize(self.filename) > self.size:
+            self._recover()
+
+    def _recover(self):
+        """Count the complete members past the size in .meta and cut off a torn one at the end"""
+        with self.lock, self.file_lock:
+            # One pass over the archive rebuilds the counts and the size
+            self._tasks = None
+            self.load(cache=False)
+            if os.path.getsize(self.filename) > self.size:
+                with open(self.filename, "r+b") as file:
+                    file.truncate(self.size)
+
+    def _write_meta(self):
+        write_json_atomic(self.meta_filename, {"count": self.count, "max_id": self.max_id, "size": self.size})
+
+    def iter_members(self):
+        """(end offset, decompressed data) of each intact gzip member, in file order
+
+        A damaged member is skipped by looking for the next gzip header
+        after its start, so one torn append does not hide the ones after it.
+        """
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, "rb") as file:
+            start = 0
+            while start is not None:
+                file.seek(start)
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                parts = []
+                consumed = 0
+                try:
+                    while not decompressor.eof:
+                        chunk = file.read(READ_SIZE)
+                        if not chunk:
+                            break
+                        consumed += len(chunk)
+                        parts.append(decompressor.decompress(chunk))
+                except zlib.error:
+                    pass
+                if decompressor.eof:
+                    start += consumed - len(decompressor.unused_data)
+                    yield start, b"".join(parts)
+                elif consumed == 0:
+                    return
+                else:
+                    start = self._find_member(file, start + 1)
+
+    @staticmethod
+    def _find_member(file, offset):
+        """Offset of the next gzip header at or after offset, or None"""
+        file.seek(offset)
+        # Keep the last bytes of each read, in case a header spans two reads
+        tail = b""
+        position = offset
+        while True:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                return None
+            data = tail + chunk
+            found = data.find(GZIP_MAGIC)
+            if found >= 0:
+                return position - len(tail) + found
+            tail = data[-(len(GZIP_MAGIC) - 1):]
+            position += len(chunk)
+
+    def iter_records(self):
+        """The records of the archive in the order they were appended"""
+        for end, data in self.iter_members():
+            for line in data.decode("utf-8", errors="replace").splitlines():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def load(self, cache=True):
+        """Archived task dicts by id, with restored and deleted ones masked out"""
+        with self.lock:
+            if self._tasks is not None:
+                return self._tasks
+            tasks = {}
+            size = 0
+            for size, data in self.iter_members():
+                for line in data.decode("utf-8", errors="replace").splitlines():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("op") == "put":
+                        task = apply_task_defaults(record["task"])
+                        tasks[task["id"]] = task
+                    elif record.get("op") == "delete":
+                        tasks.pop(record["id"], None)
+            # Reading everything is a good moment to correct the counts
+            max_id = max(max(tasks, default=self.max_id), self.max_id)
+            if (len(tasks), max_id, size) != (self.count, self.max_id, self.size):
+                self.count, self.max_id, self.size = len(tasks), max_id, size
+                self._write_meta()
+            if cache:
+                self._tasks = tasks
+            return tasks
+
+    def release(self):
+        """Drop the cached archive; the next lookup reads the file again"""
+        with self.lock:
+            self._tasks = None
+
+    def refresh(self):
+        """Drop the cache and re-read the counts, which another process may have changed"""
+        with self.lock:
+            self._tasks = None
+            self._read_meta()
+
+    def close(self):
+        self.file_lock.close()
+
+    def _append(self, records):
+        """Append records as one gzip member (hold file_lock and write the meta after)"""
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        # One compressed member per append, written with a single call
+        member = gzip.compress(data.encode("utf-8"))
+        # Another process may have appended since the meta was read, and a
+        # torn member of an interrupted append must not end up in the middle
+        self._read_meta()
+        with open(self.filename, "ab") as file:
+            file.write(member)
+            file.flush()
+            os.fsync(file.fileno())
+            self.size = file.tell()
+
+    def add(self, tasks):
+        """Append tasks to the archive"""
+        if not tasks:
+            return
+        with self.lock, self.file_lock:
+            records = [{"op": "put", "task": task.to_dict()} for task in tasks]
+            self._append(records)
+            if self._tasks is not None:
+                for record in records:
+                    self._tasks[record["task"]["id"]] = record["task"]
+            self.count += len(tasks)
+            self.max_id = max(self.max_id, max(task.id for task in tasks))
+            self._write_meta()
+
+    def remove(self, task_ids):
+        """Mask archived tasks out, for a restore or a delete"""
+        if not task_ids:
+            return
+        with self.lock, self.file_lock:
+            self._append([{"op": "delete", "id": task_id} for task_id in task_ids])
+            if self._tasks is not None:
+                for task_id in task_ids:
+                    self._tasks.pop(task_id, None)
+            self.count = max(0, self.count - len(task_ids))
+            self._write_meta()
+
+    def get(self, task_id):
+        """An archived task as a Task, or None"""
+        task = self.load().get(task_id)
+        return Task.from_dict(task) if task is not None else None
+
+    def iter_tasks(self, exclude=()):
+        """Every archived task as a Task, without caching the archive"""
+        with self.lock:
+            tasks = self._tasks if self._tasks is not None else self.load(cache=False)
+            tasks = list(tasks.values())
+        for task in tasks:
+            if task["id"] not in exclude:
+                yield Task.from_dict(task)
+
+    def query(self, match=None, sort_option="Creation Time", exclude=(), check_cancelled=lambda: None):
+        """Archived tasks passing match (a query matcher, None for all), sorted, with their sort keys"""
+        matches = []
+        for number, data in enumerate(list(self.load().values())):
+            if number % 10000 == 0:
+                check_cancelled()
+            if data["id"] in exclude:
+                continue
+            task = Task.from_dict(data)
+            if match is not None and not match(task):
+                continue
+            matches.append((sort_key(task, sort_option), task))
+        matches.sort(key=lambda pair: pair[0])
+        return [task for key, task in matches], [key for key, task in matches]
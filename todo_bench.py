@@ -0,0 +1,508 @@
+"""Benchmark suite for the hot paths of the to-do list
+
+Generates a synthetic task store (size, tag mix, description length,
+completion ratio and due date spread are configurable), then times
+loading, saving, filtering and sorting, search, statistics and edits
+through TaskEngine, and optionally the same paths under Tk. Every
+operation runs in a fresh process, so its peak memory is its own. The
+results (throughput, p50/p99 latency, peak RSS) are written as JSON and
+two runs can be compared:
+
+    python todo_bench.py run --tasks 100000 --mode journal --mode sqlite --output before.json
+    python todo_bench.py run --tasks 100000 --mode journal --mode sqlite --output after.json
+    python todo_bench.py compare before.json after.json
+
+compare exits with status 1 when an operation got slower or bigger than
+the threshold, so it can guard a build.
+"""
+import os
+import gc
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import importlib.util
+from datetime import date, datetime, timedelta
+
+from todo_engine import TaskEngine, STATUS_FILTERS, TAGS, PRIORITIES, SORT_OPTIONS
+from todo_storage import STORAGE_MODES, create_storage, write_json_atomic
+from todo_model import peak_rss
+
+RESULTS_VERSION = 1
+
+# Modes with a local store to generate (todo_sync.py bench times remote)
+BENCH_MODES = [mode for mode in STORAGE_MODES if mode != "remote"]
+
+# The app keeps its data next to the working directory under this name
+DATA_FILENAME = "todo_data.json"
+APP_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "To-do list program.py")
+
+WORDS = [
+    "report", "meeting", "groceries", "exercise", "review", "email", "plan", "call",
+    "budget", "draft", "invoice", "lecture", "homework", "dentist", "garden", "deploy",
+]
+
+# Status, tag and sort combinations a query benchmark cycles through
+QUERIES = [
+    (status, tag, sort)
+    for status in STATUS_FILTERS
+    for tag in ("All", TAGS[0])
+    for sort in SORT_OPTIONS
+]
+
+# Search box input: whole words and the prefixes typed on the way to them
+SEARCHES = [word[:length] for word in WORDS[:8] for length in (2, 4, len(word))]
+
+# Queries combining several conditions, as saved views do
+COMPOUND_QUERIES = [
+    "priority:High tag:Work !completed",
+    "tag:Work,Study due<+14d !completed report",
+    "is:overdue priority:High,Medium",
+    "is:completed created>=-90d -tag:Personal",
+    "due:none !completed plan",
+]
+
+
+def parse_tag_mix(text):
+    """"Work=4,Personal=3" as {"Work": 4.0, "Personal": 3.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in TAGS:
+            raise argparse.ArgumentTypeError(f"unknown tag '{name}'")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight '{weight}'")
+    return mix
+
+
+def generate_tasks(count, tag_mix=None, tags_per_task=2, description_length=40,
+                   completion_ratio=0.3, due_ratio=0.75, due_spread=60, seed=0, today=None):
+    """Yield count synthetic task dicts; the same arguments give the same tasks
+
+    Each task gets up to tags_per_task tags drawn by the weights of tag_mix,
+    a description of about description_length characters, and with
+    probability due_ratio a due date within due_spread days of today.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    tag_mix = tag_mix or dict.fromkeys(TAGS, 1.0)
+    tag_names, tag_weights = list(tag_mix), list(tag_mix.values())
+    for task_id in range(1, count + 1):
+        created = datetime(today.year, today.month, today.day) - timedelta(seconds=rng.randrange(365 * 86400))
+        completed = rng.random() < completion_ratio
+        completed_at = created + timedelta(seconds=rng.randrange(30 * 86400)) if completed else None
+        due_date = ""
+        if rng.random() < due_ratio:
+            due_date = (today + timedelta(days=rng.randint(-due_spread, due_spread))).isoformat()
+        description = []
+        length = int(description_length * rng.uniform(0.5, 1.5)) if description_length else 0
+        while sum(len(word) + 1 for word in description) < length:
+            description.append(rng.choice(WORDS))
+        tags = rng.choices(tag_names, tag_weights, k=rng.randint(0, tags_per_task)) if tag_names else []
+        yield {
+            "id": task_id,
+            "title": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {task_id}",
+            "description": " ".join(description),
+            "priority": rng.choice(PRIORITIES),
+            "due_date": due_date,
+            "tags": list(dict.fromkeys(tags)),
+            "completed": completed,
+            "created_at": created.strftime("%Y-%m-%d %H:%M:%S"),
+            "completed_at": completed_at.strftime("%Y-%m-%d %H:%M:%S") if completed else "",
+        }
+
+
+def create_store(directory, mode, tasks):
+    """Write tasks as the store of mode in directory; returns the data file name"""
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, DATA_FILENAME)
+    write_json_atomic(filename, tasks)
+    if mode not in ("json", "journal"):
+        # Migrate once now, so the load benchmark does not time the migration
+        storage = create_storage(mode, filename)
+        storage.load()
+        storage.close()
+    return filename
+
+
+def open_engine(filename, mode):
+    engine = TaskEngine(filename, mode, write_behind=False)
+    engine.load()
+    return engine
+
+
+class BenchmarkSkipped(Exception):
+    """Raised when an operation cannot run here, such as Tk without a display"""
+
+
+# Headless steps: step(engine, filename, mode, i) runs sample i and returns
+# how many tasks it handled. engine is None for load, which opens its own.
+
+def step_load(engine, filename, mode, i):
+    engine = open_engine(filename, mode)
+    count = len(engine.tasks)
+    engine.close()
+    return count
+
+
+def step_save(engine, filename, mode, i):
+    engine.save()
+    engine.flush()
+    return len(engine.tasks)
+
+
+def step_query(engine, filename, mode, i):
+    status, tag, sort = QUERIES[i % len(QUERIES)]
+    tasks, keys = engine.query(status=status, tag=tag, sort=sort)
+    return len(tasks)
+
+
+def step_search(engine, filename, mode, i):
+    tasks, keys = engine.query(search_text=SEARCHES[i % len(SEARCHES)])
+    return len(tasks)
+
+
+def step_compound(engine, filename, mode, i):
+    tasks, keys = engine.query(search_text=COMPOUND_QUERIES[i % len(COMPOUND_QUERIES)], include_archived=False)
+    return len(tasks)
+
+
+def step_statistics(engine, filename, mode, i):
+    # The values the Task Statistics window reads
+    statistics = engine.statistics
+    by_priority = {priority: statistics.by_priority.get(priority, 0) for priority in PRIORITIES}
+    by_tag = dict(statistics.by_tag)
+    return 1
+
+
+def step_edit(engine, filename, mode, i):
+    # Generated stores number their tasks 1..n; step through them out of order
+    task_id = (i * 7919) % len(engine.tasks) + 1
+    engine.update_task(task_id, priority=PRIORITIES[i % len(PRIORITIES)])
+    return 1
+
+
+HEADLESS_OPERATIONS = {
+    "load": step_load,
+    "save": step_save,
+    "query": step_query,
+    "search": step_search,
+    "compound": step_compound,
+    "statistics": step_statistics,
+    # Last, since it appends to the journal of the shared store
+    "edit": step_edit,
+}
+
+
+def load_app_module():
+    """The GUI script, imported by path since its file name has spaces"""
+    try:
+        spec = importlib.util.spec_from_file_location("todo_app", APP_FILENAME)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except ImportError as e:
+        raise BenchmarkSkipped(f"the GUI cannot be imported: {e}")
+    return module
+
+
+def open_app(module):
+    """A TodoAppGUI on the store in the working directory, fully loaded"""
+    try:
+        root = module.tk.Tk()
+    except module.tk.TclError as e:
+        raise BenchmarkSkipped(f"Tk is not available: {e}")
+    root.withdraw()
+    app = module.TodoAppGUI(root)
+    # The rest of the file loads on a thread that posts back with root.after
+    while app.engine.loading:
+        root.update()
+        time.sleep(0.001)
+    root.update()
+    return root, app
+
+
+def close_app(root, app):
+    app.engine.close()
+    root.destroy()
+
+
+def paint(root, app, query):
+    result = app.compute_task_list(query, lambda: None)
+    app.show_task_list(result)
+    root.update_idletasks()
+    return len(result[1])
+
+
+def app_query(app, i):
+    status, tag, sort = QUERIES[i % len(QUERIES)]
+    return {"search_text": "", "status": status, "tag": tag, "sort": sort, "today": app.today}
+
+
+# Tk steps: step(module, state, i) with state a dict shared between samples
+
+def step_tk_load(module, state, i):
+    root, app = open_app(module)
+    count = paint(root, app, app_query(app, 0))
+    close_app(root, app)
+    return count
+
+
+def step_tk_update(module, state, i):
+    root, app = state["app"]
+    return paint(root, app, app_query(app, i))
+
+
+def step_tk_statistics(module, state, i):
+    root, app = state["app"]
+    before = set(root.winfo_children())
+    app.show_task_statistics()
+    root.update_idletasks()
+    for window in set(root.winfo_children()) - before:
+        window.destroy()
+    return 1
+
+
+TK_OPERATIONS = {
+    "tk-load": step_tk_load,
+    "tk-update": step_tk_update,
+    "tk-statistics": step_tk_statistics,
+}
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of samples"""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(operation, mode, samples, handled, setup_peak):
+    total = sum(samples)
+    return {
+        "operation": operation,
+        "mode": mode,
+        "samples": len(samples),
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "mean_ms": total / len(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+        "ops_per_second": len(samples) / total if total else None,
+        "tasks_per_second": sum(handled) / total if total else None,
+        "setup_peak_rss_kib": setup_peak,
+        "peak_rss_kib": peak_rss(),
+    }
+
+
+def time_samples(step, args, repeat):
+    samples, handled = [], []
+    for i in range(repeat):
+        # Collect garbage left by the last sample outside the timed region
+        gc.collect()
+        start = time.perf_counter()
+        handled.append(step(*args, i))
+        samples.append(time.perf_counter() - start)
+    return samples, handled
+
+
+def measure(operation, directory, mode, repeat):
+    """Time repeat samples of operation on the store in directory"""
+    filename = os.path.join(directory, DATA_FILENAME)
+    if operation in HEADLESS_OPERATIONS:
+        engine = None if operation == "load" else open_engine(filename, mode)
+        setup_peak = peak_rss()
+        samples, handled = time_samples(HEADLESS_OPERATIONS[operation], (engine, filename, mode), repeat)
+        if engine:
+            engine.close()
+        return summarize(operation, mode, samples, handled, setup_peak)
+
+    # The app opens todo_data.json in the working directory with TODO_STORAGE
+    os.chdir(directory)
+    os.environ["TODO_STORAGE"] = mode
+    module = load_app_module()
+    state = {}
+    if operation != "tk-load":
+        state["app"] = open_app(module)
+    setup_peak = peak_rss()
+    samples, handled = time_samples(TK_OPERATIONS[operation], (module, state), repeat)
+    if "app" in state:
+        close_app(*state["app"])
+    return summarize(operation, mode, samples, handled, setup_peak)
+
+
+def cmd_measure(args):
+    try:
+        result = measure(args.operation, args.directory, args.mode, args.repeat)
+    except BenchmarkSkipped as e:
+        result = {"operation": args.operation, "mode": args.mode, "skipped": str(e)}
+    print(json.dumps(result))
+
+
+def generator_config(args):
+    return {
+        "tasks": args.tasks,
+        "tag_mix": args.tag_mix or dict.fromkeys(TAGS, 1.0),
+        "tags_per_task": args.tags_per_task,
+        "description_length": args.description_length,
+        "completion_ratio": args.completion_ratio,
+        "due_ratio": args.due_ratio,
+        "due_spread": args.due_spread,
+        "seed": args.seed,
+    }
+
+
+def format_row(result):
+    if "skipped" in result:
+        return f"{result['mode']:<9}{result['operation']:<15}skipped: {result['skipped']}"
+    peak = result["peak_rss_kib"]
+    return (
+        f"{result['mode']:<9}{result['operation']:<15}{result['p50_ms']:>11.3f}{result['p99_ms']:>11.3f}"
+        f"{result['tasks_per_second'] or 0:>16,.0f}{peak if peak is not None else 'n/a':>14}"
+    )
+
+
+def cmd_run(args):
+    config = generator_config(args)
+    operations = args.operation or list(HEADLESS_OPERATIONS) + (list(TK_OPERATIONS) if args.tk else [])
+    modes = args.mode or ["journal"]
+    repeat_of = {"load": args.load_repeat, "tk-load": args.load_repeat, "save": args.load_repeat}
+
+    directory = tempfile.mkdtemp(prefix="todo_bench_")
+    results = []
+    try:
+        tasks = list(generate_tasks(
+            args.tasks, config["tag_mix"], args.tags_per_task, args.description_length,
+            args.completion_ratio, args.due_ratio, args.due_spread, args.seed
+        ))
+        print(f"{'mode':<9}{'operation':<15}{'p50 ms':>11}{'p99 ms':>11}{'tasks/s':>16}{'peak RSS KiB':>14}",
+              file=sys.stderr)
+        for mode in modes:
+            store = os.path.join(directory, mode)
+            create_store(store, mode, tasks)
+            for operation in operations:
+                # Each operation is a fresh process so its peak RSS is its own
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "measure", operation, store,
+                     "--mode", mode, "--repeat", str(repeat_of.get(operation, args.repeat))],
+                    stdout=subprocess.PIPE, check=True
+                ).stdout
+                result = json.loads(output)
+                results.append(result)
+                print(format_row(result), file=sys.stderr)
+        del tasks
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+def compare_results(base, new, threshold):
+    """Rows of (mode, operation, metric, before, after, change, regressed)"""
+    before = {(result["mode"], result["operation"]): result for result in base["results"] if "skipped" not in result}
+    rows = []
+    for result in new["results"]:
+        old = before.get((result["mode"], result["operation"]))
+        if old is None or "skipped" in result:
+            continue
+        for metric in ("p50_ms", "p99_ms", "peak_rss_kib"):
+            if not old.get(metric) or result.get(metric) is None:
+                continue
+            change = result[metric] / old[metric] - 1
+            # p99 is too noisy to fail on; it is shown for information
+            regressed = metric != "p99_ms" and change > threshold
+            rows.append((result["mode"], result["operation"], metric, old[metric], result[metric], change, regressed))
+    return rows
+
+
+def cmd_compare(args):
+    with open(args.base, "r", encoding="utf-8") as file:
+        base = json.load(file)
+    with open(args.new, "r", encoding="utf-8") as file:
+        new = json.load(file)
+    if base.get("config") != new.get("config"):
+        print("Warning: the runs used different generator settings", file=sys.stderr)
+
+    rows = compare_results(base, new, args.threshold)
+    print(f"{'mode':<9}{'operation':<15}{'metric':<14}{'before':>12}{'after':>12}{'change':>9}")
+    for mode, operation, metric, old, value, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{mode:<9}{operation:<15}{metric:<14}{old:>12.2f}{value:>12.2f}{change:>+9.1%}{flag}")
+    regressions = sum(1 for row in rows if row[-1])
+    if regressions:
+        print(f"{regressions} regressions over {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="To-do list benchmark suite")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    run = commands.add_parser("run", help="generate a task store and time the hot paths")
+    run.add_argument("--tasks", type=int, default=100000, help="tasks to generate (default: %(default)s)")
+    run.add_argument("--mode", action="append", choices=BENCH_MODES,
+                     help="storage mode to benchmark, may be repeated (default: journal)")
+    run.add_argument("--operation", action="append", choices=list(HEADLESS_OPERATIONS) + list(TK_OPERATIONS),
+                     help="operation to time, may be repeated (default: all headless ones)")
+    run.add_argument("--tk", action="store_true", help="also time the GUI paths (needs a display)")
+    run.add_argument("--repeat", type=int, default=200, help="samples per operation (default: %(default)s)")
+    run.add_argument("--load-repeat", type=int, default=5,
+                     help="samples of load, save and tk-load (default: %(default)s)")
+    run.add_argument("--tag-mix", type=parse_tag_mix, help='tag weights, e.g. "Work=4,Personal=2,Urgent=1"')
+    run.add_argument("--tags-per-task", type=int, default=2, help="most tags per task (default: %(default)s)")
+    run.add_argument("--description-length", type=int, default=40,
+                     help="average description length in characters (default: %(default)s)")
+    run.add_argument("--completion-ratio", type=float, default=0.3, help="share of completed tasks (default: %(default)s)")
+    run.add_argument("--due-ratio", type=float, default=0.75, help="share of tasks with a due date (default: %(default)s)")
+    run.add_argument("--due-spread", type=int, default=60,
+                     help="due dates fall within this many days of today (default: %(default)s)")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--output", help="write the JSON results here instead of standard output")
+    run.set_defaults(handler=cmd_run)
+
+    compare = commands.add_parser("compare", help="compare two result files and report regressions")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.2,
+                         help="allowed slowdown or growth as a fraction (default: %(default)s)")
+    compare.set_defaults(handler=cmd_compare)
+
+    measure_cmd = commands.add_parser("measure", help="time one operation on a store and print JSON (used by run)")
+    measure_cmd.add_argument("operation", choices=list(HEADLESS_OPERATIONS) + list(TK_OPERATIONS))
+    measure_cmd.add_argument("directory")
+    measure_cmd.add_argument("--mode", choices=BENCH_MODES, default="journal")
+    measure_cmd.add_argument("--repeat", type=int, default=200)
+    measure_cmd.set_defaults(handler=cmd_measure)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""Command-line interface to the to-do list
+
+Works on the same todo_data.json as the GUI through the headless
+TaskEngine, so it runs without a display, e.g.:
+
+    python todo_cli.py add "Write report" --priority High --tag Work --due 2026-11-01
+    python todo_cli.py list --status Incomplete --sort "Due Date"
+    python todo_cli.py list --search 'priority:High tag:Work due<2026-11-01 !completed'
+    python todo_cli.py complete 3
+"""
+import os
+import sys
+import argparse
+
+from todo_engine import TaskEngine, DATA_FILENAME, STATUS_FILTERS, TAGS, PRIORITIES, SORT_OPTIONS
+from todo_storage import STORAGE_MODES
+from todo_export import EXPORT_FORMATS, format_for_filename
+from todo_import import IMPORT_FORMATS
+from todo_metrics import Metrics
+from todo_workspace import WorkspaceManager
+from todo_archive import ARCHIVE_AFTER_DAYS
+
+
+def format_task(task):
+    status = "✓" if task.completed else "✗"
+    tags = ", ".join(task.tags)
+    return f"{task.id:>5}  {status}  {task.priority:<6}  {task.due_date or '-':<10}  {task.title}" + (f"  [{tags}]" if tags else "")
+
+
+def cmd_add(engine, args):
+    task = engine.add_task(args.title, args.description, args.priority, args.due, args.tag)
+    print(f"Task '{task.title}' added with ID {task.id}")
+
+
+def cmd_list(engine, args):
+    tasks, _ = engine.query(args.search, args.status, args.tag, args.sort)
+    for task in tasks:
+        print(format_task(task))
+
+
+def cmd_complete(engine, args):
+    task = engine.get(args.id)
+    if task is None:
+        return f"Task with ID {args.id} not found!"
+    if task.completed:
+        print("This task is already completed!")
+        return None
+    engine.complete_task(args.id)
+    print(f"Task '{task.title}' marked as completed!")
+
+
+def cmd_delete(engine, args):
+    task = engine.delete_task(args.id)
+    if task is None:
+        return f"Task with ID {args.id} not found!"
+    print(f"Task '{task.title}' deleted!")
+
+
+def cmd_export(engine, args):
+    fmt = args.format or format_for_filename(args.filename)
+    tasks = None
+    if args.status != "All" or args.tag != "All" or args.search or args.sort:
+        # Export the same view "list" would show
+        tasks, _ = engine.query(args.search, args.status, args.tag, args.sort or "Creation Time")
+    count = engine.export(args.filename, fmt, tasks, include_archived=not args.skip_archived)
+    print(f"{count} tasks exported to {args.filename}")
+
+
+def cmd_import(engine, args):
+    result = engine.import_file(args.filename, args.format)
+    print(result.summary())
+    for number, reason in result.rejected[:args.show_rejected]:
+        print(f"  row {number}: {reason}")
+    if len(result.rejected) > args.show_rejected:
+        print(f"  ... and {len(result.rejected) - args.show_rejected} more")
+
+
+def cmd_stats(engine, args):
+    print_statistics(engine.statistics)
+    print(f"Archived: {engine.archive.count}")
+
+
+def cmd_archive(engine, args):
+    count = engine.archive_completed(args.days)
+    print(f"{count} tasks completed more than {args.days} days ago moved to the archive")
+
+
+def cmd_restore(engine, args):
+    restored = engine.restore_tasks(args.id)
+    for task in restored:
+        print(f"Task '{task.title}' restored from the archive")
+    missing = set(args.id) - {task.id for task in restored}
+    if missing:
+        return "Not in the archive: " + ", ".join(str(task_id) for task_id in sorted(missing))
+
+
+def print_statistics(statistics):
+    print(f"Total Tasks: {statistics.total}")
+    print(f"Completed: {statistics.completed}")
+    print(f"Uncompleted: {statistics.pending}")
+    print("By Priority:")
+    for priority in PRIORITIES:
+        print(f"  {priority}: {statistics.by_priority.get(priority, 0)}")
+    print("By Tag:")
+    if not statistics.by_tag:
+        print("  No tags used")
+    for tag, count in statistics.by_tag.items():
+        print(f"  {tag}: {count}")
+
+
+def cmd_workspaces(workspaces, args):
+    for name in workspaces.names():
+        marker = "*" if name == workspaces.active else " "
+        statistics = workspaces.statistics(name)
+        print(f"{marker} {name:<20} {statistics.total:>7} tasks  {workspaces.workspaces[name]['filename']}")
+
+
+def cmd_list_all(workspaces, args):
+    for name, task in workspaces.query_all(args.search, args.status, args.tag, args.sort):
+        print(f"{name[:12]:<12}  " + format_task(task))
+
+
+def cmd_stats_all(workspaces, args):
+    print_statistics(workspaces.statistics_all())
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="To-Do List Manager (command line)")
+    parser.add_argument("--file", default=DATA_FILENAME, help="task data file (default: %(default)s)")
+    parser.add_argument("--storage", choices=STORAGE_MODES,
+                        default=os.environ.get("TODO_STORAGE", "journal"),
+                        help="storage backend (default: $TODO_STORAGE or journal)")
+    parser.add_argument("--workspace", help="work on this workspace instead of --file (see the workspaces command)")
+    parser.add_argument("--metrics", help="write the timings of this run to a JSON file")
+    parser.add_argument("--profile", action="store_true",
+                        help="also profile the run with cProfile (written next to --metrics as .prof)")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    add = commands.add_parser("add", help="add a task")
+    add.add_argument("title")
+    add.add_argument("--description", default="")
+    add.add_argument("--priority", choices=PRIORITIES, default="Medium")
+    add.add_argument("--due", default="", help="due date as YYYY-MM-DD")
+    add.add_argument("--tag", action="append", choices=TAGS, default=[])
+    add.set_defaults(handler=cmd_add)
+
+    list_cmd = commands.add_parser("list", help="list tasks")
+    list_cmd.add_argument("--status", choices=STATUS_FILTERS, default="All")
+    list_cmd.add_argument("--tag", choices=["All"] + TAGS, default="All")
+    list_cmd.add_argument("--sort", choices=SORT_OPTIONS, default="Creation Time")
+    list_cmd.add_argument("--search", default="", help="text to find, or a query (see todo_query.py)")
+    list_cmd.add_argument("--all-workspaces", action="store_true", help="list matching tasks of every workspace")
+    list_cmd.set_defaults(handler=cmd_list, workspaces_handler=cmd_list_all)
+
+    complete = commands.add_parser("complete", help="mark a task completed")
+    complete.add_argument("id", type=int)
+    complete.set_defaults(handler=cmd_complete)
+
+    delete = commands.add_parser("delete", help="delete a task")
+    delete.add_argument("id", type=int)
+    delete.set_defaults(handler=cmd_delete)
+
+    export = commands.add_parser("export", help="export tasks to a TXT, CSV, JSON Lines or Markdown file")
+    export.add_argument("filename")
+    export.add_argument("--format", choices=list(EXPORT_FORMATS), help="default: from the file extension, else txt")
+    export.add_argument("--status", choices=STATUS_FILTERS, default="All")
+    export.add_argument("--tag", choices=["All"] + TAGS, default="All")
+    export.add_argument("--sort", choices=SORT_OPTIONS, help="default: the order tasks were added")
+    export.add_argument("--search", default="", help="text to find, or a query (see todo_query.py)")
+    export.add_argument("--skip-archived", action="store_true", help="leave out archived tasks")
+    export.set_defaults(handler=cmd_export)
+
+    import_cmd = commands.add_parser("import", help="import tasks from CSV, JSON Lines or another todo_data.json")
+    import_cmd.add_argument("filename")
+    import_cmd.add_argument("--format", choices=list(IMPORT_FORMATS), help="default: from the file extension, else json")
+    import_cmd.add_argument("--show-rejected", type=int, default=20, help="rejected rows to list (default: %(default)s)")
+    import_cmd.set_defaults(handler=cmd_import)
+
+    stats = commands.add_parser("stats", help="show task statistics")
+    stats.add_argument("--all-workspaces", action="store_true", help="add up the statistics of every workspace")
+    stats.set_defaults(handler=cmd_stats, workspaces_handler=cmd_stats_all)
+
+    archive = commands.add_parser("archive", help="move tasks completed long ago to the compressed archive")
+    archive.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                         help="archive tasks completed more than this many days ago (default: %(default)s)")
+    archive.set_defaults(handler=cmd_archive)
+
+    restore = commands.add_parser("restore", help="move archived tasks back to the task list")
+    restore.add_argument("id", type=int, nargs="+")
+    restore.set_defaults(handler=cmd_restore)
+
+    workspaces = commands.add_parser("workspaces", help="list the workspaces and their task counts")
+    workspaces.set_defaults(workspaces_handler=cmd_workspaces, all_workspaces=True)
+    return parser
+
+
+def run(args, metrics):
+    if args.workspace or getattr(args, "all_workspaces", False):
+        # Workspaces live next to the data file
+        workspaces = WorkspaceManager(os.path.dirname(args.file) or ".", args.storage, metrics=metrics)
+        try:
+            if getattr(args, "all_workspaces", False):
+                return args.workspaces_handler(workspaces, args)
+            if args.workspace not in workspaces.names():
+                return f"No workspace named '{args.workspace}'"
+            return args.handler(workspaces.open(args.workspace), args)
+        finally:
+            workspaces.close()
+
+    engine = TaskEngine(args.file, args.storage, metrics=metrics)
+    engine.load()
+    try:
+        return args.handler(engine, args)
+    finally:
+        engine.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    metrics = Metrics()
+    if args.profile:
+        metrics.start_profiling()
+    try:
+        return run(args, metrics)
+    finally:
+        if args.profile:
+            metrics.stop_profiling()
+        if args.metrics:
+            metrics.dump(args.metrics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
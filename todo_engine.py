@@ -0,0 +1,587 @@
+import time
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+from todo_storage import create_storage, WriteBehindStorage, LOAD_BATCH_SIZE
+from todo_index import SearchIndex, SortedIndex, TaskStatistics, DueDateIndex
+from todo_query import compile_query
+from todo_repository import TaskRepository
+from todo_model import Task
+from todo_export import export_tasks
+from todo_metrics import Metrics, timed
+from todo_archive import TaskArchive, ARCHIVE_AFTER_DAYS, archive_filename
+
+DATA_FILENAME = "todo_data.json"
+
+STATUS_FILTERS = ["All", "Incomplete", "Completed", "Overdue", "Due Today", "Due This Week", "Next 7 Days"]
+TAGS = ["Work", "Personal", "Study", "Urgent"]
+PRIORITIES = ["High", "Medium", "Low"]
+SORT_OPTIONS = ["Creation Time", "Due Date", "Priority", "Task Name"]
+
+
+def now_string():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def today_string():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+class Conflict:
+    """A task changed both here and by another process
+
+    The change made here was written last and is kept; theirs is the
+    version of the other process (None if it deleted the task).
+    """
+
+    def __init__(self, task_id, theirs):
+        self.task_id = task_id
+        self.theirs = theirs
+
+
+class SyncResult:
+    """What TaskEngine.sync() merged: changed tasks, deleted ids and conflicts"""
+
+    def __init__(self, changed=(), deleted=(), conflicts=()):
+        self.changed = list(changed)
+        self.deleted = list(deleted)
+        self.conflicts = list(conflicts)
+
+    def __bool__(self):
+        return bool(self.changed or self.deleted or self.conflicts)
+
+
+class TaskEngine:
+    """Task store, indexes and queries without any GUI dependency
+
+    The Tk app and the command-line tool both work through this class.
+    Every method that reads or changes tasks takes the engine lock, so a
+    query may run on a worker thread while the Tk thread edits tasks.
+    Loading, saving, query stages and changes are timed in metrics.
+
+    Several processes may share the store: the storage keeps them from
+    overwriting each other, ids are reserved through it, and sync()
+    merges what the others changed.
+    """
+
+    def __init__(self, filename=DATA_FILENAME, storage_mode="journal", write_behind=True, metrics=None):
+        self.filename = filename
+        self.metrics = metrics or Metrics()
+        self.lock = threading.RLock()
+        self.storage = create_storage(storage_mode, filename)
+        if write_behind:
+            self.storage = WriteBehindStorage(self.storage, self.lock)
+        self.tasks = TaskRepository()
+        self.search_index = SearchIndex()
+        self.sorted_index = SortedIndex()
+        self.statistics = TaskStatistics()
+        self.due_index = DueDateIndex()
+        self.archive = TaskArchive(archive_filename(filename))
+        self.loading = False
+
+    def load(self):
+        """Read the tasks from storage and build the indexes"""
+        for _ in self.iter_load():
+            pass
+
+    def iter_load(self, batch_size=LOAD_BATCH_SIZE):
+        """Load the tasks batch by batch, yielding the number loaded so far
+
+        The tasks of each batch are queryable as soon as it is yielded, so a
+        caller can paint the first batch and finish loading in the background.
+        Changes must wait until loading is done (see the loading flag), since
+        ids of tasks still on disk are not known yet.
+        """
+        with self.lock:
+            self.loading = True
+            self.tasks = TaskRepository()
+            self.search_index = SearchIndex()
+            self.sorted_index = SortedIndex()
+            self.statistics = TaskStatistics()
+            self.due_index = DueDateIndex()
+            # Ids of archived tasks are never handed out again
+            self.tasks.skip_ids(self.archive.max_id)
+        started = time.perf_counter()
+        batches = self.storage.iter_load(batch_size)
+        try:
+            while True:
+                # Reading and parsing the file is timed apart from indexing
+                with self.metrics.timer("load.read"):
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+                tasks, deleted_ids = batch
+                with self.lock, self.metrics.timer("load.index"):
+                    for task_id in deleted_ids:
+                        if self.tasks.remove(task_id) is not None:
+                            self.search_index.remove(task_id)
+                            self.sorted_index.remove(task_id)
+                            self.statistics.remove(task_id)
+                            self.due_index.remove(task_id)
+                    tasks = [Task.from_dict(task) for task in tasks]
+                    for task in tasks:
+                        self.tasks.add(task)
+                        self.search_index.add(task)
+                        self.statistics.update(task)
+                    self.sorted_index.add_many(tasks)
+                    self.due_index.add_many(tasks)
+                self.metrics.count("load.tasks", len(tasks))
+                yield len(self.tasks)
+        finally:
+            with self.lock:
+                self.loading = False
+            self.metrics.record("load", time.perf_counter() - started)
+
+    @timed("save")
+    def save(self):
+        """Rewrite the whole store"""
+        with self.lock:
+            with self.metrics.timer("save.serialize"):
+                tasks = [task.to_dict() for task in self.tasks]
+            with self.metrics.timer("save.write"):
+                self.storage.save(tasks)
+
+    def flush(self):
+        """Block until every change so far is on disk; False if writing failed"""
+        flush = getattr(self.storage, "flush", None)
+        return flush() if flush else True
+
+    def close(self):
+        """Flush pending changes and release the storage"""
+        self.storage.close()
+        self.archive.close()
+
+    def get(self, task_id):
+        return self.tasks.get(task_id)
+
+    def reserve_ids(self, count):
+        """Reserve count consecutive ids no process sharing the store uses; returns the first (hold the lock)"""
+        first = self.storage.reserve_ids(count, self.tasks.peek_id())
+        self.tasks.skip_ids(first + count - 1)
+        return first
+
+    @timed("sync")
+    def sync(self):
+        """Merge the changes other processes made to the store; returns a SyncResult
+
+        Only the tasks that changed are read and re-indexed. Queued
+        changes of this process are written first, so a task both sides
+        changed keeps the version written here and is listed in conflicts.
+        """
+        with self.lock:
+            if self.loading:
+                return SyncResult()
+            changes, conflicts = self.storage.read_changes(self.tasks)
+            changed, deleted = self.merge_changes(changes, persist=False)
+            conflicts = [
+                Conflict(task_id, Task.from_dict(data) if data is not None else None)
+                for task_id, data in conflicts.items()
+            ]
+        if deleted:
+            # Another process may have moved them to the archive
+            self.archive.refresh()
+        self.metrics.count("sync.changed", len(changed) + len(deleted))
+        self.metrics.count("sync.conflicts", len(conflicts))
+        return SyncResult(changed, deleted, conflicts)
+
+    def merge_changes(self, changes, persist=True):
+        """Apply changes made to another copy of the store; returns (changed tasks, deleted ids)
+
+        changes maps task ids to task dicts, or None if deleted, and
+        changes that are already applied are left out of the result. With
+        persist=False the storage already has them, so they are only indexed.
+        """
+        with self.lock:
+            changed = []
+            deleted = []
+            for task_id, data in changes.items():
+                task = self.tasks.get(task_id)
+                if data is None:
+                    if task is not None:
+                        self.tasks.remove(task_id)
+                        deleted.append(task_id)
+                elif task is None:
+                    changed.append(self.tasks.add(Task.from_dict(data)))
+                elif task.to_dict() != data:
+                    # Changed in place, so views holding the task see it too
+                    task.update(**data)
+                    changed.append(task)
+            if persist:
+                self.record_tasks(changed)
+                self.forget_tasks(deleted)
+            else:
+                self.index_tasks(changed)
+                self.unindex_tasks(deleted)
+        return changed, deleted
+
+    def accept_theirs(self, conflict):
+        """Replace the version kept here with the other process's one; returns the task or None"""
+        with self.lock:
+            if conflict.theirs is None:
+                self.delete_task(conflict.task_id)
+                return None
+            data = conflict.theirs.to_dict()
+            task = self.tasks.get(conflict.task_id)
+            if task is None:
+                task = self.tasks.add(Task.from_dict(data))
+            else:
+                task.update(**data)
+            self.record_task(task)
+        return task
+
+    @timed("task.add")
+    def add_task(self, title, description="", priority="Medium", due_date="", tags=()):
+        """Create, index and persist a new task"""
+        with self.lock:
+            task = Task(
+                id=self.reserve_ids(1),
+                title=title,
+                description=description,
+                priority=priority,
+                due_date=due_date,
+                tags=tags,
+                completed=False,
+                created_at=now_string(),
+                completed_at=""
+            )
+            self.tasks.add(task)
+            self.record_task(task)
+        return task
+
+    @timed("task.update")
+    def update_task(self, task_id, **fields):
+        """Change fields of a task; returns the task or None if it does not exist"""
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return None
+            task.update(**fields)
+            self.record_task(task)
+        return task
+
+    @timed("task.complete")
+    def complete_task(self, task_id):
+        """Mark a task completed; returns the task or None if it does not exist"""
+        return self.update_task(task_id, completed=True, completed_at=now_string())
+
+    @timed("task.delete")
+    def delete_task(self, task_id):
+        """Delete a task, archived or not; returns it or None if it does not exist"""
+        with self.lock:
+            task = self.tasks.remove(task_id)
+            if task is not None:
+                self.forget_task(task_id)
+                return task
+            task = self.archive.get(task_id)
+            if task is not None:
+                self.archive.remove([task_id])
+        return task
+
+    @timed("import")
+    def import_file(self, filename, fmt=None, progress=None, check_cancelled=lambda: None):
+        """Bulk import a CSV, JSON Lines or todo_data.json file; returns an ImportResult
+
+        Rows are parsed as a stream and validated in batches without the
+        lock, skipping rejected rows and duplicates of existing tasks,
+        archived ones included. The accepted tasks then get their ids in
+        one step and are added, indexed and persisted together, as a single
+        storage write.
+        """
+        from todo_import import ImportResult, iter_import_batches, duplicate_key, format_for_filename
+        fmt = fmt or format_for_filename(filename)
+        result = ImportResult()
+        with self.lock:
+            seen = {duplicate_key(task) for task in self.tasks}
+        # Re-importing an export must not bring archived tasks back as new ones
+        if self.archive.count:
+            seen.update(duplicate_key(task) for task in self.archive.iter_tasks())
+        accepted = []
+        with open(filename, 'r', encoding='utf-8-sig', newline='') as file:
+            for batch in iter_import_batches(file, fmt, seen, result, now_string()):
+                accepted.extend(batch)
+                check_cancelled()
+                result.elapsed = time.monotonic() - result.started
+                if progress:
+                    progress(result)
+
+        with self.lock:
+            first_id = self.reserve_ids(len(accepted))
+            tasks = [Task(id=first_id + i, **fields) for i, fields in enumerate(accepted)]
+            for task in tasks:
+                self.tasks.add(task)
+            self.record_tasks(tasks)
+        result.imported = len(tasks)
+        result.elapsed = time.monotonic() - result.started
+        if progress:
+            progress(result)
+        return result
+
+    def update_tasks(self, task_ids, **fields):
+        """Set fields on many tasks as one batch; returns the tasks that changed"""
+        def change(task):
+            if all(getattr(task, key, None) == value for key, value in fields.items()):
+                return False
+            task.update(**fields)
+            return True
+        return self.change_tasks(task_ids, change)
+
+    def complete_tasks(self, task_ids):
+        """Mark many tasks completed as one batch; returns the tasks that changed"""
+        completed_at = now_string()
+
+        def change(task):
+            if task.completed:
+                return False
+            task.update(completed=True, completed_at=completed_at)
+            return True
+        return self.change_tasks(task_ids, change)
+
+    def tag_tasks(self, task_ids, tag, add=True):
+        """Add or remove a tag on many tasks as one batch; returns the tasks that changed"""
+        def change(task):
+            if (tag in task.tags) == add:
+                return False
+            task.tags = task.tags + (tag,) if add else tuple(t for t in task.tags if t != tag)
+            return True
+        return self.change_tasks(task_ids, change)
+
+    @timed("batch.change")
+    def change_tasks(self, task_ids, change):
+        """Call change(task) for each task; those it returns True for are saved together"""
+        with self.lock:
+            changed = []
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if task is not None and change(task):
+                    changed.append(task)
+            self.record_tasks(changed)
+        return changed
+
+    @timed("batch.delete")
+    def delete_tasks(self, task_ids):
+        """Delete many tasks, archived or not, as one batch; returns the deleted tasks"""
+        with self.lock:
+            deleted = [task for task in map(self.tasks.remove, task_ids) if task is not None]
+            self.forget_tasks([task.id for task in deleted])
+            if len(deleted) < len(task_ids):
+                found = {task.id for task in deleted}
+                archived = [self.archive.get(task_id) for task_id in task_ids if task_id not in found]
+                archived = [task for task in archived if task is not None]
+                self.archive.remove([task.id for task in archived])
+                deleted.extend(archived)
+        return deleted
+
+    @timed("archive")
+    def archive_completed(self, days=ARCHIVE_AFTER_DAYS, now=None):
+        """Move tasks completed more than days ago to the archive; returns how many"""
+        cutoff = ((now or datetime.now()) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        with self.lock:
+            # A shared remote list is not archived by each of its clients
+            if self.loading or not self.storage.supports_archive:
+                return 0
+            old = [task for task in self.tasks if task.completed and "" < task.completed_at < cutoff]
+            if not old:
+                return 0
+            # Written to the archive before leaving the store, so a crash
+            # in between leaves a copy in both rather than in neither
+            self.archive.add(old)
+            for task in old:
+                self.tasks.remove(task.id)
+            self.forget_tasks([task.id for task in old])
+        return len(old)
+
+    def archived_task(self, task_id):
+        """An archived task, or None"""
+        return self.archive.get(task_id)
+
+    @timed("archive.restore")
+    def restore_tasks(self, task_ids):
+        """Move archived tasks back into the store; returns the restored tasks"""
+        with self.lock:
+            tasks = [self.archive.get(task_id) for task_id in task_ids if task_id not in self.tasks]
+            tasks = [task for task in tasks if task is not None]
+            for task in tasks:
+                self.tasks.add(task)
+            self.record_tasks(tasks)
+            # The store has them now; a crash before this line only leaves
+            # archived copies that the live tasks mask
+            self.archive.remove([task.id for task in tasks])
+        return tasks
+
+    def record_tasks(self, tasks):
+        """Index and persist a batch of added or changed tasks with one storage write (hold the lock)"""
+        if not tasks:
+            return
+        self.index_tasks(tasks)
+        with self.metrics.timer("change.storage"):
+            self.storage.apply({task.id: task.to_dict() for task in tasks}, self.tasks)
+
+    def forget_tasks(self, task_ids):
+        """Drop a batch of deleted tasks from the indexes and storage (hold the lock)"""
+        if not task_ids:
+            return
+        self.unindex_tasks(task_ids)
+        with self.metrics.timer("change.storage"):
+            self.storage.apply(dict.fromkeys(task_ids), self.tasks)
+
+    def index_tasks(self, tasks):
+        """Update the indexes for a batch of added or changed tasks (hold the lock)"""
+        if not tasks:
+            return
+        with self.metrics.timer("change.index"):
+            for task in tasks:
+                self.search_index.update(task)
+                self.statistics.update(task)
+            self.sorted_index.update_many(tasks)
+            self.due_index.update_many(tasks)
+
+    def unindex_tasks(self, task_ids):
+        """Drop a batch of deleted tasks from the indexes (hold the lock)"""
+        if not task_ids:
+            return
+        with self.metrics.timer("change.index"):
+            for task_id in task_ids:
+                self.search_index.remove(task_id)
+                self.statistics.remove(task_id)
+            self.sorted_index.remove_many(task_ids)
+            self.due_index.remove_many(task_ids)
+
+    def record_task(self, task):
+        """Index and persist an added or changed task (hold the lock)"""
+        with self.metrics.timer("change.index"):
+            self.search_index.update(task)
+            self.sorted_index.update(task)
+            self.statistics.update(task)
+            self.due_index.update(task)
+        with self.metrics.timer("change.storage"):
+            self.storage.put(task.to_dict(), self.tasks)
+
+    def forget_task(self, task_id):
+        """Drop a deleted task from the indexes and storage (hold the lock)"""
+        with self.metrics.timer("change.index"):
+            self.search_index.remove(task_id)
+            self.sorted_index.remove(task_id)
+            self.statistics.remove(task_id)
+            self.due_index.remove(task_id)
+        with self.metrics.timer("change.storage"):
+            self.storage.delete(task_id, self.tasks)
+
+    @timed("query")
+    def query(self, search_text="", status="All", tag="All", sort="Creation Time",
+              today=None, check_cancelled=lambda: None, include_archived=True):
+        """Tasks matching the filters in display order, with their sort keys
+
+        search_text may be a query (see todo_query); it is compiled with the
+        status and tag filters, so the whole view costs one pass. Queries
+        that only match completed tasks also list archived tasks, read from
+        the archive on demand; others let go of the archive again.
+        """
+        today = today or today_string()
+        compiled = compile_query(search_text, status, tag)
+        with self.lock:
+            # Tasks containing every word, answered by the inverted index
+            candidates = None
+            if compiled.phrases:
+                with self.metrics.timer("query.search"):
+                    for phrase in compiled.phrases:
+                        matches = self.search_index.search(phrase)
+                        candidates = matches if candidates is None else candidates & matches
+            check_cancelled()
+
+            with self.metrics.timer("query.filter_sort"):
+                # Indexed storage answers the status, tag and sort combos itself
+                # once every queued write is durable
+                ordered_ids = self.storage.query_ids(status, tag, sort, today) if compiled.plain else None
+                if ordered_ids is not None:
+                    filtered_tasks = [
+                        self.tasks.get(task_id) for task_id in ordered_ids
+                        if candidates is None or task_id in candidates
+                    ]
+                else:
+                    filtered_tasks = self.select(compiled, sort, today, candidates, check_cancelled)
+            check_cancelled()
+
+            with self.metrics.timer("query.keys"):
+                keys = [self.sorted_index.key(task, sort) for task in filtered_tasks]
+
+        # The archive has its own lock, so edits need not wait for it to be read
+        if not compiled.archived or not include_archived:
+            self.archive.release()
+        elif self.archive.count:
+            with self.metrics.timer("query.archive"):
+                archived, archived_keys = self.archive.query(compiled.matcher(today), sort, self.tasks, check_cancelled)
+                pairs = list(heapq.merge(zip(keys, filtered_tasks), zip(archived_keys, archived),
+                                         key=lambda pair: pair[0]))
+                keys = [key for key, task in pairs]
+                filtered_tasks = [task for key, task in pairs]
+        return filtered_tasks, keys
+
+    def select(self, compiled, sort_option, today, candidates=None, check_cancelled=lambda: None):
+        """Tasks matching a CompiledQuery in the maintained order for sort_option (hold the lock)
+
+        candidates are the ids the search index found, if the query has
+        words. A due date range narrows them further with the due date
+        index. Few candidates are looked up and sorted; otherwise the order
+        is walked once by the query's selector.
+        """
+        # Already sorted; filtering keeps the order, so no sort is needed
+        ordered = self.sorted_index.ordered(sort_option)
+        bounds = compiled.due_bounds(today)
+        if bounds is not None:
+            # Range lookup in the due date index
+            completed = [compiled.completed] if compiled.completed is not None else [False, True]
+            ids = set()
+            for partition in completed:
+                ids.update(self.due_index.ids_between(*bounds, completed=partition))
+            candidates = ids if candidates is None else candidates & ids
+        indexed = bool(compiled.phrases)
+        if candidates is not None and len(candidates) * 8 < len(ordered):
+            # Few matches: sorting them is cheaper than walking the whole order
+            match = compiled.matcher(today, indexed)
+            filtered_tasks = sorted(
+                (task for task in map(self.tasks.get, candidates) if match is None or match(task)),
+                key=lambda task: self.sorted_index.key(task, sort_option)
+            )
+        else:
+            select = compiled.selector(today, indexed)
+            if select is not None:
+                filtered_tasks = select(ordered, candidates)
+            elif candidates is not None:
+                filtered_tasks = [task for task in ordered if task.id in candidates]
+            else:
+                filtered_tasks = list(ordered)
+        check_cancelled()
+        return filtered_tasks
+
+    def sort_key(self, task, sort_option):
+        with self.lock:
+            return self.sorted_index.key(task, sort_option)
+
+    def task_matches(self, task, search_text="", status_filter="All", tag_filter="All", today=None):
+        """Whether a single task passes the query and the status and tag filters"""
+        match = compile_query(search_text, status_filter, tag_filter).matcher(today or today_string())
+        return match is None or match(task)
+
+    @timed("export")
+    def export(self, filename, fmt="txt", tasks=None, progress=None, check_cancelled=lambda: None,
+               include_archived=True):
+        """Export tasks (all of them, archived ones included, by default) in one of the EXPORT_FORMATS
+
+        Only taking the list of tasks holds the lock, so this may run on a
+        worker thread for a long export while the GUI keeps editing.
+        """
+        with self.lock:
+            if tasks is None:
+                tasks = list(self.tasks)
+                if include_archived and self.archive.count:
+                    live_ids = {task.id for task in tasks}
+                    tasks = itertools.chain(tasks, self.archive.iter_tasks(exclude=live_ids))
+            else:
+                tasks = list(tasks)
+        return export_tasks(tasks, filename, fmt, progress, check_cancelled)
+
+    def export_text(self, filename):
+        """Export tasks to a text file"""
+        return self.export(filename, "txt")
@@ -0,0 +1,193 @@
+import os
+import csv
+import json
+import shutil
+import tempfile
+
+# Tasks written between progress reports and cancellation checks
+PROGRESS_EVERY = 1000
+
+# Write buffer of the export file, so each task is not a system call
+BUFFER_SIZE = 1 << 20
+
+
+class ExportCancelled(Exception):
+    """Raised inside an export that the user cancelled"""
+
+
+class TextExporter:
+    """The original TXT layout: incomplete tasks, then completed ones
+
+    Both sections are produced in one pass; completed tasks are spooled to
+    a temporary file and appended after the incomplete ones.
+    """
+
+    extension = ".txt"
+    label = "Text files"
+
+    def __init__(self, file):
+        self.file = file
+        self.completed = tempfile.TemporaryFile('w+', encoding='utf-8')
+
+    def begin(self):
+        self.file.write("===== To-Do List =====\n\n")
+        self.file.write("--- Incomplete Tasks ---\n")
+
+    def write(self, task):
+        if task.completed:
+            self.completed.write(f"[{task.id}] {task.title} (Completed at: {task.completed_at})\n")
+            return
+        lines = [f"[{task.id}] {task.title}\n", f"  Priority: {task.priority}\n"]
+        if task.due_date:
+            lines.append(f"  Due Date: {task.due_date}\n")
+        if task.tags:
+            lines.append(f"  Tags: {', '.join(task.tags)}\n")
+        if task.description:
+            lines.append(f"  Description: {task.description}\n")
+        lines.append("\n")
+        self.file.write("".join(lines))
+
+    def end(self):
+        self.file.write("\n--- Completed Tasks ---\n")
+        self.completed.seek(0)
+        shutil.copyfileobj(self.completed, self.file)
+        self.close()
+
+    def close(self):
+        self.completed.close()
+
+
+class CsvExporter:
+    """One row per task with a header row"""
+
+    extension = ".csv"
+    label = "CSV files"
+    columns = ("id", "title", "description", "priority", "due_date",
+               "tags", "completed", "created_at", "completed_at")
+
+    def __init__(self, file):
+        self.writer = csv.writer(file)
+
+    def begin(self):
+        self.writer.writerow(self.columns)
+
+    def write(self, task):
+        self.writer.writerow((
+            task.id, task.title, task.description, task.priority, task.due_date,
+            ", ".join(task.tags), task.completed, task.created_at, task.completed_at
+        ))
+
+    def end(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonLinesExporter:
+    """One JSON task object per line, the same fields as todo_data.json"""
+
+    extension = ".jsonl"
+    label = "JSON Lines files"
+
+    def __init__(self, file):
+        self.file = file
+
+    def begin(self):
+        pass
+
+    def write(self, task):
+        self.file.write(json.dumps(task.to_dict(), ensure_ascii=False) + "\n")
+
+    def end(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _markdown_cell(value):
+    return str(value).replace("\\", "\\\\").replace("|", "\\|").replace("\n", "<br>")
+
+
+class MarkdownExporter:
+    """A Markdown table in the column order of the task list"""
+
+    extension = ".md"
+    label = "Markdown files"
+
+    def __init__(self, file):
+        self.file = file
+
+    def begin(self):
+        self.file.write("# To-Do List\n\n")
+        self.file.write("| ID | Status | Priority | Title | Tags | Due Date | Created | Description |\n")
+        self.file.write("|---:|:---:|---|---|---|---|---|---|\n")
+
+    def write(self, task):
+        cells = (
+            task.id, "✓" if task.completed else "✗", task.priority, task.title,
+            ", ".join(task.tags), task.due_date, task.created_at, task.description
+        )
+        self.file.write("| " + " | ".join(_markdown_cell(cell) for cell in cells) + " |\n")
+
+    def end(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# Export formats by name, in the order they are offered
+EXPORT_FORMATS = {
+    "txt": TextExporter,
+    "csv": CsvExporter,
+    "jsonl": JsonLinesExporter,
+    "md": MarkdownExporter,
+}
+
+
+def format_for_filename(filename, default="txt"):
+    """Export format matching the extension of filename"""
+    extension = os.path.splitext(filename)[1].lower()
+    for name, exporter in EXPORT_FORMATS.items():
+        if exporter.extension == extension:
+            return name
+    return default
+
+
+def export_tasks(tasks, filename, fmt="txt", progress=None, check_cancelled=lambda: None):
+    """Stream tasks to filename in one pass; returns the number written
+
+    The file is written under a temporary name and renamed when complete,
+    so a cancelled or failed export never leaves a partial file behind.
+    progress(count) is called every PROGRESS_EVERY tasks, and
+    check_cancelled() may raise ExportCancelled to stop.
+    """
+    temp_filename = filename + ".tmp"
+    count = 0
+    try:
+        # newline='' lets the csv module write its own line endings
+        newline = '' if fmt == "csv" else None
+        with open(temp_filename, 'w', encoding='utf-8', newline=newline, buffering=BUFFER_SIZE) as file:
+            exporter = EXPORT_FORMATS[fmt](file)
+            try:
+                exporter.begin()
+                for task in tasks:
+                    exporter.write(task)
+                    count += 1
+                    if count % PROGRESS_EVERY == 0:
+                        check_cancelled()
+                        if progress:
+                            progress(count)
+                exporter.end()
+            finally:
+                exporter.close()
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+    if progress:
+        progress(count)
+    return count
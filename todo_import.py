@@ -0,0 +1,202 @@
+import os
+import csv
+import json
+import time
+from functools import lru_cache
+from datetime import datetime
+
+from todo_storage import iter_json_array
+from todo_engine import TAGS, PRIORITIES
+
+# Rows validated per batch; progress and cancellation are checked between batches
+IMPORT_BATCH_SIZE = 1000
+
+
+class ImportCancelled(Exception):
+    """Raised inside an import that the user cancelled"""
+
+
+def read_csv(file):
+    """Rows of a CSV file with a header row, such as a CSV export"""
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    # Accept "Due Date" as well as "due_date"
+    fields = [name.strip().lower().replace(" ", "_") for name in header]
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield reader.line_num, dict(zip(fields, row))
+
+
+def read_json_lines(file):
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, "not valid JSON"
+
+
+def read_json_array(file):
+    """Rows of a todo_data.json style array, read in chunks"""
+    number = 0
+    try:
+        for row in iter_json_array(file):
+            number += 1
+            yield number, row
+    except ValueError:
+        yield number + 1, "not valid JSON; the rest of the file was skipped"
+
+
+# Import formats by name: (file extension, label, reader)
+IMPORT_FORMATS = {
+    "csv": (".csv", "CSV files", read_csv),
+    "jsonl": (".jsonl", "JSON Lines files", read_json_lines),
+    "json": (".json", "To-do data files", read_json_array),
+}
+
+
+def format_for_filename(filename, default="json"):
+    """Import format matching the extension of filename"""
+    extension = os.path.splitext(filename)[1].lower()
+    for name, (format_extension, _, _) in IMPORT_FORMATS.items():
+        if format_extension == extension:
+            return name
+    return default
+
+
+class ImportResult:
+    """Counters of a running or finished import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.rejected = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"{self.imported} tasks imported from {self.rows} rows in {self.elapsed:.1f} s "
+            f"({self.rows_per_second:,.0f} rows/s), {self.duplicates} duplicates skipped, "
+            f"{len(self.rejected)} rows rejected"
+        )
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def _pick(options, value, what):
+    """The option matching value case-insensitively"""
+    for option in options:
+        if option.lower() == value.lower():
+            return option
+    raise ValueError(f"unknown {what} '{value}'")
+
+
+@lru_cache(maxsize=4096)
+def _valid_date(value, pattern):
+    # Imports repeat the same dates a lot, so each is parsed once
+    try:
+        datetime.strptime(value, pattern)
+    except ValueError:
+        return False
+    return True
+
+
+def _check_date(value, pattern, what):
+    if value and not _valid_date(value, pattern):
+        raise ValueError(f"invalid {what} '{value}'")
+    return value
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text in ("", "0", "false", "no", "✗"):
+        return False
+    if text in ("1", "true", "yes", "✓"):
+        return True
+    raise ValueError(f"invalid completed value '{value}'")
+
+
+def validate_row(row, now):
+    """Turn one parsed row into a task dict without an id; raises ValueError"""
+    if not isinstance(row, dict):
+        raise ValueError(row if isinstance(row, str) else "not a task object")
+    title = _text(row.get("title"))
+    if not title:
+        raise ValueError("missing title")
+    priority = _pick(PRIORITIES, _text(row.get("priority")) or "Medium", "priority")
+    tags = row.get("tags") or []
+    if isinstance(tags, str):
+        tags = tags.replace(";", ",").split(",")
+    if not isinstance(tags, list):
+        raise ValueError("tags must be a list")
+    tags = [_pick(TAGS, _text(tag), "tag") for tag in tags if _text(tag)]
+    completed = _parse_bool(row.get("completed"))
+    created_at = _check_date(_text(row.get("created_at")), "%Y-%m-%d %H:%M:%S", "creation time")
+    completed_at = _check_date(_text(row.get("completed_at")), "%Y-%m-%d %H:%M:%S", "completion time")
+    return {
+        "title": title,
+        "description": _text(row.get("description")),
+        "priority": priority,
+        "due_date": _check_date(_text(row.get("due_date")), "%Y-%m-%d", "due date"),
+        # Keep the order of first appearance without repeats
+        "tags": list(dict.fromkeys(tags)),
+        "completed": completed,
+        "created_at": created_at or now,
+        "completed_at": completed_at or (now if completed else ""),
+    }
+
+
+def duplicate_key(task):
+    """Tasks with the same title, description and due date count as one"""
+    return (task["title"].lower(), task["description"], task["due_date"])
+
+
+def validate_rows(rows, seen, result, now):
+    """Validate a batch of (row number, row), dropping rejects and duplicates
+
+    seen holds the duplicate keys of existing and already accepted tasks
+    and is updated with the accepted ones.
+    """
+    accepted = []
+    for number, row in rows:
+        try:
+            task = validate_row(row, now)
+        except ValueError as e:
+            result.rejected.append((number, str(e)))
+            continue
+        key = duplicate_key(task)
+        if key in seen:
+            result.duplicates += 1
+            continue
+        seen.add(key)
+        accepted.append(task)
+    return accepted
+
+
+def iter_import_batches(file, fmt, seen, result, now, batch_size=IMPORT_BATCH_SIZE):
+    """Parse file as fmt and yield lists of validated task dicts"""
+    reader = IMPORT_FORMATS[fmt][2]
+    batch = []
+    for number, row in reader(file):
+        batch.append((number, row))
+        if len(batch) >= batch_size:
+            result.rows += len(batch)
+            yield validate_rows(batch, seen, result, now)
+            batch = []
+    if batch:
+        result.rows += len(batch)
+        yield validate_rows(batch, seen, result, now)
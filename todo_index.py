@@ -0,0 +1,422 @@
+import re
+import bisect
+from datetime import date, timedelta
+
+PRIORITY_ORDER = {"High": 0, "Medium": 1, "Low": 2}
+
+
+def _creation_key(task):
+    # Newest first: negate the yyyymmddHHMMSS number
+    return (-task.created_stamp, task.id)
+
+
+def _due_date_key(task):
+    # Put the empty date last
+    due_date = task.due_date
+    return (due_date == "", due_date, task.id)
+
+
+def _priority_key(task):
+    return (PRIORITY_ORDER.get(task.priority, 1), task.id)
+
+
+def _name_key(task):
+    return (task.title.lower(), task.id)
+
+
+# Sort key for each option of the sort combo. Keys end with the task id so
+# they are unique and a task's position can be found with bisect.
+SORT_KEYS = {
+    "Creation Time": _creation_key,
+    "Due Date": _due_date_key,
+    "Priority": _priority_key,
+    "Task Name": _name_key,
+}
+
+
+def sort_key(task, sort_option):
+    return SORT_KEYS.get(sort_option, _creation_key)(task)
+
+
+class SortedIndex:
+    """One ordered view of the tasks per sort option, kept up to date
+
+    An option's view is built with a single sort the first time it is
+    requested; after that tasks are moved with bisect when they change.
+    Keys are computed once per task and cached until the task changes, so
+    switching the sort combo or refiltering only walks an existing order.
+    """
+
+    def __init__(self, tasks=()):
+        self.tasks = {task.id: task for task in tasks}
+        self.keys = {}
+        self.orders = {}
+
+    def ordered(self, sort_option):
+        """Tasks in display order for sort_option (do not modify the list)"""
+        if sort_option not in SORT_KEYS:
+            sort_option = "Creation Time"
+        order = self.orders.get(sort_option)
+        if order is None:
+            keys = sorted(self.key(task, sort_option) for task in self.tasks.values())
+            order = self.orders[sort_option] = (keys, [self.tasks[key[-1]] for key in keys])
+        return order[1]
+
+    def key(self, task, sort_option):
+        """Cached sort key of a task"""
+        task_keys = self.keys.setdefault(task.id, {})
+        key = task_keys.get(sort_option)
+        if key is None:
+            key = task_keys[sort_option] = sort_key(task, sort_option)
+        return key
+
+    def update(self, task):
+        """Add a task or move a changed one to its new position in every view"""
+        self.remove(task.id)
+        self.tasks[task.id] = task
+        for sort_option, (keys, rows) in self.orders.items():
+            key = self.key(task, sort_option)
+            index = bisect.bisect_left(keys, key)
+            keys.insert(index, key)
+            rows.insert(index, task)
+
+    add = update
+
+    def add_many(self, tasks):
+        """Add a large batch; built views are dropped and re-sorted on next use"""
+        if len(tasks) < 64:
+            for task in tasks:
+                self.update(task)
+            return
+        for task in tasks:
+            self.tasks[task.id] = task
+            self.keys.pop(task.id, None)
+        self.orders.clear()
+
+    def update_many(self, tasks):
+        """Add or move a batch of tasks with a single rebuild of each built view"""
+        if len(tasks) < 64:
+            for task in tasks:
+                self.update(task)
+            return
+        old_keys = self._forget([task.id for task in tasks])
+        for task in tasks:
+            self.tasks[task.id] = task
+        for sort_option, (keys, rows) in list(self.orders.items()):
+            added = [(self.key(task, sort_option), task) for task in tasks]
+            self.orders[sort_option] = _splice(keys, rows, [old[sort_option] for old in old_keys], added)
+
+    def remove_many(self, task_ids):
+        """Remove a batch of tasks with a single rebuild of each built view"""
+        if len(task_ids) < 64:
+            for task_id in task_ids:
+                self.remove(task_id)
+            return
+        old_keys = self._forget(task_ids)
+        for sort_option, (keys, rows) in list(self.orders.items()):
+            self.orders[sort_option] = _splice(keys, rows, [old[sort_option] for old in old_keys], [])
+
+    def _forget(self, task_ids):
+        """Drop tasks and return the cached keys of those that were present"""
+        old_keys = []
+        for task_id in task_ids:
+            if self.tasks.pop(task_id, None) is not None:
+                old_keys.append(self.keys.pop(task_id, {}))
+        return old_keys
+
+    def remove(self, task_id):
+        task = self.tasks.pop(task_id, None)
+        old_keys = self.keys.pop(task_id, {})
+        if task is None:
+            return
+        for sort_option, (keys, rows) in self.orders.items():
+            key = old_keys.get(sort_option)
+            if key is None:
+                continue
+            index = bisect.bisect_left(keys, key)
+            del keys[index]
+            del rows[index]
+
+
+def _splice(keys, rows, removed, added):
+    """New (keys, rows) without the removed keys and with the added (key, task) pairs
+
+    Positions are found with bisect in the old lists, then the result is
+    assembled from slices in one pass, so a batch costs one copy of the
+    view rather than one list insert or delete per task.
+    """
+    # Inserts sort before a removal at the same position; keys are unique
+    edits = [(bisect.bisect_left(keys, key), 0, key, task) for key, task in added]
+    edits += [(bisect.bisect_left(keys, key), 1, key, None) for key in removed]
+    edits.sort(key=lambda edit: edit[:3])
+    new_keys, new_rows, start = [], [], 0
+    for position, removal, key, task in edits:
+        new_keys += keys[start:position]
+        new_rows += rows[start:position]
+        if removal:
+            start = position + 1
+        else:
+            new_keys.append(key)
+            new_rows.append(task)
+            start = position
+    new_keys += keys[start:]
+    new_rows += rows[start:]
+    return new_keys, new_rows
+
+
+# Status filters answered from due dates: the days each one covers,
+# relative to today (None: no bound)
+DUE_FILTERS = {
+    "Overdue": (None, -1),
+    "Due Today": (0, 0),
+    "Due This Week": (0, "sunday"),
+    "Next 7 Days": (0, 6),
+}
+
+
+def due_range(status_filter, today):
+    """First and last due date ("YYYY-MM-DD", or None if open) of a due filter"""
+    start, end = DUE_FILTERS[status_filter]
+    day = date(int(today[0:4]), int(today[5:7]), int(today[8:10]))
+    if end == "sunday":
+        end = 6 - day.weekday()
+    return (
+        None if start is None else (day + timedelta(days=start)).isoformat(),
+        None if end is None else (day + timedelta(days=end)).isoformat(),
+    )
+
+
+def date_number(text):
+    return int(text[0:4] + text[5:7] + text[8:10]) if text else None
+
+
+class DueDateIndex:
+    """Tasks with a due date, ordered by date, split into open and completed
+
+    Each partition is a sorted list of (yyyymmdd, id), so overdue, today,
+    next N days and any other date range is two bisects. Large batches
+    mark the partitions stale and they are re-sorted on the next query.
+    """
+
+    def __init__(self, tasks=()):
+        self.entries = {}
+        self.partitions = {False: [], True: []}
+        self._stale = False
+        self.add_many(list(tasks))
+
+    def update(self, task):
+        entry = (task.completed, task.due_stamp) if task.due_stamp else None
+        old = self.entries.get(task.id)
+        if old == entry:
+            return
+        self.remove(task.id)
+        if entry is None:
+            return
+        self.entries[task.id] = entry
+        if not self._stale:
+            bisect.insort(self.partitions[entry[0]], (entry[1], task.id))
+
+    add = update
+
+    def add_many(self, tasks):
+        if len(tasks) < 64:
+            for task in tasks:
+                self.update(task)
+            return
+        for task in tasks:
+            if task.due_stamp:
+                self.entries[task.id] = (task.completed, task.due_stamp)
+            else:
+                self.entries.pop(task.id, None)
+        self._stale = True
+
+    update_many = add_many
+
+    def remove_many(self, task_ids):
+        if len(task_ids) < 64:
+            for task_id in task_ids:
+                self.remove(task_id)
+            return
+        for task_id in task_ids:
+            self.entries.pop(task_id, None)
+        self._stale = True
+
+    def remove(self, task_id):
+        old = self.entries.pop(task_id, None)
+        if old is None or self._stale:
+            return
+        partition = self.partitions[old[0]]
+        del partition[bisect.bisect_left(partition, (old[1], task_id))]
+
+    def ids_between(self, first, last, completed=False):
+        """Ids of the tasks due from first to last ("YYYY-MM-DD", None for open ends)"""
+        if self._stale:
+            self.partitions = {False: [], True: []}
+            for task_id, (done, due) in self.entries.items():
+                self.partitions[done].append((due, task_id))
+            for partition in self.partitions.values():
+                partition.sort()
+            self._stale = False
+        partition = self.partitions[completed]
+        low = 0 if first is None else bisect.bisect_left(partition, (date_number(first),))
+        high = len(partition) if last is None else bisect.bisect_left(partition, (date_number(last) + 1,))
+        return [task_id for due, task_id in partition[low:high]]
+
+
+WORD_RE = re.compile(r"\w+")
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Inverted index over task titles and descriptions for the search box
+
+    Each task's text is lowercased once and split into word tokens; tokens
+    point to the ids of the tasks containing them, and a trigram index over
+    the (much smaller) token vocabulary finds the tokens containing a query
+    word. Candidates are then confirmed with a plain substring check, so
+    results match the old `search_text in title or description` scan.
+    """
+
+    def __init__(self, tasks=()):
+        self.text = {}
+        self.postings = {}
+        self.token_grams = {}
+        self._last_query = None
+        self._last_matches = None
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task):
+        text = self._task_text(task)
+        if self.text.get(task.id) == text:
+            return
+        self.remove(task.id)
+        self.text[task.id] = text
+        for token in set(WORD_RE.findall(text)):
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                for gram in _trigrams(token):
+                    self.token_grams.setdefault(gram, set()).add(token)
+            ids.add(task.id)
+        self._last_query = None
+
+    # Edits re-index the task only when its title or description changed
+    update = add
+
+    def remove(self, task_id):
+        text = self.text.pop(task_id, None)
+        if text is None:
+            return
+        for token in set(WORD_RE.findall(text)):
+            ids = self.postings[token]
+            ids.discard(task_id)
+            if not ids:
+                del self.postings[token]
+                for gram in _trigrams(token):
+                    tokens = self.token_grams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.token_grams[gram]
+        self._last_query = None
+
+    def search(self, query):
+        """Ids of the tasks whose title or description contains query"""
+        query = query.lower()
+        if self._last_query is not None and self._last_query in query:
+            # Typing more characters can only narrow the previous result
+            candidates = self._last_matches
+        else:
+            candidates = self._candidates(query)
+        if candidates is None:
+            matches = {task_id for task_id, text in self.text.items() if query in text}
+        else:
+            matches = {task_id for task_id in candidates if query in self.text[task_id]}
+        self._last_query = query
+        self._last_matches = matches
+        return matches
+
+    def _candidates(self, query):
+        """Superset of the matching ids, or None if the index cannot help"""
+        words = WORD_RE.findall(query)
+        if not words:
+            return None
+        candidates = None
+        for word in sorted(words, key=len, reverse=True):
+            ids = set()
+            for token in self._tokens_containing(word):
+                ids |= self.postings[token]
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        return candidates
+
+    def _tokens_containing(self, word):
+        if len(word) < 3:
+            return [token for token in self.postings if word in token]
+        grams = sorted((self.token_grams.get(gram, set()) for gram in _trigrams(word)), key=len)
+        tokens = set(grams[0])
+        for other in grams[1:]:
+            tokens &= other
+        return [token for token in tokens if word in token]
+
+    @staticmethod
+    def _task_text(task):
+        # The separator keeps a query from matching across title and description
+        return (task.title + "\n" + (task.description or "")).lower()
+
+
+class TaskStatistics:
+    """Task counters updated on every change instead of recounted
+
+    Keeps the total, completed, per-priority and per-tag counts. The
+    contribution of each task is remembered so an edit can subtract the old
+    values before adding the new ones.
+    """
+
+    def __init__(self, tasks=()):
+        self.total = 0
+        self.completed = 0
+        self.by_priority = {"High": 0, "Medium": 0, "Low": 0}
+        self.by_tag = {}
+        self._counted = {}
+        for task in tasks:
+            self.update(task)
+
+    @property
+    def pending(self):
+        return self.total - self.completed
+
+    def update(self, task):
+        """Count a new task or recount a changed one"""
+        counted = (task.completed, task.priority, task.tags)
+        old = self._counted.get(task.id)
+        if old == counted:
+            return
+        if old is not None:
+            self._apply(old, -1)
+        self._counted[task.id] = counted
+        self._apply(counted, 1)
+
+    add = update
+
+    def remove(self, task_id):
+        old = self._counted.pop(task_id, None)
+        if old is not None:
+            self._apply(old, -1)
+
+    def _apply(self, counted, sign):
+        completed, priority, tags = counted
+        self.total += sign
+        if completed:
+            self.completed += sign
+        self.by_priority[priority] = self.by_priority.get(priority, 0) + sign
+        for tag in tags:
+            count = self.by_tag.get(tag, 0) + sign
+            if count:
+                self.by_tag[tag] = count
+            else:
+                del self.by_tag[tag]
@@ -0,0 +1,246 @@
+"""Timers, counters and optional cProfile capture for the hot paths
+
+TaskEngine owns a Metrics object and times loading, saving, every query
+stage and every change with it; the GUI adds its own stages (painting
+the Treeview, reconciling rows) to the same object. The Performance
+window under Help shows them, and dump() writes them to a JSON file for
+offline analysis.
+"""
+import io
+import os
+import json
+import math
+import time
+import pstats
+import cProfile
+import functools
+import threading
+from collections import deque
+
+# Upper bounds of the histogram buckets in milliseconds; the last is open
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+
+# Samples kept per timer for percentiles and the recent timings list
+RECENT_SAMPLES = 500
+
+
+def bucket_label(index):
+    bound = BUCKETS_MS[index]
+    if bound == float("inf"):
+        return f">{BUCKETS_MS[index - 1]:g} ms"
+    return f"≤{bound:g} ms"
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of samples, None if there are none"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class TimerStats:
+    """Count, total, extremes, recent samples and a histogram of one timer"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.last = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self.histogram = [0] * len(BUCKETS_MS)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+        milliseconds = seconds * 1000
+        for index, bound in enumerate(BUCKETS_MS):
+            if milliseconds <= bound:
+                self.histogram[index] += 1
+                break
+
+    def to_dict(self):
+        recent = list(self.recent)
+        p50 = percentile(recent, 0.50)
+        p99 = percentile(recent, 0.99)
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else None,
+            "min_ms": self.min * 1000 if self.min is not None else None,
+            "max_ms": self.max * 1000,
+            "last_ms": self.last * 1000,
+            "p50_ms": p50 * 1000 if p50 is not None else None,
+            "p99_ms": p99 * 1000 if p99 is not None else None,
+            "recent_ms": [sample * 1000 for sample in recent],
+            "histogram": {bucket_label(index): count for index, count in enumerate(self.histogram)},
+        }
+
+
+class _NullTimer:
+    """What timer() returns while recording is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.profile = None
+
+    def __enter__(self):
+        metrics = self.metrics
+        local = metrics._local
+        depth = getattr(local, "depth", 0)
+        # Only the outermost timed section of a thread is profiled, since
+        # a thread can have one active profiler at a time
+        if metrics.profiling and depth == 0:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                self.profile = profile
+            except ValueError:
+                # From Python 3.12 the profiler is process-wide: a section on
+                # another thread already holds it, so this one is only timed
+                pass
+        local.depth = depth + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        metrics = self.metrics
+        metrics._local.depth -= 1
+        if self.profile is not None:
+            self.profile.disable()
+            with metrics.lock:
+                metrics._profiles.append(self.profile)
+        metrics.record(self.name, seconds)
+        return False
+
+
+class Metrics:
+    """Named timers and counters, safe to update from any thread
+
+    Timing is on by default and costs two clock reads and a short lock
+    per section; turning enabled off makes timer() a shared no-op.
+    While profiling is on, every timed section also runs under cProfile,
+    on whichever thread it runs, and stop_profiling() merges the results.
+    From Python 3.12 only one section at a time can be profiled; sections
+    that start while another thread's is running are timed but not profiled.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+        self.started = time.time()
+        self.profiling = False
+        self.profile_stats = None
+        self._profiles = []
+        self._local = threading.local()
+
+    def timer(self, name):
+        """Context manager that records the time spent in it under name"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                stats = self.timers[name] = TimerStats()
+            stats.add(seconds)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        with self.lock:
+            self.timers = {}
+            self.counters = {}
+            self.started = time.time()
+
+    def start_profiling(self):
+        with self.lock:
+            self._profiles = []
+            self.profile_stats = None
+            self.profiling = True
+
+    def stop_profiling(self):
+        """Stop profiling and merge the captured sections; returns the pstats.Stats or None"""
+        with self.lock:
+            self.profiling = False
+            profiles, self._profiles = self._profiles, []
+        stats = None
+        for profile in profiles:
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        self.profile_stats = stats
+        return stats
+
+    def profile_report(self, limit=30, sort="cumulative"):
+        """The top functions of the last profile as text"""
+        if self.profile_stats is None:
+            return "No profile captured yet."
+        output = io.StringIO()
+        self.profile_stats.stream = output
+        self.profile_stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def snapshot(self):
+        """Timers and counters as plain data"""
+        with self.lock:
+            timers = {name: stats.to_dict() for name, stats in sorted(self.timers.items())}
+            counters = dict(sorted(self.counters.items()))
+        return {
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "dumped": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "timers": timers,
+            "counters": counters,
+        }
+
+    def dump(self, filename):
+        """Write the snapshot as JSON, and the last profile next to it as .prof"""
+        with open(filename, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, indent=2)
+            file.write("\n")
+        if self.profile_stats is not None:
+            profile_filename = os.path.splitext(filename)[0] + ".prof"
+            self.profile_stats.dump_stats(profile_filename)
+            return [filename, profile_filename]
+        return [filename]
+
+
+def timed(name):
+    """Method decorator that times each call under name in self.metrics"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timer(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
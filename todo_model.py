@@ -0,0 +1,281 @@
+"""Compact in-memory task record
+
+A task used to be a dict with nine string keys, its own tags list and
+date strings. Task keeps the same fields in __slots__ instead: the
+priority is a small integer code, dates are integers (yyyymmddHHMMSS and
+yyyymmdd), and each distinct combination of tags is one shared tuple of
+interned strings. Storage still reads and writes plain dicts; from_dict()
+and to_dict() convert at that boundary, and dict(task) works too.
+
+Compare the memory of both representations with:
+
+    python todo_model.py bench --tasks 1000000
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+PRIORITIES = ("High", "Medium", "Low")
+PRIORITY_CODES = {"High": 0, "Medium": 1, "Low": 2}
+
+DATETIME_RE = re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\Z")
+DATE_RE = re.compile(r"\d{4}-\d\d-\d\d\Z")
+
+# Serialized fields in the order to_dict() writes them
+FIELDS = (
+    "id", "title", "description", "priority", "due_date",
+    "tags", "completed", "created_at", "completed_at",
+)
+
+
+def datetime_to_int(value):
+    """"YYYY-MM-DD HH:MM:SS" as an int, 0 for "", None if not in that format"""
+    if value == "":
+        return 0
+    if isinstance(value, str) and DATETIME_RE.match(value):
+        return int(value[0:4] + value[5:7] + value[8:10] + value[11:13] + value[14:16] + value[17:19])
+    return None
+
+
+def int_to_datetime(number):
+    if number == 0:
+        return ""
+    digits = "%014d" % number
+    return f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]} {digits[8:10]}:{digits[10:12]}:{digits[12:14]}"
+
+
+def date_to_int(value):
+    """"YYYY-MM-DD" as an int, 0 for "", None if not in that format"""
+    if value == "":
+        return 0
+    if isinstance(value, str) and DATE_RE.match(value):
+        return int(value[0:4] + value[5:7] + value[8:10])
+    return None
+
+
+def int_to_date(number):
+    if number == 0:
+        return ""
+    digits = "%08d" % number
+    return f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]}"
+
+
+_tag_sets = {}
+
+
+def intern_tags(tags):
+    """One shared tuple per distinct list of tags"""
+    tags = tuple(sys.intern(tag) if isinstance(tag, str) else tag for tag in tags)
+    return _tag_sets.setdefault(tags, tags)
+
+
+class Task:
+    """One task, with the fields of the old task dict as attributes
+
+    Values that do not fit the compact encoding (a date in another format,
+    an unknown priority) are kept as given, and fields this version does
+    not know are kept in extra, so loading and saving a task never loses
+    anything.
+    """
+
+    __slots__ = (
+        "id", "title", "description", "completed",
+        "_priority", "_due", "_tags", "_created", "_completed_at", "extra",
+    )
+
+    def __init__(self, id=None, title="", description="", priority="Medium", due_date="",
+                 tags=(), completed=False, created_at="", completed_at="", **extra):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.completed = completed
+        self.priority = priority
+        self.due_date = due_date
+        self.tags = tags
+        self.created_at = created_at
+        self.completed_at = completed_at
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        task = {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "priority": self.priority,
+            "due_date": self.due_date,
+            "tags": list(self._tags),
+            "completed": self.completed,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+        }
+        if self.extra:
+            task.update(self.extra)
+        return task
+
+    # keys() and [] let dict(task) and the storage backends treat it as a dict
+    def keys(self):
+        return FIELDS + tuple(self.extra or ())
+
+    def __getitem__(self, key):
+        if key == "tags":
+            return list(self._tags)
+        if key in FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def update(self, **fields):
+        """Change fields by name, like dict.update"""
+        for key, value in fields.items():
+            if key in FIELDS:
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def __repr__(self):
+        return f"Task({self.to_dict()!r})"
+
+    @property
+    def priority(self):
+        code = self._priority
+        return PRIORITIES[code] if code.__class__ is int else code
+
+    @priority.setter
+    def priority(self, value):
+        self._priority = PRIORITY_CODES.get(value, value)
+
+    @property
+    def due_date(self):
+        due = self._due
+        return int_to_date(due) if due.__class__ is int else due
+
+    @due_date.setter
+    def due_date(self, value):
+        number = date_to_int(value)
+        self._due = value if number is None else number
+
+    @property
+    def tags(self):
+        return self._tags
+
+    @tags.setter
+    def tags(self, value):
+        self._tags = intern_tags(value)
+
+    @property
+    def created_at(self):
+        created = self._created
+        return int_to_datetime(created) if created.__class__ is int else created
+
+    @created_at.setter
+    def created_at(self, value):
+        number = datetime_to_int(value)
+        self._created = value if number is None else number
+
+    @property
+    def created_stamp(self):
+        """Creation time as the number yyyymmddHHMMSS, for sorting"""
+        created = self._created
+        if created.__class__ is int:
+            return created
+        return int("".join(ch for ch in str(created) if ch.isdigit()) or 0)
+
+    @property
+    def due_stamp(self):
+        """Due date as the number yyyymmdd, 0 if there is none or it is not a date"""
+        due = self._due
+        return due if due.__class__ is int else 0
+
+    @property
+    def completed_at(self):
+        completed_at = self._completed_at
+        return int_to_datetime(completed_at) if completed_at.__class__ is int else completed_at
+
+    @completed_at.setter
+    def completed_at(self, value):
+        number = datetime_to_int(value)
+        self._completed_at = value if number is None else number
+
+
+def peak_rss():
+    """Peak resident memory of this process in KiB, or None if unknown"""
+    # ru_maxrss survives exec on Linux, so it would report the parent's
+    # peak; the high-water mark in /proc belongs to this process only
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(kind, count):
+    """Hold count tasks one way and return (seconds, peak RSS in KiB)"""
+    from todo_bench import generate_tasks
+    start = time.perf_counter()
+    tasks = []
+    for task in generate_tasks(count):
+        # Round-trip through JSON so strings are separate objects, as after a load
+        task = json.loads(json.dumps(task))
+        tasks.append(Task.from_dict(task) if kind == "task" else task)
+    return time.perf_counter() - start, peak_rss()
+
+
+def cmd_measure(args):
+    print(json.dumps(measure(args.kind, args.tasks)))
+
+
+def cmd_bench(args):
+    print(f"{args.tasks} tasks")
+    print(f"{'model':<8}{'seconds':>10}{'peak RSS KiB':>15}")
+    # Each model runs in a fresh process so the peaks do not mix
+    for kind in ("dict", "task"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "measure", kind, "--tasks", str(args.tasks)],
+            stdout=subprocess.PIPE, check=True
+        ).stdout
+        seconds, peak = json.loads(output)
+        print(f"{kind:<8}{seconds:>10.2f}{peak if peak is not None else 'n/a':>15}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Task model memory benchmark")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    bench = commands.add_parser("bench", help="compare peak memory of task dicts and Task records")
+    bench.add_argument("--tasks", type=int, default=1000000, help="tasks to hold (default: %(default)s)")
+    bench.set_defaults(handler=cmd_bench)
+
+    measure_cmd = commands.add_parser("measure", help="hold tasks once and print the cost (used by bench)")
+    measure_cmd.add_argument("kind", choices=["dict", "task"])
+    measure_cmd.add_argument("--tasks", type=int, default=1000000)
+    measure_cmd.set_defaults(handler=cmd_measure)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
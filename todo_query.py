@@ -0,0 +1,413 @@
+"""A small query language for the search box, compiled once per query text
+
+    priority:High tag:Work due<2026-11-01 !completed "report"
+
+Terms are separated by spaces and all of them must match; ! or - in
+front of an operator or a quoted text negates it.
+
+    word or "some words"     title or description contains the text
+    priority:High,Medium     one of the priorities
+    tag:Work,Study           has one of the tags (tag:none: no tags)
+    status:overdue           a status filter ("due today", "next 7 days", ...)
+    is:completed, is:overdue completed tasks, open tasks past their due date
+                             (also !completed and !overdue)
+    due<2026-11-01           due date compared with <, <=, >, >=, : or =;
+                             due:none and due:any test for a due date
+    created>=-30d            creation date, compared the same way
+
+Dates are YYYY-MM-DD, today, tomorrow, yesterday, or days (d) or weeks
+(w) from today such as +7d or -2w. Any other word is text, "-5" and
+"completed" included. A text without any of this syntax, or one that does
+not parse, such as a stray quote, is searched for as a whole, as the
+search box always did.
+
+compile_query() turns a query, together with the status and tag combos,
+into a CompiledQuery, and remembers the last QUERY_CACHE_SIZE of them.
+Its matcher() is one generated function that tests a task against every
+term in a single call, cheapest tests first, and the parts an index can
+answer (the words, a due date range, completed or not) are exposed so
+TaskEngine.query() can start from the index instead of every task.
+"""
+import os
+import re
+import json
+import functools
+from datetime import date, timedelta
+
+from todo_index import PRIORITY_ORDER, DUE_FILTERS, due_range, date_number
+from todo_storage import write_json_atomic
+
+SAVED_QUERIES_FILENAME = "todo_queries.json"
+
+# Compiled queries remembered by their text
+QUERY_CACHE_SIZE = 256
+
+# Saved views offered before the user saves any
+DEFAULT_SAVED_QUERIES = [
+    {"name": "Open High Priority", "query": "priority:High !completed"},
+    {"name": "Work Due This Week", "query": 'tag:Work status:"due this week"'},
+    {"name": "Open for a Month", "query": "!completed created<-30d"},
+]
+
+TOKEN_RE = re.compile(r"""
+    (?P<negated>[!-])?
+    (?:
+        "(?P<phrase>[^"]*)"
+      | (?P<field>[A-Za-z]+)(?P<op><=|>=|<|>|:|=)(?:"(?P<quoted>[^"]*)"|(?P<value>[^\s"]*))
+      | (?P<word>[^\s"]+)
+    )
+    (?=\s|$)
+""", re.VERBOSE)
+
+FIELDS = ("priority", "tag", "status", "due", "created", "is")
+KEYWORDS = ("completed", "overdue")
+
+# Status filter names without case and spaces, so status:next7days works
+STATUS_NAMES = {name.lower().replace(" ", ""): name for name in ["All", "Incomplete", "Completed"] + list(DUE_FILTERS)}
+
+RELATIVE_DATE_RE = re.compile(r"([+-]\d+)([dw])\Z")
+
+COMPARISONS = {"<": "<", "<=": "<=", ">": ">", ">=": ">=", ":": "==", "=": "=="}
+
+
+class QuerySyntaxError(ValueError):
+    """Raised for a query that cannot be compiled"""
+
+
+class Term:
+    """One condition of a query: field op value, or a keyword or text when field is one of those"""
+
+    def __init__(self, field, op=None, value=None, negated=False):
+        self.field = field
+        self.op = op
+        self.value = value
+        self.negated = negated
+
+    def __repr__(self):
+        return f"Term({self.field!r}, {self.op!r}, {self.value!r}, negated={self.negated})"
+
+
+def parse_query(text):
+    """The terms of a query; raises QuerySyntaxError"""
+    terms = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        if text[position].isspace():
+            position += 1
+            continue
+        match = TOKEN_RE.match(text, position)
+        if match is None:
+            raise QuerySyntaxError(f"unbalanced quote in '{text[position:]}'")
+        position = match.end()
+        negated = match.group("negated") is not None
+        field = (match.group("field") or "").lower()
+        if match.group("phrase") is not None:
+            terms.append(Term("text", value=match.group("phrase").lower(), negated=negated))
+        elif field == "is":
+            keyword = (match.group("quoted") or match.group("value") or "").lower()
+            if keyword not in KEYWORDS or match.group("op") not in (":", "="):
+                raise QuerySyntaxError(f"unknown is:{keyword} (is:completed or is:overdue)")
+            terms.append(Term(keyword, negated=negated))
+        elif field in FIELDS:
+            value = match.group("quoted") if match.group("quoted") is not None else match.group("value")
+            terms.append(Term(field, match.group("op"), value, negated))
+        elif negated and match.group("word") and match.group("word").lower() in KEYWORDS:
+            terms.append(Term(match.group("word").lower(), negated=True))
+        else:
+            # Any other word is text as typed, ! or - included, like "-5"
+            # or "re:meeting"; a bare "completed" is searched for too
+            terms.append(Term("text", value=match.group(0).lower()))
+    return terms
+
+
+def resolve_date(text, today):
+    """A query date as a date object, given today as "YYYY-MM-DD" """
+    text = text.lower()
+    day = date(int(today[0:4]), int(today[5:7]), int(today[8:10]))
+    if text == "today":
+        return day
+    if text == "tomorrow":
+        return day + timedelta(days=1)
+    if text == "yesterday":
+        return day - timedelta(days=1)
+    match = RELATIVE_DATE_RE.match(text)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        return day + timedelta(days=count * (7 if unit == "w" else 1))
+    try:
+        return date(int(text[0:4]), int(text[5:7]), int(text[8:10])) if len(text) == 10 else None
+    except ValueError:
+        return None
+
+
+class TagMatches(dict):
+    """Whether a tag tuple has one of names (lowercase), by tuple, filled in on first use
+
+    Tasks share one tuple per distinct list of tags (see intern_tags), so
+    each list is only looked at once and the test is a dict lookup.
+    """
+
+    def __init__(self, names):
+        super().__init__()
+        self.names = names
+
+    def __missing__(self, tags):
+        found = self[tags] = any(tag.lower() in self.names for tag in tags)
+        return found
+
+
+class CompiledQuery:
+    """A parsed query with its matchers and the parts an index can answer
+
+    phrases are the texts every match contains, completed is True or
+    False when all matches are completed or all are open (None if both),
+    and due_bounds() gives the due date range all matches fall in.
+    plain is True when the query text is an ordinary search, so only the
+    status and tag combos filter and indexed storage may answer them.
+    """
+
+    def __init__(self, text, terms, plain):
+        self.text = text
+        self.terms = terms
+        self.plain = plain
+        self.phrases = [term.value for term in terms if term.field == "text" and not term.negated and term.value]
+        self.completed = None
+        for term in terms:
+            if term.negated:
+                if term.field == "completed":
+                    self.completed = False
+            elif term.field == "completed":
+                self.completed = True
+            elif term.field == "overdue" or (term.field == "status" and term.value not in ("All", "Completed")):
+                self.completed = False
+            elif term.field == "status" and term.value == "Completed":
+                self.completed = True
+        self._matchers = {}
+        self.check(terms)
+
+    @staticmethod
+    def check(terms):
+        """Raise QuerySyntaxError for values that do not parse"""
+        for term in terms:
+            if term.field not in ("due", "created"):
+                continue
+            if term.value.lower() in ("none", "any"):
+                if term.op not in (":", "="):
+                    raise QuerySyntaxError(f"{term.field}{term.op}{term.value} compares with no date")
+            elif resolve_date(term.value, "2000-01-01") is None:
+                raise QuerySyntaxError(f"'{term.value}' is not a date (YYYY-MM-DD, today or +7d)")
+
+    @property
+    def archived(self):
+        """Whether archived tasks can match, since all matches are completed"""
+        return self.completed is True
+
+    def due_bounds(self, today):
+        """(first, last) due dates ("YYYY-MM-DD", None if open) every match falls in, or None"""
+        first = last = None
+        bounded = False
+        for term in self.terms:
+            if term.negated:
+                continue
+            if term.field == "overdue":
+                low, high = due_range("Overdue", today)
+            elif term.field == "status" and term.value in DUE_FILTERS:
+                low, high = due_range(term.value, today)
+            elif term.field == "due" and term.value.lower() not in ("none", "any"):
+                day = resolve_date(term.value, today)
+                op = term.op
+                low = day + timedelta(days=1) if op == ">" else day if op in (">=", ":", "=") else None
+                high = day - timedelta(days=1) if op == "<" else day if op in ("<=", ":", "=") else None
+                low = low and low.isoformat()
+                high = high and high.isoformat()
+            else:
+                continue
+            bounded = True
+            first = low if first is None or (low is not None and low > first) else first
+            last = high if last is None or (high is not None and high < last) else last
+        return (first, last) if bounded else None
+
+    def matcher(self, today, indexed=False):
+        """A function task -> bool testing every term, or None if there are none
+
+        With indexed=True the phrases are left out, for tasks the search
+        index already picked.
+        """
+        return self._compiled(today, indexed)[0]
+
+    def selector(self, today, indexed=False):
+        """A function (tasks, ids=None) -> the tasks passing every term, and in ids if given
+
+        The terms are inlined into one list comprehension, so a view
+        costs one pass over the tasks without a function call per task.
+        None if there are no terms.
+        """
+        return self._compiled(today, indexed)[1]
+
+    def _compiled(self, today, indexed):
+        key = (today, indexed)
+        compiled = self._matchers.get(key)
+        if compiled is None:
+            compiled = self._matchers[key] = self._build(today, indexed)
+        return compiled
+
+    def _build(self, today, indexed):
+        constants = {}
+
+        def constant(value):
+            name = f"c{len(constants)}"
+            constants[name] = value
+            return name
+
+        today_number = date_number(today)
+        tests = []
+        text_tests = []
+        for term in self.terms:
+            field, value = term.field, term.value
+            if field == "text":
+                if not value or (indexed and not term.negated):
+                    continue
+                text = "(task.title + '\\n' + (task.description or '')).lower()"
+                text_tests.append(("not " if term.negated else "") + f"{constant(value)} in {text}")
+                continue
+            if field == "completed":
+                test = "task.completed"
+            elif field == "overdue":
+                test = f"(not task.completed and 0 < task.due_stamp < {today_number})"
+            elif field == "priority":
+                test = f"task.priority in {constant(frozenset(value))}"
+            elif field == "tag":
+                test = "not task.tags" if value is None else f"{constant(TagMatches(value))}[task.tags]"
+            elif field == "status":
+                if value == "All":
+                    continue
+                if value == "Incomplete":
+                    test = "not task.completed"
+                elif value == "Completed":
+                    test = "task.completed"
+                else:
+                    low, high = due_range(value, today)
+                    test = (f"(not task.completed and {date_number(low) if low else 1} <= task.due_stamp"
+                            f"{' <= ' + str(date_number(high)) if high else ''})")
+            else:
+                stamp = "task.due_stamp" if field == "due" else "task.created_stamp // 1000000"
+                if value.lower() == "none":
+                    test = f"not {stamp}"
+                elif value.lower() == "any":
+                    test = f"{stamp} > 0"
+                else:
+                    number = date_number(resolve_date(value, today).isoformat())
+                    op = COMPARISONS[term.op]
+                    # A missing date is never before anything
+                    test = f"(0 < {stamp} {op} {number})" if op in ("<", "<=") else f"({stamp} {op} {number})"
+            tests.append(f"not {test}" if term.negated else test)
+        if not tests and not text_tests:
+            return None, None
+        # The text is only built for tasks that pass the cheaper tests
+        condition = " and ".join(tests + text_tests)
+        source = (
+            f"def match(task):\n"
+            f"    return bool({condition})\n"
+            f"def select(tasks, ids=None):\n"
+            f"    if ids is None:\n"
+            f"        return [task for task in tasks if {condition}]\n"
+            f"    return [task for task in tasks if task.id in ids and {condition}]\n"
+        )
+        exec(compile(source, f"<query {self.text!r}>", "exec"), constants)
+        return constants["match"], constants["select"]
+
+
+def _resolve_terms(terms):
+    """Canonical values for priorities, tags and statuses; raises QuerySyntaxError"""
+    for term in terms:
+        if term.field == "priority":
+            priorities = {name.lower(): name for name in PRIORITY_ORDER}
+            values = set()
+            for value in term.value.split(","):
+                if value.lower() not in priorities:
+                    raise QuerySyntaxError(f"unknown priority '{value}' (High, Medium or Low)")
+                values.add(priorities[value.lower()])
+            term.value = values
+        elif term.field == "tag":
+            values = {value.lower() for value in term.value.split(",") if value}
+            if not values:
+                raise QuerySyntaxError("tag: needs a tag name")
+            term.value = None if values == {"none"} else values
+        elif term.field == "status":
+            name = STATUS_NAMES.get(term.value.lower().replace(" ", ""))
+            if name is None:
+                raise QuerySyntaxError(f"unknown status '{term.value}'")
+            term.value = name
+    return terms
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_query(text="", status="All", tag="All", strict=False):
+    """The CompiledQuery of a search box text and the status and tag combos
+
+    A text that does not parse is searched for as a whole, or raises
+    QuerySyntaxError if strict. Results are cached, so the same query
+    typed or refreshed again is not parsed again.
+    """
+    text = text.strip()
+    filters = []
+    if status != "All":
+        filters.append(Term("status", value=status))
+    if tag != "All":
+        filters.append(Term("tag", value=tag))
+    try:
+        terms = parse_query(text)
+        plain = '"' not in text and all(term.field == "text" for term in terms)
+        if not plain:
+            return CompiledQuery(text, _resolve_terms(terms + filters), plain)
+    except QuerySyntaxError:
+        if strict:
+            raise
+    # An ordinary search: the whole text, spaces included, as before
+    terms = [Term("text", value=text.lower())] if text else []
+    return CompiledQuery(text, _resolve_terms(terms + filters), True)
+
+
+class SavedQueries:
+    """Named queries shown as views in the View menu, kept in todo_queries.json"""
+
+    def __init__(self, directory="."):
+        self.filename = os.path.join(directory, SAVED_QUERIES_FILENAME)
+        self.queries = [dict(entry) for entry in DEFAULT_SAVED_QUERIES]
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, "r", encoding="utf-8") as file:
+                    self.queries = json.load(file)["queries"]
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+    def names(self):
+        return [entry["name"] for entry in self.queries]
+
+    def get(self, name):
+        for entry in self.queries:
+            if entry["name"] == name:
+                return entry["query"]
+        raise KeyError(f"no saved view named '{name}'")
+
+    def save(self, name, query):
+        """Add or replace a saved query; raises QuerySyntaxError if it does not compile"""
+        name = name.strip()
+        if not name:
+            raise ValueError("the view name is empty")
+        compile_query(query, strict=True)
+        for entry in self.queries:
+            if entry["name"] == name:
+                entry["query"] = query
+                break
+        else:
+            self.queries.append({"name": name, "query": query})
+        self._write()
+
+    def delete(self, name):
+        self.queries = [entry for entry in self.queries if entry["name"] != name]
+        self._write()
+
+    def _write(self):
+        write_json_atomic(self.filename, {"queries": self.queries})
@@ -0,0 +1,51 @@
+class TaskRepository:
+    """Tasks keyed by id, kept in insertion order
+
+    Lookups and deletes by id are O(1), and new ids come from a counter
+    instead of a max() over every task. Iterating yields the tasks in
+    the order they were added, like the old list.
+    """
+
+    def __init__(self, tasks=()):
+        self._tasks = {}
+        self._next_id = 1
+        for task in tasks:
+            self.add(task)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __iter__(self):
+        return iter(self._tasks.values())
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def get(self, task_id):
+        return self._tasks.get(task_id)
+
+    def next_id(self):
+        """Reserve the next unused id"""
+        task_id = self._next_id
+        self._next_id += 1
+        return task_id
+
+    def peek_id(self):
+        """The id next_id() would hand out, without reserving it"""
+        return self._next_id
+
+    def skip_ids(self, last_id):
+        """Never hand out ids up to last_id, e.g. those of archived tasks"""
+        self._next_id = max(self._next_id, last_id + 1)
+
+    def add(self, task):
+        """Add a task, assigning an id if it has none"""
+        if task.id is None:
+            task.id = self.next_id()
+        self._tasks[task.id] = task
+        self._next_id = max(self._next_id, task.id + 1)
+        return task
+
+    def remove(self, task_id):
+        """Remove and return a task, or None if there is no such id"""
+        return self._tasks.pop(task_id, None)
@@ -0,0 +1,524 @@
+"""Compact binary snapshot of the task list
+
+An alternative to the pretty-printed todo_data.json for large lists. The
+file is columnar: fixed-width little-endian columns for the id, flags,
+priority and dates of every task, followed by an interned string table
+holding titles, descriptions and tags. SnapshotReader maps the file with
+mmap and only builds a task dict when that task is asked for.
+
+Layout (every section starts on an 8 byte boundary):
+
+    header       magic, version, task count, tag ref count, string count
+    int64        id, created_at, completed_at   (yyyymmddHHMMSS, 0 if empty)
+    uint32       due_date                       (yyyymmdd, 0 if empty)
+    uint32       title, description, extra      (string index)
+    uint32       tags start, count + 1 entries  (into the tag refs)
+    uint8        flags (bit 0: completed), priority (0 High .. 2 Low)
+    uint32       tag refs                       (string index)
+    uint64       string offsets, count + 1 entries
+    bytes        UTF-8 string data
+
+Values that do not fit a column (a date in another format, an unknown
+priority, fields added by hand) are kept in the task's "extra" string as
+JSON, so converting JSON -> snapshot -> JSON gives back the same tasks.
+
+Convert and compare with:
+
+    python todo_snapshot.py to-binary todo_data.json todo_data.snap
+    python todo_snapshot.py to-json todo_data.snap todo_data.json
+    python todo_snapshot.py bench todo_data.json
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import array
+import struct
+import argparse
+import subprocess
+
+from todo_storage import (
+    JournalStorage, apply_task_defaults, write_json_atomic, fsync_directory,
+    COMPACT_AFTER, LOAD_BATCH_SIZE
+)
+from todo_model import (
+    PRIORITIES, PRIORITY_CODES, datetime_to_int, int_to_datetime, date_to_int, int_to_date, peak_rss
+)
+
+MAGIC = b"TODOSNP1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIII")
+
+# Extra column value of a task without extra fields
+NO_STRING = 0xFFFFFFFF
+
+# Fields with a column of their own, in the order tasks are rebuilt
+COLUMN_FIELDS = (
+    "id", "title", "description", "priority", "due_date",
+    "tags", "completed", "created_at", "completed_at",
+)
+
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _pad(offset):
+    return (offset + 7) & ~7
+
+
+def _tags_fit(tags):
+    return isinstance(tags, list) and all(isinstance(tag, str) for tag in tags)
+
+
+def write_snapshot(filename, tasks):
+    """Write tasks to a binary snapshot, atomically like write_json_atomic"""
+    strings = {}
+
+    def intern(text):
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    ids = array.array("q")
+    created = array.array("q")
+    completed_at = array.array("q")
+    due = array.array("I")
+    titles = array.array("I")
+    descriptions = array.array("I")
+    extras = array.array("I")
+    tags_start = array.array("I", [0])
+    flags = array.array("B")
+    priorities = array.array("B")
+    tag_refs = array.array("I")
+
+    for task in tasks:
+        extra = {key: value for key, value in task.items() if key not in COLUMN_FIELDS}
+        ids.append(task["id"])
+
+        title = task.get("title", "")
+        if not isinstance(title, str):
+            extra["title"], title = title, ""
+        titles.append(intern(title))
+
+        description = task.get("description", "")
+        if not isinstance(description, str):
+            extra["description"], description = description, ""
+        descriptions.append(intern(description))
+
+        priority = PRIORITY_CODES.get(task.get("priority", "Medium"))
+        if priority is None:
+            extra["priority"], priority = task["priority"], 1
+        priorities.append(priority)
+
+        completed = task.get("completed", False)
+        if not isinstance(completed, bool):
+            extra["completed"] = completed
+        flags.append(1 if completed is True else 0)
+
+        tags = task.get("tags", [])
+        if not _tags_fit(tags):
+            extra["tags"], tags = tags, []
+        for tag in tags:
+            tag_refs.append(intern(tag))
+        tags_start.append(len(tag_refs))
+
+        # Dates in another format keep the column empty and go to extra
+        for key, column in (("created_at", created), ("completed_at", completed_at)):
+            number = datetime_to_int(task.get(key, ""))
+            if number is None:
+                extra[key], number = task[key], 0
+            column.append(number)
+
+        number = date_to_int(task.get("due_date", ""))
+        if number is None:
+            extra["due_date"], number = task["due_date"], 0
+        due.append(number)
+
+        # Record fields an older version left out, so they stay missing
+        missing = [key for key in COLUMN_FIELDS[1:] if key not in task]
+        if extra or missing:
+            extras.append(intern(json.dumps([extra, missing], ensure_ascii=False)))
+        else:
+            extras.append(NO_STRING)
+
+    blob = bytearray()
+    offsets = array.array("Q", [0])
+    for text in strings:
+        blob += text.encode("utf-8")
+        offsets.append(len(blob))
+
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(ids), len(tag_refs), len(strings)))
+        for column in (ids, created, completed_at, due, titles, descriptions, extras,
+                       tags_start, flags, priorities, tag_refs, offsets):
+            if not LITTLE_ENDIAN:
+                column = array.array(column.typecode, column)
+                column.byteswap()
+            file.write(column.tobytes())
+            file.write(b"\0" * (_pad(file.tell()) - file.tell()))
+        file.write(blob)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_filename, filename)
+    fsync_directory(filename)
+
+
+# " HH:MM:" for every HHMM, and "SS" for every SS, for SnapshotReader.tasks
+_CLOCK = [f" {number // 100:02d}:{number % 100:02d}:" for number in range(10000)]
+_TWO_DIGITS = [f"{number:02d}" for number in range(100)]
+
+
+class SnapshotReader:
+    """Memory-mapped view of a binary snapshot
+
+    Opening only reads the header and maps the columns; task(i) decodes a
+    single task, so a caller can page through a large file while only the
+    pages it touches are read from disk.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._views = []
+        self._tags = {}
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{filename} is not a task snapshot")
+        try:
+            self._open_columns()
+        except (ValueError, TypeError, struct.error):
+            self.close()
+            raise ValueError(f"{filename} is not a task snapshot")
+
+    def _open_columns(self):
+        data = memoryview(self._map)
+        self._views.append(data)
+        magic, version, count, tag_ref_count, string_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("bad header")
+        self._offset = HEADER.size
+        self._data = data
+        self.count = count
+        self.ids = self._column("q", count)
+        self._created = self._column("q", count)
+        self._completed_at = self._column("q", count)
+        self._due = self._column("I", count)
+        self._titles = self._column("I", count)
+        self._descriptions = self._column("I", count)
+        self._extras = self._column("I", count)
+        self._tags_start = self._column("I", count + 1)
+        self._flags = self._column("B", count)
+        self._priorities = self._column("B", count)
+        self._tag_refs = self._column("I", tag_ref_count)
+        self._string_offsets = self._column("Q", string_count + 1)
+        self._blob = data[self._offset:]
+        self._views.append(self._blob)
+        if len(self._blob) != self._string_offsets[string_count]:
+            raise ValueError("truncated string table")
+
+    def _column(self, typecode, count):
+        start = self._offset
+        end = start + count * struct.calcsize(typecode)
+        if end > len(self._data):
+            raise ValueError("truncated column")
+        self._offset = _pad(end)
+        raw = self._data[start:end]
+        if LITTLE_ENDIAN:
+            column = raw.cast(typecode)
+            self._views.extend((raw, column))
+            return column
+        # Big-endian hosts read a swapped copy instead of the mapping
+        column = array.array(typecode, raw.tobytes())
+        column.byteswap()
+        raw.release()
+        return column
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.task(index)
+
+    def string(self, index):
+        offsets = self._string_offsets
+        return str(self._blob[offsets[index]:offsets[index + 1]], "utf-8")
+
+    def _tag(self, index):
+        # Tags repeat across tasks, so decode each one once
+        tag = self._tags.get(index)
+        if tag is None:
+            tag = self._tags[index] = self.string(index)
+        return tag
+
+    def task(self, index):
+        """Build the task dict at position index"""
+        task = {
+            "id": self.ids[index],
+            "title": self.string(self._titles[index]),
+            "description": self.string(self._descriptions[index]),
+            "priority": PRIORITIES[self._priorities[index]],
+            "due_date": int_to_date(self._due[index]),
+            "tags": [self._tag(self._tag_refs[ref])
+                     for ref in range(self._tags_start[index], self._tags_start[index + 1])],
+            "completed": bool(self._flags[index] & 1),
+            "created_at": int_to_datetime(self._created[index]),
+            "completed_at": int_to_datetime(self._completed_at[index]),
+        }
+        extra_index = self._extras[index]
+        if extra_index != NO_STRING:
+            extra, missing = json.loads(self.string(extra_index))
+            for key in missing:
+                del task[key]
+            task.update(extra)
+        return task
+
+    def strings(self):
+        """Every string of the string table, decoded once"""
+        offsets = self._string_offsets
+        data = bytes(self._blob)
+        text = data.decode("utf-8")
+        if len(text) == len(data):
+            # ASCII only: byte offsets are character offsets, so slice the text
+            return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+        return [str(data[start:end], "utf-8") for start, end in zip(offsets, offsets[1:])]
+
+    def tasks(self):
+        """Every task dict, decoded a column at a time
+
+        Faster than iterating for a full load: strings are decoded once,
+        each distinct date is formatted once, and the dicts are built in
+        a single pass over the columns.
+        """
+        strings = self.strings()
+        tag_refs = [strings[ref] for ref in self._tag_refs]
+        starts = self._tags_start
+        # Each distinct day is formatted once; times are put together from tables
+        numbers = set(self._due)
+        numbers.update(number // 1000000 for number in self._created)
+        numbers.update(number // 1000000 for number in self._completed_at)
+        days = {number: int_to_date(number) for number in numbers}
+
+        def datetimes(column):
+            return [
+                days[number // 1000000] + _CLOCK[number // 100 % 10000] + _TWO_DIGITS[number % 100] if number else ""
+                for number in column
+            ]
+
+        due = [days[number] for number in self._due]
+        created = datetimes(self._created)
+        completed_at = datetimes(self._completed_at)
+        tasks = [
+            {
+                "id": task_id,
+                "title": strings[title],
+                "description": strings[description],
+                "priority": PRIORITIES[priority],
+                "due_date": due_date,
+                "tags": tag_refs[starts[index]:starts[index + 1]],
+                "completed": bool(flags & 1),
+                "created_at": created_text,
+                "completed_at": completed_text,
+            }
+            for index, (task_id, title, description, priority, due_date, flags, created_text, completed_text)
+            in enumerate(zip(self.ids, self._titles, self._descriptions, self._priorities, due,
+                             self._flags, created, completed_at))
+        ]
+        for index, extra_index in enumerate(self._extras):
+            if extra_index != NO_STRING:
+                task = tasks[index]
+                extra, missing = json.loads(strings[extra_index])
+                for key in missing:
+                    del task[key]
+                task.update(extra)
+        return tasks
+
+    def iter_batches(self, batch_size=LOAD_BATCH_SIZE):
+        for start in range(0, self.count, batch_size):
+            yield [self.task(index) for index in range(start, min(start + batch_size, self.count))]
+
+    def close(self):
+        # Exported buffers must be released before the mapping can close
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class BinaryJournalStorage(JournalStorage):
+    """The journal backend over a binary snapshot instead of JSON
+
+    The first time it is opened without a snapshot, the tasks of
+    json_filename (and its journal) are imported; the JSON file is left as
+    it was.
+    """
+
+    def __init__(self, filename, json_filename=None, compact_after=COMPACT_AFTER):
+        super().__init__(filename, compact_after)
+        self.json_filename = json_filename
+
+    def _load_snapshot(self):
+        self._migrate()
+        if not os.path.exists(self.filename):
+            return []
+        try:
+            with SnapshotReader(self.filename) as reader:
+                return [apply_task_defaults(task) for task in reader.tasks()]
+        except (OSError, ValueError):
+            return []
+
+    def _iter_snapshot(self, batch_size):
+        self._migrate()
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with SnapshotReader(self.filename) as reader:
+                for batch in reader.iter_batches(batch_size):
+                    yield [apply_task_defaults(task) for task in batch], []
+        except (OSError, ValueError):
+            # Keep what was read before the damaged part
+            pass
+
+    def _write_snapshot(self, tasks):
+        write_snapshot(self.filename, tasks)
+
+    def _migrate(self):
+        """Import todo_data.json the first time the snapshot is opened"""
+        if os.path.exists(self.filename) or not self.json_filename:
+            return
+        if not os.path.exists(self.json_filename):
+            return
+        # Read only, so no journal or lock file is left next to the JSON file
+        tasks = JournalStorage(self.json_filename).read()
+        write_snapshot(self.filename, tasks)
+
+
+def json_to_snapshot(json_filename, snapshot_filename):
+    """Convert todo_data.json, including its journal, to a binary snapshot"""
+    tasks = JournalStorage(json_filename).read()
+    write_snapshot(snapshot_filename, tasks)
+    return len(tasks)
+
+
+def snapshot_to_json(snapshot_filename, json_filename):
+    """Convert a binary snapshot, including its journal, to todo_data.json"""
+    tasks = BinaryJournalStorage(snapshot_filename).read()
+    write_json_atomic(json_filename, tasks)
+    return len(tasks)
+
+
+def measure(kind, filename):
+    """Load a file one way and return (seconds, peak RSS in KiB or None)"""
+    start = time.perf_counter()
+    if kind == "json":
+        with open(filename, "r", encoding="utf-8") as file:
+            tasks = json.load(file)
+        count = len(tasks)
+    elif kind == "snapshot-open":
+        reader = SnapshotReader(filename)
+        # What the first paint needs: the count and one batch of tasks
+        count = len(reader)
+        first = next(reader.iter_batches(), [])
+    elif kind == "snapshot-all":
+        with SnapshotReader(filename) as reader:
+            tasks = reader.tasks()
+        count = len(tasks)
+    else:
+        count = 0
+    seconds = time.perf_counter() - start
+    return count, seconds, peak_rss()
+
+
+def cmd_to_binary(args):
+    count = json_to_snapshot(args.source, args.target)
+    print(f"Wrote {count} tasks to {args.target}")
+
+
+def cmd_to_json(args):
+    count = snapshot_to_json(args.source, args.target)
+    print(f"Wrote {count} tasks to {args.target}")
+
+
+def cmd_measure(args):
+    print(json.dumps(measure(args.kind, args.filename)))
+
+
+def cmd_bench(args):
+    json_filename = args.filename
+    if not json_filename:
+        from todo_bench import generate_tasks
+        json_filename = "bench_tasks.json"
+        write_json_atomic(json_filename, list(generate_tasks(args.tasks)))
+    snapshot_filename = os.path.splitext(json_filename)[0] + ".bench.snap"
+    json_to_snapshot(json_filename, snapshot_filename)
+
+    print(f"JSON     {os.path.getsize(json_filename):>12,} bytes")
+    print(f"Snapshot {os.path.getsize(snapshot_filename):>12,} bytes")
+    print(f"{'loader':<15}{'tasks':>9}{'best s':>10}{'peak RSS KiB':>15}")
+    # Every run is a fresh process so peak RSS belongs to that loader alone
+    for kind, filename in (("baseline", json_filename), ("json", json_filename),
+                           ("snapshot-open", snapshot_filename), ("snapshot-all", snapshot_filename)):
+        runs = []
+        for _ in range(args.repeat):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "measure", kind, filename],
+                stdout=subprocess.PIPE, check=True
+            ).stdout
+            runs.append(json.loads(output))
+        count = runs[0][0]
+        seconds = min(run[1] for run in runs)
+        peak = max(run[2] for run in runs) if runs[0][2] is not None else "n/a"
+        print(f"{kind:<15}{count:>9}{seconds:>10.4f}{peak:>15}")
+    os.remove(snapshot_filename)
+    if not args.filename:
+        os.remove(json_filename)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Binary task snapshot tools")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    to_binary = commands.add_parser("to-binary", help="convert a JSON task file to a snapshot")
+    to_binary.add_argument("source")
+    to_binary.add_argument("target")
+    to_binary.set_defaults(handler=cmd_to_binary)
+
+    to_json = commands.add_parser("to-json", help="convert a snapshot to a JSON task file")
+    to_json.add_argument("source")
+    to_json.add_argument("target")
+    to_json.set_defaults(handler=cmd_to_json)
+
+    bench = commands.add_parser("bench", help="compare load time and memory of JSON and snapshots")
+    bench.add_argument("filename", nargs="?", help="JSON task file (default: generate one)")
+    bench.add_argument("--tasks", type=int, default=100000, help="tasks to generate (default: %(default)s)")
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.set_defaults(handler=cmd_bench)
+
+    measure_cmd = commands.add_parser("measure", help="load a file once and print the cost (used by bench)")
+    measure_cmd.add_argument("kind", choices=["baseline", "json", "snapshot-open", "snapshot-all"])
+    measure_cmd.add_argument("filename")
+    measure_cmd.set_defaults(handler=cmd_measure)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1070 @@
+import os
+import re
+import json
+import time
+import threading
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+from todo_index import DUE_FILTERS, due_range
+
+# Number of journal records after which a background compaction is started
+COMPACT_AFTER = 1000
+
+# Seconds a burst of changes is collected before write-behind flushes it
+WRITE_BEHIND_DELAY = 0.5
+
+# Tasks handed over per batch by the streaming loader
+LOAD_BATCH_SIZE = 500
+
+# Entries of the SQLite change log kept for other processes to catch up with
+CHANGE_LOG_SIZE = 10000
+
+# Fields added in later versions, backfilled into tasks saved by older ones
+TASK_DEFAULTS = {
+    "priority": "Medium",
+    "due_date": "",
+    "tags": [],
+    "completed_at": "",
+}
+
+
+def apply_task_defaults(task):
+    """Fill in the fields missing from a task saved by an older version"""
+    for key, value in TASK_DEFAULTS.items():
+        if key not in task:
+            task[key] = list(value) if isinstance(value, list) else value
+    return task
+
+
+def write_json_atomic(filename, data):
+    """Write JSON to a temporary file and rename it over the target"""
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=4, ensure_ascii=False)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_filename, filename)
+    fsync_directory(filename)
+
+
+def fsync_directory(filename):
+    """Make a rename durable by syncing the directory entry (POSIX only)"""
+    if os.name != 'posix':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+WHITESPACE_RE = re.compile(r"\s*")
+
+
+def iter_json_array(file, chunk_size=1 << 16):
+    """Yield the elements of a top-level JSON array while reading it in chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
+    after_value = False
+    while True:
+        pos = WHITESPACE_RE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        char = buffer[pos]
+        if not started:
+            if char != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+        elif char == "]":
+            return
+        elif char == "," and after_value:
+            after_value = False
+            pos += 1
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                end = None
+                if eof:
+                    raise
+            if end is None or (end == len(buffer) and not eof):
+                # The element may continue in the next chunk (e.g. a number)
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield value
+            pos = end
+            after_value = True
+
+
+def replay_journal(tasks, records):
+    """Apply journal records on top of a list of tasks"""
+    by_id = {task["id"]: task for task in tasks}
+    for record in records:
+        if record["op"] == "put":
+            task = apply_task_defaults(record["task"])
+            by_id[task["id"]] = task
+        elif record["op"] == "delete":
+            by_id.pop(record["id"], None)
+    return list(by_id.values())
+
+
+def apply_changes(tasks, changes):
+    """Apply a dict of task id -> task dict, or None if deleted, on top of a list of tasks"""
+    return replay_journal(tasks, [
+        {"op": "put", "task": task} if task is not None else {"op": "delete", "id": task_id}
+        for task_id, task in changes.items()
+    ])
+
+
+def diff_tasks(stored, tasks):
+    """The changes that turn tasks into the stored list, as for apply()"""
+    stored = {task["id"]: task for task in stored}
+    changes = {}
+    for task in tasks:
+        task = dict(task)
+        data = stored.pop(task["id"], None)
+        if data is None:
+            changes[task["id"]] = None
+        elif data != task:
+            changes[task["id"]] = data
+    changes.update(stored)
+    return changes
+
+
+def file_signature(filename):
+    """Identity, size and modification time of a file, None if it does not exist"""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _lock_file(file):
+    if os.name == 'nt':
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after ten seconds; keep waiting
+                continue
+    fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_file(file):
+    if os.name == 'nt':
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class StoreLock:
+    """Exclusive lock on a store, shared with other threads and other processes
+
+    Other processes are kept out with an OS lock on a .lock file next to
+    the store, other threads with an RLock, so it can be taken again by
+    the thread holding it. The lock file also holds the next free task id,
+    so two processes adding tasks never hand out the same id.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                if self._file is None:
+                    self._file = open(self.filename, 'a+b')
+                _lock_file(self._file)
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            _unlock_file(self._file)
+        self._lock.release()
+        return False
+
+    def reserve_ids(self, count, lowest=1):
+        """Reserve count consecutive ids, none below lowest; returns the first"""
+        with self:
+            self._file.seek(0)
+            try:
+                next_id = int(self._file.read() or 1)
+            except ValueError:
+                next_id = 1
+            first = max(next_id, lowest)
+            # The file is opened for appending, so truncate first
+            self._file.truncate(0)
+            self._file.write(str(first + count).encode('ascii'))
+            self._file.flush()
+        return first
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and self._depth == 0:
+                self._file.close()
+                self._file = None
+
+
+class JsonStorage:
+    """Keep all tasks in one JSON file that is rewritten on every change
+
+    Every backend is safe to share between processes: writes hold a
+    StoreLock, and read_changes() hands over what other processes changed
+    since this one last read or wrote the store. Changes of other
+    processes noticed while writing are kept, never overwritten, except
+    for tasks this process changed too; those are reported as conflicts.
+    """
+
+    # Whether apply() needs the full task list rather than just the changes
+    needs_full_tasks = True
+    # Whether query_ids() answers filters itself
+    indexed_queries = False
+    # Whether old completed tasks may be moved to a local archive
+    supports_archive = True
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file_lock = StoreLock(filename + ".lock")
+        # Changes of other processes seen but not yet taken by read_changes()
+        self._external = {}
+        self._conflicts = {}
+        self._signature = None
+        # Only a store that was read has changes of others to keep
+        self._loaded = False
+        # Set when the changes of others are only known by comparing everything
+        self._stale = False
+
+    def load(self):
+        self._loaded = True
+        self._signature = file_signature(self.filename)
+        if self._signature is None:
+            return []
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as file:
+                tasks = json.load(file)
+        except (OSError, ValueError):
+            return []
+        for task in tasks:
+            apply_task_defaults(task)
+        return tasks
+
+    def iter_load(self, batch_size=LOAD_BATCH_SIZE):
+        """Stream the tasks in batches of (tasks, deleted ids)
+
+        Defaults are backfilled per task as it is parsed, so the caller can
+        show the first batch before the rest of the file has been read.
+        """
+        self._loaded = True
+        # Taken before reading, so a rewrite during the load is noticed later
+        self._signature = file_signature(self.filename)
+        if self._signature is None:
+            return
+        batch = []
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as file:
+                for task in iter_json_array(file):
+                    batch.append(apply_task_defaults(task))
+                    if len(batch) >= batch_size:
+                        yield batch, []
+                        batch = []
+        except (OSError, ValueError):
+            # Keep what was read before the damaged part
+            pass
+        if batch:
+            yield batch, []
+
+    def save(self, tasks):
+        self.apply({}, tasks)
+
+    def put(self, task, tasks):
+        """Record that a task was added or changed"""
+        self.apply({task["id"]: task}, tasks)
+
+    def delete(self, task_id, tasks):
+        """Record that a task was deleted"""
+        self.apply({task_id: None}, tasks)
+
+    def apply(self, changes, tasks):
+        """Persist a batch of changes, a dict of task id -> task or None if deleted"""
+        with self.file_lock:
+            # dict() also accepts the in-memory Task records
+            tasks = [dict(task) for task in tasks]
+            if self._loaded and file_signature(self.filename) != self._signature:
+                # Another process rewrote the file; keep its other changes
+                external = diff_tasks(self.load(), tasks)
+                self._note_external({
+                    task_id: task for task_id, task in external.items() if task_id not in changes
+                })
+            self._note_written(changes)
+            if self._external:
+                tasks = apply_changes(tasks, self._external)
+            write_json_atomic(self.filename, tasks)
+            self._signature = file_signature(self.filename)
+
+    def read_changes(self, tasks):
+        """Take the changes other processes made to the store
+
+        Returns (changes, conflicts). changes is a dict like apply() takes
+        that brings tasks up to date; conflicts maps the ids this process
+        wrote over a change of another process to that other version (None
+        if it was deleted). tasks must not hold changes still to be written.
+        """
+        with self.file_lock:
+            self._catch_up()
+            if self._stale:
+                self._resync(tasks)
+            return self._take_changes()
+
+    def reserve_ids(self, count, lowest=1):
+        """Reserve count consecutive task ids no process sharing the store has used"""
+        return self.file_lock.reserve_ids(count, lowest)
+
+    def close(self):
+        self.file_lock.close()
+
+    def query_ids(self, status="All", tag="All", sort="Creation Time", today=""):
+        """Return matching ids in display order, or None to filter in memory"""
+        return None
+
+    def _catch_up(self):
+        """Note what other processes changed since the last read (hold file_lock)"""
+        if file_signature(self.filename) != self._signature:
+            self._stale = True
+
+    def _resync(self, tasks):
+        """Compare the whole store with tasks to find the changes of others (hold file_lock)"""
+        self._external = diff_tasks(self.load(), tasks)
+        self._stale = False
+
+    def _note_external(self, changes):
+        self._external.update(changes)
+
+    def _note_written(self, changes):
+        """Changes of other processes to tasks about to be overwritten become conflicts"""
+        for task_id, task in changes.items():
+            if task_id in self._external:
+                theirs = self._external.pop(task_id)
+                if task is not None or theirs is not None:
+                    self._conflicts[task_id] = theirs
+
+    def _take_changes(self):
+        changes, conflicts = self._external, self._conflicts
+        self._external, self._conflicts = {}, {}
+        return changes, conflicts
+
+
+class JournalStorage(JsonStorage):
+    """Append every change to a journal next to the JSON snapshot
+
+    Each change costs one appended line. Once the journal grows past
+    compact_after records it is folded into the snapshot on a background
+    thread. The snapshot keeps the plain todo_data.json format, and journal
+    records are idempotent, so replaying them twice is harmless.
+
+    Other processes are followed by the journal offset read so far: what
+    they appended after it is exactly what they changed. When one of them
+    folded the journal into a new snapshot in the meantime, the next
+    read_changes() compares the whole store with the caller's tasks.
+    """
+
+    needs_full_tasks = False
+
+    def __init__(self, filename, compact_after=COMPACT_AFTER):
+        super().__init__(filename)
+        self.journal_filename = filename + ".journal"
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._journal = None
+        self._records = 0
+        self._compactor = None
+        # (device, inode) of the journal followed and how far it was read
+        self._journal_id = None
+        self._offset = 0
+
+    def read(self):
+        """The tasks of the store without following it or creating any file, for a migration"""
+        return replay_journal(self._load_snapshot(), self._read_journal(repair=False))
+
+    def load(self):
+        journal_id = self._journal_identity()[0]
+        tasks = self._load_snapshot()
+        records = self._open_journal(journal_id)
+        self._maybe_compact()
+        return replay_journal(tasks, records)
+
+    def iter_load(self, batch_size=LOAD_BATCH_SIZE):
+        journal_id = self._journal_identity()[0]
+        for batch in self._iter_snapshot(batch_size):
+            yield batch
+        records = self._open_journal(journal_id)
+        self._maybe_compact()
+        if records:
+            # Collapse the journal to the final state of each task it touches
+            final = {}
+            for record in records:
+                if record["op"] == "put":
+                    final[record["task"]["id"]] = apply_task_defaults(record["task"])
+                elif record["op"] == "delete":
+                    final[record["id"]] = None
+            yield (
+                [task for task in final.values() if task is not None],
+                [task_id for task_id, task in final.items() if task is None]
+            )
+
+    def save(self, tasks):
+        with self.file_lock:
+            tasks = list(tasks)
+            if self._loaded:
+                self._catch_up()
+                if self._stale:
+                    self._resync(tasks)
+            if self._external:
+                # Keep the changes of other processes not merged by the caller yet
+                tasks = apply_changes(tasks, self._external)
+            self._write_snapshot(tasks)
+            with self._lock:
+                self._reopen_journal(b"")
+                self._records = 0
+
+    def put(self, task, tasks):
+        self._append([{"op": "put", "task": task}])
+
+    def delete(self, task_id, tasks):
+        self._append([{"op": "delete", "id": task_id}])
+
+    def apply(self, changes, tasks):
+        self._append([
+            {"op": "put", "task": task} if task is not None else {"op": "delete", "id": task_id}
+            for task_id, task in changes.items()
+        ])
+
+    def close(self):
+        if self._compactor:
+            self._compactor.join()
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+        super().close()
+
+    # Snapshot format hooks; the journal works the same over any of them
+    def _load_snapshot(self):
+        return JsonStorage.load(self)
+
+    def _iter_snapshot(self, batch_size):
+        return JsonStorage.iter_load(self, batch_size)
+
+    def _write_snapshot(self, tasks):
+        write_json_atomic(self.filename, tasks)
+
+    def _journal_identity(self):
+        """(device, inode) and size of the journal file, (None, 0) if there is none"""
+        try:
+            stat = os.stat(self.journal_filename)
+        except OSError:
+            return None, 0
+        return (stat.st_dev, stat.st_ino), stat.st_size
+
+    def _open_journal(self, journal_id):
+        """Read the journal after the snapshot and start following it
+
+        journal_id is the journal seen before the snapshot was read; if it
+        was replaced since, the snapshot may be older than the journal and
+        the first read_changes() compares the whole store instead.
+        """
+        with self.file_lock:
+            records = self._read_journal()
+            with self._lock:
+                if self._journal:
+                    self._journal.close()
+                self._journal = open(self.journal_filename, 'ab')
+                self._records = len(records)
+            self._journal_id, self._offset = self._journal_identity()
+            self._stale = journal_id is not None and journal_id != self._journal_id
+            self._loaded = True
+        return records
+
+    def _catch_up(self):
+        """Note what other processes appended since the last read (hold file_lock)"""
+        journal_id, size = self._journal_identity()
+        if journal_id != self._journal_id:
+            # The journal was folded into a new snapshot by another process
+            with self._lock:
+                if self._journal:
+                    self._journal.close()
+                self._journal = open(self.journal_filename, 'ab')
+                self._records = 0
+            self._journal_id, self._offset = self._journal_identity()
+            self._stale = True
+            return
+        if size <= self._offset:
+            return
+        with open(self.journal_filename, 'rb') as file:
+            file.seek(self._offset)
+            data = file.read(size - self._offset)
+        self._offset = size
+        changes = {}
+        for line in data.splitlines():
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                # A torn record of a process that crashed while appending
+                continue
+            if record["op"] == "put":
+                changes[record["task"]["id"]] = apply_task_defaults(record["task"])
+            elif record["op"] == "delete":
+                changes[record["id"]] = None
+            self._records += 1
+        self._note_external(changes)
+
+    def _resync(self, tasks):
+        stored = replay_journal(self._load_snapshot(), self._read_journal())
+        self._external = diff_tasks(stored, tasks)
+        self._stale = False
+
+    def _append(self, records):
+        """Append records with a single write and fsync"""
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self.file_lock:
+            self._catch_up()
+            self._note_written({
+                record["task"]["id"] if record["op"] == "put" else record["id"]:
+                    record.get("task") for record in records
+            })
+            with self._lock:
+                if self._journal is None:
+                    self._journal = open(self.journal_filename, 'ab')
+                self._journal.write(data.encode('utf-8'))
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._offset = self._journal.tell()
+                self._records += len(records)
+        self._maybe_compact()
+
+    def _read_journal(self, limit=None, repair=True):
+        """Read journal records, dropping a torn record left by a crash (and cutting it off if repair)"""
+        if not os.path.exists(self.journal_filename):
+            return []
+        records = []
+        valid_bytes = 0
+        with open(self.journal_filename, 'rb') as file:
+            data = file.read() if limit is None else file.read(limit)
+        for line in data.splitlines(keepends=True):
+            try:
+                records.append(json.loads(line.decode('utf-8')))
+            except ValueError:
+                break
+            valid_bytes += len(line)
+        if limit is None and repair and valid_bytes < len(data):
+            # Cut off the partial record so new appends start on a clean line
+            with open(self.journal_filename, 'r+b') as file:
+                file.truncate(valid_bytes)
+        return records
+
+    def _reopen_journal(self, content):
+        """Replace the journal with content and reopen it for appending"""
+        if self._journal:
+            self._journal.close()
+        temp_filename = self.journal_filename + ".tmp"
+        with open(temp_filename, 'wb') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, self.journal_filename)
+        self._journal = open(self.journal_filename, 'ab')
+        self._journal_id, self._offset = self._journal_identity()
+
+    def _maybe_compact(self):
+        if self._records < self.compact_after:
+            return
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact, daemon=True)
+        self._compactor.start()
+
+    def _compact(self):
+        # Other processes append to the journal too, so they are kept out
+        # until the new snapshot and the empty journal are both in place
+        with self.file_lock:
+            if self._journal is None:
+                return
+            self._catch_up()
+            tasks = replay_journal(self._load_snapshot(), self._read_journal())
+            self._write_snapshot(tasks)
+            with self._lock:
+                self._reopen_journal(b"")
+                self._records = 0
+
+
+class SqliteStorage(JsonStorage):
+    """Keep tasks in an indexed SQLite database
+
+    Status, tag and sort combinations are answered by query_ids with indexed
+    WHERE/ORDER BY clauses. On first use the tasks of json_filename (snapshot
+    plus journal) are migrated into the database.
+
+    Every write also logs the ids it changed in the changes table, so
+    other processes read back only those tasks. A full rewrite logs id 0,
+    which makes the others compare everything, as does falling more than
+    CHANGE_LOG_SIZE entries behind.
+    """
+
+    needs_full_tasks = False
+    indexed_queries = True
+
+    PRIORITY_RANK = {"High": 0, "Medium": 1, "Low": 2}
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            title_key TEXT NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            priority TEXT NOT NULL DEFAULT 'Medium',
+            priority_rank INTEGER NOT NULL DEFAULT 1,
+            due_date TEXT NOT NULL DEFAULT '',
+            tags TEXT NOT NULL DEFAULT '[]',
+            completed INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL DEFAULT '',
+            completed_at TEXT NOT NULL DEFAULT ''
+        );
+        CREATE TABLE IF NOT EXISTS task_tags (
+            tag TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            PRIMARY KEY (tag, task_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks (completed, due_date);
+        CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (due_date);
+        CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (priority_rank);
+        CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
+        CREATE INDEX IF NOT EXISTS idx_tasks_title_key ON tasks (title_key);
+        CREATE INDEX IF NOT EXISTS idx_task_tags_task ON task_tags (task_id);
+    """
+
+    # ORDER BY clause for each option of the sort combo; ties keep id order
+    ORDER_BY = {
+        "Creation Time": "created_at DESC, id",
+        "Due Date": "due_date = '', due_date, id",
+        "Priority": "priority_rank, id",
+        "Task Name": "title_key, id",
+    }
+
+    def __init__(self, filename, json_filename=None):
+        super().__init__(filename)
+        self.json_filename = json_filename
+        self._lock = threading.Lock()
+        self._db = None
+        # Last entry of the change log this process has seen
+        self._seq = 0
+
+    SELECT_COLUMNS = (
+        "SELECT id, title, description, priority, due_date, tags,"
+        " completed, created_at, completed_at FROM tasks"
+    )
+    SELECT_TASKS = SELECT_COLUMNS + " ORDER BY id"
+
+    def load(self):
+        self._open()
+        with self.file_lock, self._lock:
+            rows = self._db.execute(self.SELECT_TASKS).fetchall()
+            self._seq = self._last_seq()
+        self._loaded = True
+        return [self._row_to_task(row) for row in rows]
+
+    def iter_load(self, batch_size=LOAD_BATCH_SIZE):
+        self._open()
+        with self.file_lock, self._lock:
+            rows = self._db.execute(self.SELECT_TASKS).fetchall()
+            self._seq = self._last_seq()
+        self._loaded = True
+        for start in range(0, len(rows), batch_size):
+            yield [self._row_to_task(row) for row in rows[start:start + batch_size]], []
+
+    def _open(self):
+        import sqlite3
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript(self.SCHEMA)
+        self._migrate()
+
+    def save(self, tasks):
+        with self.file_lock, self._lock, self._db:
+            tasks = list(tasks)
+            if self._loaded:
+                self._catch_up()
+                if self._stale:
+                    self._resync(tasks)
+                if self._external:
+                    # Keep the changes of other processes not merged by the caller yet
+                    tasks = apply_changes([dict(task) for task in tasks], self._external)
+            self._db.execute("DELETE FROM task_tags")
+            self._db.execute("DELETE FROM tasks")
+            for task in tasks:
+                self._insert(task)
+            self._log([0])
+
+    def put(self, task, tasks):
+        self.apply({task["id"]: task}, tasks)
+
+    def delete(self, task_id, tasks):
+        self.apply({task_id: None}, tasks)
+
+    def apply(self, changes, tasks):
+        with self.file_lock, self._lock, self._db:
+            if self._loaded:
+                self._catch_up()
+            self._note_written(changes)
+            for task_id, task in changes.items():
+                self._db.execute("DELETE FROM task_tags WHERE task_id = ?", (task_id,))
+                if task is None:
+                    self._db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+                else:
+                    self._insert(task)
+            self._log(changes)
+
+    def read_changes(self, tasks):
+        with self.file_lock, self._lock:
+            self._catch_up()
+            if self._stale:
+                self._resync(tasks)
+            return self._take_changes()
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+        super().close()
+
+    def _last_seq(self):
+        return self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def _log(self, task_ids):
+        """Log changed ids for other processes and drop entries too old to matter"""
+        self._db.executemany("INSERT INTO changes (task_id) VALUES (?)", [(task_id,) for task_id in task_ids])
+        self._seq = self._last_seq()
+        self._db.execute("DELETE FROM changes WHERE seq <= ?", (self._seq - CHANGE_LOG_SIZE,))
+
+    def _catch_up(self):
+        """Note the tasks other processes changed since the last read (hold both locks)"""
+        rows = self._db.execute(
+            "SELECT seq, task_id FROM changes WHERE seq > ? ORDER BY seq", (self._seq,)
+        ).fetchall()
+        if not rows:
+            return
+        stale = rows[0][0] != self._seq + 1 or any(task_id == 0 for seq, task_id in rows)
+        self._seq = rows[-1][0]
+        if stale:
+            # Entries were pruned, or the whole store was rewritten
+            self._stale = True
+            return
+        task_ids = list({task_id for seq, task_id in rows})
+        found = {}
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            sql = self.SELECT_COLUMNS + " WHERE id IN (" + ",".join("?" * len(chunk)) + ")"
+            for row in self._db.execute(sql, chunk):
+                found[row[0]] = self._row_to_task(row)
+        self._note_external({task_id: found.get(task_id) for task_id in task_ids})
+
+    def _resync(self, tasks):
+        rows = self._db.execute(self.SELECT_TASKS).fetchall()
+        self._external = diff_tasks([self._row_to_task(row) for row in rows], tasks)
+        self._stale = False
+
+    def query_ids(self, status="All", tag="All", sort="Creation Time", today=""):
+        """Return the ids of the tasks matching the filters in display order"""
+        sql = "SELECT id FROM tasks"
+        conditions = []
+        params = []
+        if tag != "All":
+            sql = "SELECT tasks.id FROM task_tags JOIN tasks ON tasks.id = task_tags.task_id"
+            conditions.append("task_tags.tag = ?")
+            params.append(tag)
+        if status == "Incomplete":
+            conditions.append("completed = 0")
+        elif status == "Completed":
+            conditions.append("completed = 1")
+        elif status in DUE_FILTERS:
+            first, last = due_range(status, today)
+            conditions.append("completed = 0 AND due_date != ''")
+            if first:
+                conditions.append("due_date >= ?")
+                params.append(first)
+            if last:
+                conditions.append("due_date <= ?")
+                params.append(last)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY " + self.ORDER_BY.get(sort, "id")
+        with self._lock:
+            return [row[0] for row in self._db.execute(sql, params)]
+
+    def _insert(self, task):
+        priority = task.get("priority", "Medium")
+        self._db.execute(
+            "INSERT OR REPLACE INTO tasks (id, title, title_key, description,"
+            " priority, priority_rank, due_date, tags, completed, created_at,"
+            " completed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                task["id"],
+                task["title"],
+                task["title"].lower(),
+                task.get("description") or "",
+                priority,
+                self.PRIORITY_RANK.get(priority, 1),
+                task.get("due_date", ""),
+                json.dumps(task.get("tags", []), ensure_ascii=False),
+                1 if task["completed"] else 0,
+                task["created_at"],
+                task.get("completed_at", ""),
+            )
+        )
+        self._db.executemany(
+            "INSERT OR IGNORE INTO task_tags (tag, task_id) VALUES (?, ?)",
+            [(tag, task["id"]) for tag in task.get("tags", [])]
+        )
+
+    def _migrate(self):
+        """Import todo_data.json the first time the database is opened"""
+        with self._lock:
+            migrated = self._db.execute(
+                "SELECT value FROM meta WHERE key = 'migrated_from'"
+            ).fetchone()
+        if migrated or not self.json_filename:
+            return
+        # Read only, so no journal or lock file is left next to the JSON file
+        tasks = JournalStorage(self.json_filename).read()
+        with self._lock, self._db:
+            for task in tasks:
+                self._insert(task)
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                (self.json_filename,)
+            )
+
+    @staticmethod
+    def _row_to_task(row):
+        return {
+            "id": row[0],
+            "title": row[1],
+            "description": row[2],
+            "priority": row[3],
+            "due_date": row[4],
+            "tags": json.loads(row[5]),
+            "completed": bool(row[6]),
+            "created_at": row[7],
+            "completed_at": row[8],
+        }
+
+
+class WriteBehindStorage:
+    """Collect changes in memory and persist them on a background thread
+
+    put() and delete() only record the latest state of each task and return.
+    A writer thread waits WRITE_BEHIND_DELAY seconds so a burst of edits is
+    coalesced, then hands the batch to the wrapped backend in one apply().
+    flush() writes everything queued so far from the calling thread and
+    returns once it is durable, which is what exit paths use.
+
+    lock is the lock the caller holds while changing tasks. It is only
+    taken when the backend needs a consistent copy of the full task list.
+    """
+
+    def __init__(self, inner, lock, delay=WRITE_BEHIND_DELAY):
+        self.inner = inner
+        self.lock = lock
+        self.delay = delay
+        self.indexed_queries = inner.indexed_queries
+        self.supports_archive = inner.supports_archive
+        self.last_error = None
+        self._tasks = None
+        self._pending = {}
+        self._queued = 0
+        self._durable = 0
+        self._closing = False
+        self._write_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._writer = threading.Thread(target=self._run, daemon=True)
+        self._writer.start()
+
+    def load(self):
+        return self.inner.load()
+
+    def iter_load(self, batch_size=LOAD_BATCH_SIZE):
+        return self.inner.iter_load(batch_size)
+
+    def save(self, tasks):
+        self.flush()
+        with self._write_lock:
+            self.inner.save(tasks)
+
+    def put(self, task, tasks):
+        # Copy so later edits to the dict do not leak into an older batch
+        copy = dict(task)
+        copy["tags"] = list(task.get("tags", []))
+        self._queue(task["id"], copy, tasks)
+
+    def delete(self, task_id, tasks):
+        self._queue(task_id, None, tasks)
+
+    def apply(self, changes, tasks):
+        """Queue a batch of changes to be written together"""
+        with self._condition:
+            self._pending.update(changes)
+            self._tasks = tasks
+            self._queued += 1
+            self._condition.notify()
+
+    def query_ids(self, status="All", tag="All", sort="Creation Time", today=""):
+        # The caller holds its lock, so flushing here would stall every edit
+        # behind the write; the in-memory indexes answer until it is durable
+        if not self.indexed_queries or self.dirty:
+            return None
+        with self._write_lock:
+            return self.inner.query_ids(status, tag, sort, today)
+
+    def read_changes(self, tasks):
+        """Write the queued changes, then take those of other processes (hold the caller's lock)"""
+        if not self.flush():
+            # Changes not written yet would look like those of another process
+            return {}, {}
+        with self._write_lock:
+            return self.inner.read_changes(tasks)
+
+    def reserve_ids(self, count, lowest=1):
+        return self.inner.reserve_ids(count, lowest)
+
+    @property
+    def dirty(self):
+        with self._condition:
+            return self._durable < self._queued
+
+    def flush(self):
+        """Write all queued changes now; returns True once they are durable"""
+        with self._condition:
+            target = self._queued
+        if self._durable >= target:
+            return True
+        self._flush()
+        with self._condition:
+            return self._durable >= target
+
+    def close(self):
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        self._writer.join()
+        self.flush()
+        self.inner.close()
+
+    def _queue(self, task_id, task, tasks):
+        with self._condition:
+            self._pending[task_id] = task
+            self._tasks = tasks
+            self._queued += 1
+            self._condition.notify()
+
+    def _flush(self):
+        needs_lock = self.inner.needs_full_tasks
+        if needs_lock:
+            self.lock.acquire()
+        self._write_lock.acquire()
+        try:
+            with self._condition:
+                changes = self._pending
+                self._pending = {}
+                target = self._queued
+            tasks = None
+            if needs_lock:
+                if changes:
+                    tasks = [dict(task) for task in self._tasks]
+                # Only the copy needs the caller's lock, not the slow write
+                self.lock.release()
+                needs_lock = False
+            if changes:
+                try:
+                    self.inner.apply(changes, tasks)
+                except Exception as e:
+                    self.last_error = e
+                    with self._condition:
+                        # Retry later without overriding newer changes
+                        for task_id, task in changes.items():
+                            self._pending.setdefault(task_id, task)
+                    return
+            self.last_error = None
+            with self._condition:
+                self._durable = max(self._durable, target)
+                self._condition.notify_all()
+        finally:
+            self._write_lock.release()
+            if needs_lock:
+                self.lock.release()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closing:
+                    self._condition.wait()
+                if self._closing:
+                    return
+            # Let the rest of the burst arrive before writing
+            time.sleep(self.delay)
+            self._flush()
+
+
+# Storage backends selectable with the TODO_STORAGE environment variable;
+# remote keeps the tasks on a sync server (see todo_sync.py) instead of a file
+STORAGE_MODES = ("journal", "json", "sqlite", "binary", "remote")
+
+
+def create_storage(mode, filename):
+    """Create the storage backend for mode, keyed on the JSON data file name"""
+    if mode == "json":
+        return JsonStorage(filename)
+    if mode == "sqlite":
+        return SqliteStorage(os.path.splitext(filename)[0] + ".db", json_filename=filename)
+    if mode == "binary":
+        from todo_snapshot import BinaryJournalStorage
+        return BinaryJournalStorage(os.path.splitext(filename)[0] + ".snap", json_filename=filename)
+    if mode == "remote":
+        from todo_sync import RemoteStorage
+        return RemoteStorage(filename)
+    return JournalStorage(filename)
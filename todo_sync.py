@@ -0,0 +1,767 @@
+"""Share task lists between machines through a small sync server
+
+The server keeps the task files of a directory and serves them over TCP
+to any number of clients; a client is the app or the command-line tool
+started with TODO_STORAGE=remote (TODO_SYNC_SERVER=host:port, default
+localhost:8765), which then works on the server's copy instead of a file:
+
+    python todo_sync.py serve --directory shared --port 8765
+    TODO_STORAGE=remote TODO_SYNC_SERVER=localhost:8765 python "To-do list program.py"
+    python todo_sync.py bench --clients 50 --tasks 10000
+
+Messages are JSON objects, one per line. Every change the server accepts
+gets the next sequence number of its store, so a client that has seen
+everything up to sequence N only receives the tasks changed after N:
+
+    hello    {store, client, epoch, since}  -> deltas up to now, then a reply
+    push     {since, tasks, deleted}        -> deltas the pusher missed, then a
+                                               reply listing conflicts
+    reserve  {count}                        -> reply with the first of count new ids
+    delta    {tasks, deleted, full, more, seq, epoch}   (server to client)
+
+Changes are sent to the other clients of the store in batches, at most
+every BATCH_DELAY seconds, each of them only the tasks changed since it
+was last sent anything, so the traffic follows the changes rather than
+the size of the list. Long deltas are split into messages of CHUNK_SIZE
+tasks. A client whose epoch is not the server's (the first connection,
+or one after the server restarted) gets the whole list instead.
+
+A task changed by a client that had not seen the latest change of
+another one is a conflict: the push is applied, and the reply gives the
+pusher the version it replaced, like TaskEngine.sync() does for files.
+The server also picks up what other programs change in its files, so
+scripts on the server machine may keep using them directly.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import bisect
+import random
+import socket
+import asyncio
+import argparse
+import itertools
+import threading
+import subprocess
+
+from todo_engine import TaskEngine
+from todo_storage import JsonStorage, apply_changes, diff_tasks, LOAD_BATCH_SIZE
+from todo_metrics import percentile
+
+DEFAULT_PORT = 8765
+
+# Where clients find the server
+SERVER_ADDRESS = os.environ.get("TODO_SYNC_SERVER", f"localhost:{DEFAULT_PORT}")
+
+# Seconds changes are collected before the other clients are sent a delta
+BATCH_DELAY = 0.05
+
+# Tasks per delta or push message
+CHUNK_SIZE = LOAD_BATCH_SIZE
+
+# Longest message the server accepts, in bytes
+MAX_MESSAGE = 1 << 26
+
+# Seconds the server waits between checks for changes other programs made to its files
+FILE_SYNC_INTERVAL = 2
+
+# Seconds a client waits to connect and for a reply
+CONNECT_TIMEOUT = 5
+REQUEST_TIMEOUT = 30
+
+# Stores a client may ask for, relative to the served directory
+STORE_NAME_RE = re.compile(r"(workspaces/)?[A-Za-z0-9_][A-Za-z0-9_.-]*\.json\Z")
+
+
+class SyncError(Exception):
+    """Raised when the server refuses a request"""
+
+
+def encode(message):
+    return (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "localhost", int(port or DEFAULT_PORT)
+
+
+def delta_messages(tasks, deleted, full, seq, epoch):
+    """A delta split into messages of at most CHUNK_SIZE tasks; the last has more=False"""
+    messages = []
+    for start in range(0, max(len(tasks), 1), CHUNK_SIZE):
+        messages.append({
+            "type": "delta",
+            "tasks": tasks[start:start + CHUNK_SIZE],
+            "deleted": [],
+            "full": full,
+            "more": True,
+            "seq": seq,
+            "epoch": epoch,
+        })
+    messages[-1]["deleted"] = deleted
+    messages[-1]["more"] = False
+    return messages
+
+
+class SharedStore:
+    """A task store served to clients, with the change log their deltas come from
+
+    Every change is logged as (sequence number, task id). Only the latest
+    change of each task is sent, so a delta is built from the part of the
+    log after the client's sequence number, and the log is compacted to
+    one entry per task once superseded entries pile up. Deleted tasks keep
+    their entry, so a client that missed the delete still hears of it.
+    """
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        # A new epoch per server run; clients from an older one start over
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        # task id -> (sequence number of its last change, client that made it)
+        self.versions = {}
+        self.log = []
+        self.clients = set()
+
+    def record(self, task_ids, client_id=None):
+        """Log a change of task_ids by client_id (None for other programs)"""
+        # Pushes are applied on worker threads, so the log shares the engine's lock
+        with self.engine.lock:
+            for task_id in task_ids:
+                self.seq += 1
+                self.versions[task_id] = (self.seq, client_id)
+                self.log.append((self.seq, task_id))
+            if len(self.log) > 2 * len(self.versions) + CHUNK_SIZE:
+                self.log = sorted((seq, task_id) for task_id, (seq, writer) in self.versions.items())
+
+    def changes_since(self, since, client_id):
+        """Tasks changed after since by anyone but client_id, as (task dicts, deleted ids)"""
+        tasks = []
+        deleted = []
+        with self.engine.lock:
+            start = bisect.bisect_right(self.log, (since, float("inf")))
+            for seq, task_id in self.log[start:]:
+                latest, writer = self.versions[task_id]
+                if latest != seq or writer == client_id:
+                    continue
+                task = self.engine.get(task_id)
+                if task is None:
+                    deleted.append(task_id)
+                else:
+                    tasks.append(task.to_dict())
+        return tasks, deleted
+
+    def all_tasks(self):
+        with self.engine.lock:
+            return [task.to_dict() for task in self.engine.tasks]
+
+    def push(self, changes, since, client_id):
+        """Apply changes of a client that has seen up to since; returns the conflicts
+
+        Runs on a worker thread, so a large push does not hold up the
+        other clients.
+        """
+        conflicts = []
+        with self.engine.lock:
+            for task_id in changes:
+                seq, writer = self.versions.get(task_id, (0, None))
+                if seq > since and writer != client_id:
+                    task = self.engine.get(task_id)
+                    conflicts.append({"id": task_id, "task": task.to_dict() if task else None})
+            self.engine.merge_changes(changes)
+            self.record(changes, client_id)
+        return conflicts
+
+    def reserve(self, count):
+        """The first of count new ids (runs on a worker thread)"""
+        with self.engine.lock:
+            return self.engine.reserve_ids(count)
+
+
+class ClientConnection:
+    """The server's end of one connected client"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.id = None
+        self.store = None
+        self.sent_seq = 0
+        self.full = False
+        self.send_lock = asyncio.Lock()
+
+
+class SyncServer:
+    """Serves the task files of a directory to sync clients"""
+
+    def __init__(self, directory=".", storage_mode="journal", batch_delay=BATCH_DELAY):
+        self.directory = directory
+        self.storage_mode = storage_mode
+        self.batch_delay = batch_delay
+        self.stores = {}
+        self.changed = set()
+        self.bytes_sent = 0
+        self._open_lock = None
+        self._wakeup = None
+
+    async def serve(self, host="localhost", port=DEFAULT_PORT, ready=None):
+        """Serve until cancelled; ready(address) is called once it listens"""
+        self._open_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_MESSAGE)
+        if ready:
+            ready(server.sockets[0].getsockname()[:2])
+        tasks = [asyncio.ensure_future(self.broadcast()), asyncio.ensure_future(self.watch_files())]
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.close()
+
+    def close(self):
+        for store in self.stores.values():
+            store.engine.close()
+        self.stores = {}
+
+    async def open_store(self, name):
+        if not STORE_NAME_RE.match(name):
+            raise SyncError(f"no store named '{name}'")
+        async with self._open_lock:
+            store = self.stores.get(name)
+            if store is None:
+                filename = os.path.join(self.directory, name)
+                os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+                engine = TaskEngine(filename, self.storage_mode)
+                # Loading may take a while; the other stores keep being served
+                await asyncio.get_running_loop().run_in_executor(None, engine.load)
+                store = self.stores[name] = SharedStore(name, engine)
+            return store
+
+    async def handle(self, reader, writer):
+        connection = ClientConnection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                try:
+                    if not isinstance(message, dict):
+                        raise SyncError("a message must be a JSON object")
+                    reply = await self.dispatch(connection, message)
+                except (SyncError, KeyError, TypeError, ValueError) as e:
+                    request_id = message.get("id") if isinstance(message, dict) else None
+                    reply = {"type": "reply", "id": request_id, "error": str(e) or type(e).__name__}
+                await self.send_delta(connection, reply)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            if connection.store is not None:
+                connection.store.clients.discard(connection)
+            writer.close()
+
+    async def dispatch(self, connection, message):
+        """Handle one request; returns the reply sent after the client's delta"""
+        kind = message["type"]
+        reply = {"type": "reply", "id": message["id"]}
+        loop = asyncio.get_running_loop()
+        if kind == "hello":
+            if connection.store is not None:
+                connection.store.clients.discard(connection)
+            store = await self.open_store(message["store"])
+            connection.id = message["client"]
+            connection.store = store
+            connection.full = message.get("epoch") != store.epoch
+            connection.sent_seq = message.get("since", 0) if not connection.full else 0
+            store.clients.add(connection)
+        elif kind == "push":
+            store = self.store_of(connection)
+            changes = {task["id"]: task for task in message["tasks"]}
+            changes.update(dict.fromkeys(message["deleted"]))
+            # Merging and writing it may take a while; other clients keep being served
+            reply["conflicts"] = await loop.run_in_executor(
+                None, store.push, changes, message["since"], connection.id
+            )
+            self.notify(store)
+        elif kind == "reserve":
+            store = self.store_of(connection)
+            reply["first"] = await loop.run_in_executor(None, store.reserve, message["count"])
+        else:
+            raise SyncError(f"unknown request '{kind}'")
+        return reply
+
+    def store_of(self, connection):
+        if connection.store is None:
+            raise SyncError("say hello first")
+        return connection.store
+
+    def notify(self, store):
+        self.changed.add(store)
+        self._wakeup.set()
+
+    async def send_delta(self, connection, reply=None):
+        """Send a client what changed since it was last sent anything, then reply"""
+        async with connection.send_lock:
+            store = connection.store
+            messages = []
+            if store is not None:
+                if connection.full:
+                    tasks, deleted = store.all_tasks(), []
+                else:
+                    tasks, deleted = store.changes_since(connection.sent_seq, connection.id)
+                if tasks or deleted or connection.full or reply is not None:
+                    messages = delta_messages(tasks, deleted, connection.full, store.seq, store.epoch)
+                connection.sent_seq = store.seq
+                connection.full = False
+            if reply is not None:
+                messages.append(reply)
+            for message in messages:
+                data = encode(message)
+                self.bytes_sent += len(data)
+                connection.writer.write(data)
+                await connection.writer.drain()
+
+    async def broadcast(self):
+        """Send the changes collected over BATCH_DELAY to the clients of each changed store"""
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.batch_delay)
+            self._wakeup.clear()
+            stores, self.changed = self.changed, set()
+            sends = [
+                self.send_delta(connection)
+                for store in stores for connection in list(store.clients)
+                if connection.sent_seq < store.seq
+            ]
+            results = await asyncio.gather(*sends, return_exceptions=True)
+            for result in results:
+                # A client that went away is dropped by its own handler
+                if isinstance(result, Exception) and not isinstance(result, ConnectionError):
+                    raise result
+
+    async def watch_files(self):
+        """Merge what other programs change in the served files and pass it on"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(FILE_SYNC_INTERVAL)
+            for store in list(self.stores.values()):
+                result = await loop.run_in_executor(None, store.engine.sync)
+                if result.changed or result.deleted:
+                    store.record([task.id for task in result.changed] + result.deleted)
+                    self.notify(store)
+
+
+class RemoteStorage(JsonStorage):
+    """Keep the tasks on a sync server instead of in a local file
+
+    Loading streams the server's copy in, and each batch of changes
+    (collected by WriteBehindStorage) is pushed as one request. A reader
+    thread receives the changes of other clients as the server sends
+    them; read_changes() hands them to TaskEngine.sync() together with
+    the conflicts the server reported, as the file backends do. When the
+    connection drops, the next request or read_changes() reconnects and
+    asks only for what changed since the last sequence number seen.
+    """
+
+    needs_full_tasks = False
+    supports_archive = False
+
+    def __init__(self, filename, address=None):
+        super().__init__(filename)
+        self.address = parse_address(address or SERVER_ADDRESS)
+        self.store = os.path.relpath(filename).replace(os.sep, "/")
+        self.client_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._connect_lock = threading.RLock()
+        self._socket = None
+        self._epoch = None
+        self._seq = 0
+        # Tasks of a whole-list delta, compared with the caller's on read_changes()
+        self._full = None
+        self._replies = {}
+        self._request_ids = itertools.count(1)
+
+    def load(self):
+        tasks = []
+        for batch, deleted in self.iter_load():
+            tasks.extend(batch)
+        return tasks
+
+    def iter_load(self, batch_size=LOAD_BATCH_SIZE):
+        self._loaded = True
+        with self._connect_lock:
+            self._close_socket()
+            self._epoch = None
+            for message in self._handshake():
+                self._advance(message)
+                yield message["tasks"], message["deleted"]
+
+    def save(self, tasks):
+        self.apply({task["id"]: dict(task) for task in tasks}, tasks)
+
+    def apply(self, changes, tasks):
+        with self._lock:
+            self._note_written(changes)
+        puts = [task for task in changes.values() if task is not None]
+        deleted = [task_id for task_id, task in changes.items() if task is None]
+        for start in range(0, max(len(puts), 1), CHUNK_SIZE):
+            last = start + CHUNK_SIZE >= len(puts)
+            reply = self._request({
+                "type": "push",
+                "since": self._seq,
+                "tasks": puts[start:start + CHUNK_SIZE],
+                "deleted": deleted if last else [],
+            })
+            with self._lock:
+                for conflict in reply["conflicts"]:
+                    # The server kept this client's version over theirs
+                    self._external.pop(conflict["id"], None)
+                    self._conflicts[conflict["id"]] = conflict["task"]
+        with self._lock:
+            if self._full is not None:
+                # The whole list received before the push has them now too
+                self._full = apply_changes(self._full, changes)
+
+    def read_changes(self, tasks):
+        if self._socket is None:
+            try:
+                self._reconnect()
+            except OSError:
+                # Still offline; try again on the next call
+                return {}, {}
+        with self._lock:
+            if self._full is not None:
+                self._external = diff_tasks(self._full, tasks)
+                self._full = None
+            return self._take_changes()
+
+    def reserve_ids(self, count, lowest=1):
+        return self._request({"type": "reserve", "count": count})["first"]
+
+    def close(self):
+        with self._connect_lock:
+            self._close_socket()
+        super().close()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=CONNECT_TIMEOUT)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket = sock
+        self._file = sock.makefile("rb")
+
+    def _close_socket(self):
+        sock, self._socket = self._socket, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def _handshake(self):
+        """Connect and say hello; yields the delta messages, then starts the reader thread"""
+        self._connect()
+        request_id = next(self._request_ids)
+        self._send({
+            "type": "hello", "id": request_id, "store": self.store,
+            "client": self.client_id, "epoch": self._epoch, "since": self._seq,
+        })
+        while True:
+            line = self._file.readline()
+            if not line:
+                self._close_socket()
+                raise ConnectionError("the sync server closed the connection")
+            message = json.loads(line)
+            if message["type"] == "delta":
+                yield message
+            elif message.get("id") == request_id:
+                if "error" in message:
+                    self._close_socket()
+                    raise SyncError(message["error"])
+                break
+        threading.Thread(target=self._read_loop, args=(self._socket, self._file), daemon=True).start()
+
+    def _reconnect(self):
+        with self._connect_lock:
+            if self._socket is None:
+                for message in self._handshake():
+                    self._receive_delta(message)
+
+    def _advance(self, message):
+        """Take the sequence number of the last message of a delta"""
+        if not message["more"]:
+            with self._lock:
+                self._seq = message["seq"]
+                self._epoch = message["epoch"]
+
+    def _receive_delta(self, message):
+        with self._lock:
+            if message["full"]:
+                # The server restarted: compare its whole list on read_changes()
+                if self._full is None:
+                    self._full = []
+                self._full.extend(message["tasks"])
+            else:
+                self._note_external({task["id"]: task for task in message["tasks"]})
+                self._note_external(dict.fromkeys(message["deleted"]))
+        self._advance(message)
+
+    def _read_loop(self, sock, file):
+        try:
+            for line in file:
+                message = json.loads(line)
+                if message["type"] == "delta":
+                    self._receive_delta(message)
+                    continue
+                with self._lock:
+                    waiter = self._replies.pop(message.get("id"), None)
+                if waiter is not None:
+                    waiter[1] = message
+                    waiter[0].set()
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._connect_lock:
+                if self._socket is sock:
+                    self._close_socket()
+            with self._lock:
+                waiters, self._replies = self._replies, {}
+            for event, reply in waiters.values():
+                event.set()
+
+    def _send(self, message):
+        with self._send_lock:
+            if self._socket is None:
+                raise ConnectionError("not connected to the sync server")
+            self._socket.sendall(encode(message))
+
+    def _request(self, message):
+        """Send a request and wait for its reply; raises ConnectionError when offline"""
+        self._reconnect()
+        waiter = [threading.Event(), None]
+        with self._lock:
+            message["id"] = next(self._request_ids)
+            self._replies[message["id"]] = waiter
+        self._send(message)
+        if not waiter[0].wait(REQUEST_TIMEOUT) or waiter[1] is None:
+            with self._lock:
+                self._replies.pop(message["id"], None)
+            raise ConnectionError("no reply from the sync server")
+        reply = waiter[1]
+        if "error" in reply:
+            raise SyncError(reply["error"])
+        return reply
+
+
+class SimulatedClient:
+    """A bare protocol client for the benchmark, many of which share one event loop"""
+
+    def __init__(self, number, store):
+        self.number = number
+        self.store = store
+        self.id = f"bench-{number}"
+        self.seq = 0
+        self.epoch = None
+        self.bytes_received = 0
+        self.full_bytes = 0
+        self.tasks_received = 0
+        self.latencies = []
+        self.replies = {}
+        self.request_ids = itertools.count(1)
+
+    async def connect(self, address):
+        self.reader, self.writer = await asyncio.open_connection(*address, limit=MAX_MESSAGE)
+        started = time.perf_counter()
+        await self.request({"type": "hello", "store": self.store, "client": self.id, "epoch": None, "since": 0},
+                           read_inline=True)
+        self.full_bytes = self.bytes_received
+        return time.perf_counter() - started
+
+    async def request(self, message, read_inline=False):
+        message["id"] = next(self.request_ids)
+        future = self.replies[message["id"]] = asyncio.get_running_loop().create_future()
+        self.writer.write(encode(message))
+        await self.writer.drain()
+        if read_inline:
+            while not future.done():
+                await self.receive_one()
+        return await future
+
+    async def receive_one(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("the sync server closed the connection")
+        self.bytes_received += len(line)
+        message = json.loads(line)
+        if message["type"] == "delta":
+            now = time.time()
+            for task in message["tasks"]:
+                self.tasks_received += 1
+                # Pushed tasks carry the time they were sent in the description
+                if not message["full"] and task["description"].startswith("sent "):
+                    self.latencies.append(now - float(task["description"][5:]))
+            if not message["more"]:
+                self.seq = message["seq"]
+                self.epoch = message["epoch"]
+        else:
+            self.replies.pop(message["id"]).set_result(message)
+
+    async def receive(self):
+        try:
+            while True:
+                await self.receive_one()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def push(self, tasks):
+        for task in tasks:
+            task["description"] = f"sent {time.time()!r}"
+        started = time.perf_counter()
+        await self.request({"type": "push", "since": self.seq, "tasks": tasks, "deleted": []})
+        return time.perf_counter() - started
+
+
+async def run_clients(address, clients, changes, batch, interval, task_count, seed):
+    """Connect the simulated clients, let each push changes, and collect their timings"""
+    rng = random.Random(seed)
+    simulated = [SimulatedClient(number, "todo_data.json") for number in range(clients)]
+    connect_times = []
+    for client in simulated:
+        connect_times.append(await client.connect(address))
+    receivers = [asyncio.ensure_future(client.receive()) for client in simulated]
+
+    push_times = []
+
+    async def pusher(client):
+        for _ in range(changes):
+            ids = rng.sample(range(1, task_count + 1), batch)
+            tasks = [{"id": task_id, "title": f"Edited by {client.id}", "description": "", "priority": "High",
+                      "due_date": "", "tags": [], "completed": False, "created_at": "2026-01-01 00:00:00",
+                      "completed_at": ""} for task_id in ids]
+            push_times.append(await client.push(tasks))
+            await asyncio.sleep(rng.uniform(0, 2 * interval))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(pusher(client) for client in simulated))
+    elapsed = time.perf_counter() - started
+    # Let the last batches arrive
+    await asyncio.sleep(BATCH_DELAY * 4 + 0.2)
+    for receiver in receivers:
+        receiver.cancel()
+    for client in simulated:
+        client.writer.close()
+    return simulated, connect_times, push_times, elapsed
+
+
+def to_ms(seconds):
+    return seconds * 1000 if seconds is not None else None
+
+
+def cmd_serve(args):
+    server = SyncServer(args.directory, args.storage)
+
+    def ready(address):
+        print(f"Serving {os.path.abspath(args.directory)} on {address[0]}:{address[1]}", flush=True)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+def cmd_bench(args):
+    import shutil
+    import tempfile
+    from todo_bench import generate_tasks, create_store
+
+    directory = tempfile.mkdtemp(prefix="todo_sync_bench_")
+    process = None
+    try:
+        tasks = list(generate_tasks(args.tasks, seed=args.seed))
+        create_store(directory, "journal", tasks)
+        del tasks
+        # The server runs in its own process, as it would for real clients
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "serve", "--directory", directory, "--port", "0"],
+            stdout=subprocess.PIPE, universal_newlines=True
+        )
+        address = parse_address(process.stdout.readline().split()[-1])
+        simulated, connect_times, push_times, elapsed = asyncio.run(run_clients(
+            address, args.clients, args.changes, args.batch, args.interval, args.tasks, args.seed
+        ))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    latencies = [latency for client in simulated for latency in client.latencies]
+    changed = args.clients * args.changes * args.batch
+    delta_bytes = sum(client.bytes_received - client.full_bytes for client in simulated)
+    result = {
+        "clients": args.clients,
+        "tasks": args.tasks,
+        "changes_per_client": args.changes,
+        "tasks_per_change": args.batch,
+        "full_sync_p50_ms": to_ms(percentile(connect_times, 0.5)),
+        "full_sync_bytes": simulated[0].full_bytes if simulated else 0,
+        "push_p50_ms": to_ms(percentile(push_times, 0.5)),
+        "push_p99_ms": to_ms(percentile(push_times, 0.99)),
+        "propagation_p50_ms": to_ms(percentile(latencies, 0.5)),
+        "propagation_p99_ms": to_ms(percentile(latencies, 0.99)),
+        "changed_tasks_per_second": changed / elapsed if elapsed else None,
+        "delta_bytes_per_changed_task_per_client": delta_bytes / changed / max(args.clients - 1, 1) if changed else None,
+        "tasks_received": sum(client.tasks_received for client in simulated),
+    }
+    for key, value in result.items():
+        print(f"{key:<42}{value:>14,.2f}" if isinstance(value, float) else f"{key:<42}{value:>14,}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+            file.write("\n")
+    else:
+        print(json.dumps(result, indent=2))
+
+
+def build_parser():
+    from todo_storage import STORAGE_MODES
+    parser = argparse.ArgumentParser(description="To-do list sync server")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    serve = commands.add_parser("serve", help="serve the task files of a directory to sync clients")
+    serve.add_argument("--directory", default=".", help="directory of todo_data.json (default: current)")
+    serve.add_argument("--host", default="localhost", help="address to listen on (default: %(default)s)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, help="port, 0 for any free one (default: %(default)s)")
+    serve.add_argument("--storage", choices=[mode for mode in STORAGE_MODES if mode != "remote"],
+                       default="journal", help="storage backend of the served files (default: %(default)s)")
+    serve.set_defaults(handler=cmd_serve)
+
+    bench = commands.add_parser("bench", help="time a server with many simulated clients")
+    bench.add_argument("--clients", type=int, default=50, help="simulated clients (default: %(default)s)")
+    bench.add_argument("--tasks", type=int, default=10000, help="tasks in the shared list (default: %(default)s)")
+    bench.add_argument("--changes", type=int, default=20, help="pushes per client (default: %(default)s)")
+    bench.add_argument("--batch", type=int, default=1, help="tasks changed per push (default: %(default)s)")
+    bench.add_argument("--interval", type=float, default=0.02,
+                       help="average seconds between the pushes of a client (default: %(default)s)")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--output", help="write the JSON results here instead of standard output")
+    bench.set_defaults(handler=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""Named task lists, each in its own shard file
+
+The first workspace is the original todo_data.json; every other one keeps
+its tasks in workspaces/<name>.json (plus the journal, database or
+snapshot files of the storage mode). todo_workspaces.json lists them.
+
+A workspace is only read the first time it is opened. At most
+max_loaded of them stay in memory: opening another one closes the least
+recently used, and the app also closes workspaces that sat idle for a
+while. The active workspace is never closed this way. Queries and
+statistics can run on one workspace through its TaskEngine, or across all
+of them through WorkspaceManager; the statistics of a closed workspace
+are remembered with the size and time of its files, so they are read
+again only when the files changed.
+"""
+import os
+import re
+import json
+import time
+import heapq
+import warnings
+import threading
+from collections import OrderedDict
+
+from todo_engine import TaskEngine, DATA_FILENAME, today_string
+from todo_storage import write_json_atomic
+
+REGISTRY_FILENAME = "todo_workspaces.json"
+SHARD_DIRECTORY = "workspaces"
+DEFAULT_WORKSPACE = "Default"
+
+# Workspaces kept in memory, including the active one
+MAX_LOADED = 3
+
+# The app closes inactive workspaces unused for this many seconds
+IDLE_SECONDS = 300
+
+
+def shard_files(filename):
+    """Every file a workspace may use for its JSON file name, in any storage mode"""
+    base = os.path.splitext(filename)[0]
+    return [
+        filename, filename + ".journal", filename + ".lock",
+        base + ".db", base + ".db-journal", base + ".db-wal", base + ".db.lock",
+        base + ".snap", base + ".snap.journal", base + ".snap.lock",
+        base + ".archive.jsonl.gz", base + ".archive.jsonl.gz.meta", base + ".archive.jsonl.gz.lock",
+    ]
+
+
+def shard_signature(filename):
+    """Size and modification time of the files of a workspace, to notice changes"""
+    signature = []
+    for name in shard_files(filename):
+        try:
+            stat = os.stat(name)
+        except OSError:
+            continue
+        signature.append([os.path.basename(name), stat.st_size, stat.st_mtime_ns])
+    return signature
+
+
+class StatisticsSummary:
+    """The counters of TaskStatistics as plain data that can be added up"""
+
+    def __init__(self, total=0, completed=0, by_priority=None, by_tag=None):
+        self.total = total
+        self.completed = completed
+        self.by_priority = dict(by_priority or {"High": 0, "Medium": 0, "Low": 0})
+        self.by_tag = dict(by_tag or {})
+
+    @classmethod
+    def from_statistics(cls, statistics):
+        return cls(statistics.total, statistics.completed, statistics.by_priority, statistics.by_tag)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["total"], data["completed"], data["by_priority"], data["by_tag"])
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "completed": self.completed,
+            "by_priority": self.by_priority,
+            "by_tag": self.by_tag,
+        }
+
+    @property
+    def pending(self):
+        return self.total - self.completed
+
+    def add(self, other):
+        self.total += other.total
+        self.completed += other.completed
+        for priority, count in other.by_priority.items():
+            self.by_priority[priority] = self.by_priority.get(priority, 0) + count
+        for tag, count in other.by_tag.items():
+            self.by_tag[tag] = self.by_tag.get(tag, 0) + count
+
+
+class WorkspaceManager:
+    """The workspaces of a directory, loaded lazily and evicted least recently used first
+
+    Opening, closing and the registry are guarded by a lock, so a
+    cross-workspace query may run on a worker thread.
+    """
+
+    def __init__(self, directory=".", storage_mode="journal", max_loaded=MAX_LOADED,
+                 write_behind=True, metrics=None):
+        self.directory = directory
+        self.storage_mode = storage_mode
+        self.max_loaded = max(1, max_loaded)
+        self.write_behind = write_behind
+        self.metrics = metrics
+        self.registry_filename = os.path.join(directory, REGISTRY_FILENAME)
+        self.lock = threading.RLock()
+        # name -> (engine, last used) with the most recently used last
+        self.loaded = OrderedDict()
+        self.workspaces = OrderedDict()
+        self.active = None
+        self._read_registry()
+
+    def _read_registry(self):
+        data = None
+        if os.path.exists(self.registry_filename):
+            try:
+                with open(self.registry_filename, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+            except (OSError, ValueError) as e:
+                # Kept aside for the user, since the next save replaces it
+                warnings.warn(f"cannot read {self.registry_filename} ({e}); "
+                              f"a copy is kept as {self.registry_filename}.damaged", RuntimeWarning)
+                try:
+                    os.replace(self.registry_filename, self.registry_filename + ".damaged")
+                except OSError:
+                    pass
+        entries = data.get("workspaces") if isinstance(data, dict) else None
+        for entry in entries if isinstance(entries, list) else []:
+            if not (isinstance(entry, dict) and isinstance(entry.get("name"), str)
+                    and isinstance(entry.get("filename"), str)) or entry["name"] in self.workspaces:
+                warnings.warn(f"skipping a malformed workspace entry in {self.registry_filename}: {entry!r}",
+                              RuntimeWarning)
+                continue
+            self.workspaces[entry["name"]] = entry
+        if not self.workspaces:
+            # Before workspaces there was only todo_data.json
+            self.workspaces[DEFAULT_WORKSPACE] = {"name": DEFAULT_WORKSPACE, "filename": DATA_FILENAME}
+        active = data.get("active") if isinstance(data, dict) else None
+        self.active = active if isinstance(active, str) and active in self.workspaces else next(iter(self.workspaces))
+
+    def save_registry(self):
+        with self.lock:
+            write_json_atomic(self.registry_filename, {
+                "active": self.active,
+                "workspaces": list(self.workspaces.values()),
+            })
+
+    def names(self):
+        return list(self.workspaces)
+
+    def filename(self, name):
+        """Path of the JSON data file of a workspace"""
+        return os.path.join(self.directory, self.workspaces[name]["filename"])
+
+    def is_loaded(self, name):
+        return name in self.loaded
+
+    def open(self, name, load=True):
+        """The TaskEngine of a workspace, reading it from disk on first use
+
+        With load=False a newly opened engine is returned unloaded, for a
+        caller that streams it with iter_load().
+        """
+        with self.lock:
+            if name not in self.workspaces:
+                raise KeyError(f"no workspace named '{name}'")
+            if name in self.loaded:
+                engine, _ = self.loaded.pop(name)
+            else:
+                engine = TaskEngine(self.filename(name), self.storage_mode, self.write_behind, self.metrics)
+                if load:
+                    engine.load()
+            self.loaded[name] = (engine, time.monotonic())
+            self._evict(keep=name)
+            return engine
+
+    def activate(self, name, load=True):
+        """Make name the workspace of the app, remembered for the next start"""
+        with self.lock:
+            engine = self.open(name, load)
+            self.active = name
+            self.save_registry()
+            return engine
+
+    def _evict(self, keep=None):
+        for name in list(self.loaded):
+            if len(self.loaded) <= self.max_loaded:
+                break
+            if name not in (keep, self.active) and not self.loaded[name][0].loading:
+                self._unload(name)
+
+    def evict_idle(self, idle_seconds=IDLE_SECONDS):
+        """Close inactive workspaces unused for idle_seconds; returns their names"""
+        with self.lock:
+            now = time.monotonic()
+            idle = [
+                name for name, (engine, used) in self.loaded.items()
+                if name != self.active and not engine.loading and now - used > idle_seconds
+            ]
+            for name in idle:
+                self._unload(name)
+            return idle
+
+    def _unload(self, name):
+        engine, _ = self.loaded.pop(name)
+        engine.close()
+        self._remember_statistics(name, engine)
+
+    def _remember_statistics(self, name, engine):
+        entry = self.workspaces.get(name)
+        if entry is None:
+            return
+        entry["statistics"] = StatisticsSummary.from_statistics(engine.statistics).to_dict()
+        entry["signature"] = shard_signature(self.filename(name))
+        self.save_registry()
+
+    def create(self, name):
+        """Add an empty workspace with its own shard file"""
+        name = name.strip()
+        with self.lock:
+            if not name:
+                raise ValueError("the workspace name is empty")
+            if name in self.workspaces:
+                raise ValueError(f"a workspace named '{name}' already exists")
+            slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "list"
+            taken = {entry["filename"] for entry in self.workspaces.values()}
+            filename = f"{SHARD_DIRECTORY}/{slug}.json"
+            number = 2
+            while filename in taken or os.path.exists(os.path.join(self.directory, filename)):
+                filename = f"{SHARD_DIRECTORY}/{slug}-{number}.json"
+                number += 1
+            os.makedirs(os.path.join(self.directory, SHARD_DIRECTORY), exist_ok=True)
+            self.workspaces[name] = {"name": name, "filename": filename}
+            self.save_registry()
+
+    def rename(self, name, new_name):
+        """Rename a workspace; its files keep their names"""
+        new_name = new_name.strip()
+        with self.lock:
+            if not new_name:
+                raise ValueError("the workspace name is empty")
+            if new_name in self.workspaces:
+                raise ValueError(f"a workspace named '{new_name}' already exists")
+            # Rebuild in the same order with the new key
+            self.workspaces = OrderedDict(
+                (new_name if key == name else key, dict(entry, name=new_name) if key == name else entry)
+                for key, entry in self.workspaces.items()
+            )
+            if name in self.loaded:
+                self.loaded = OrderedDict(
+                    (new_name if key == name else key, value) for key, value in self.loaded.items()
+                )
+            if self.active == name:
+                self.active = new_name
+            self.save_registry()
+
+    def delete(self, name):
+        """Delete a workspace and its files; the last one cannot be deleted"""
+        with self.lock:
+            if len(self.workspaces) == 1:
+                raise ValueError("the last workspace cannot be deleted")
+            if name in self.loaded:
+                engine, _ = self.loaded.pop(name)
+                engine.close()
+            filename = self.filename(name)
+            del self.workspaces[name]
+            if self.active == name:
+                self.active = next(iter(self.workspaces))
+            self.save_registry()
+        for shard in shard_files(filename):
+            if os.path.exists(shard):
+                os.remove(shard)
+
+    def statistics(self, name):
+        """StatisticsSummary of one workspace, without loading it if its files are unchanged"""
+        with self.lock:
+            if name in self.loaded:
+                return StatisticsSummary.from_statistics(self.loaded[name][0].statistics)
+            entry = self.workspaces[name]
+            # The files of a remote workspace are on the sync server, so the cache cannot be checked
+            cached = entry.get("statistics") is not None and self.storage_mode != "remote"
+            if cached and entry.get("signature") == shard_signature(self.filename(name)):
+                return StatisticsSummary.from_dict(entry["statistics"])
+            engine = self.open(name)
+            summary = StatisticsSummary.from_statistics(engine.statistics)
+            entry["statistics"] = summary.to_dict()
+            entry["signature"] = shard_signature(self.filename(name))
+            return summary
+
+    def statistics_all(self):
+        """Statistics of every workspace added together"""
+        total = StatisticsSummary()
+        for name in self.names():
+            total.add(self.statistics(name))
+        return total
+
+    def query_all(self, search_text="", status="All", tag="All", sort="Creation Time",
+                  today=None, check_cancelled=lambda: None):
+        """(workspace name, task) pairs matching the filters in every workspace, in sort order
+
+        Workspaces are opened one after another, so the LRU limit still
+        bounds how many are in memory; the results hold only the matches.
+        """
+        today = today or today_string()
+        results = []
+        for index, name in enumerate(self.names()):
+            engine = self.open(name)
+            tasks, keys = engine.query(search_text, status, tag, sort, today, check_cancelled)
+            # The index breaks ties between equal keys of different workspaces
+            results.append([(key, index, name, task) for task, key in zip(tasks, keys)])
+        return [(name, task) for key, index, name, task in heapq.merge(*results)]
+
+    def close(self):
+        """Close every loaded workspace and remember its statistics"""
+        with self.lock:
+            for name in list(self.loaded):
+                self._unload(name)
+            self.save_registry()